@@ -0,0 +1,191 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from camera_handler import get_frame, get_qr_message_from_frame, CaptureBuffers
+from display_utils import (
+    render_qr, frame_key, show_frame, close_qr_window, pump_display_events, QR_BOX_SIZE, DISPLAY_PUMP_INTERVAL
+)
+from metrics import timer, observe
+from session import PREFETCH_DEPTH
+
+# Decoded frames kept for a slow consumer, the oldest are dropped first as only the latest screen content matters
+FRAME_QUEUE_SIZE = 4
+# Seconds to wait after the camera failed to grab a frame, before trying again
+CAPTURE_RETRY_DELAY = 0.05
+
+# Single thread every window call runs on, OpenCV windows must be driven from one thread
+_display_executor = None
+
+def get_display_executor():
+    """Return the single-thread executor running every display call, created on first use"""
+    global _display_executor
+    if _display_executor is None:
+        _display_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="display")
+    return _display_executor
+
+class AsyncQRStream:
+    """Decoded QR data strings of a frame source as an async stream, used as an async context manager.
+
+    Camera reads and OpenCV decoding run in executor threads (the loop default executor unless one is given),
+    and the next frame is captured while the current one decodes, each into its own preallocated buffers.
+    """
+
+    def __init__(self, cam, executor=None, queue_size=FRAME_QUEUE_SIZE):
+        self.cam = cam
+        self.executor = executor
+        self.buffers = CaptureBuffers()
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._task = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.read()
+
+    async def read(self, timeout=None):
+        """Return the next decoded QR data string, or None after timeout seconds without one"""
+        if self._task.done():
+            self._task.result() # Raises the error that stopped the capture
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        capture = loop.run_in_executor(self.executor, get_frame, self.cam, self.buffers)
+        try:
+            while True:
+                frame = await capture
+                # The next capture runs while this frame decodes, into buffers of its own
+                capture = loop.run_in_executor(self.executor, get_frame, self.cam, self.buffers)
+                if frame is None:
+                    await asyncio.sleep(CAPTURE_RETRY_DELAY)
+                    continue
+                decode = loop.run_in_executor(self.executor, get_qr_message_from_frame, frame)
+                try:
+                    data = await decode
+                finally:
+                    # Given back once its decode is over, a cancelled decode may still be reading it in its thread
+                    if not decode.cancelled():
+                        self.buffers.release(frame)
+                if data:
+                    self._put(data)
+        finally:
+            capture.cancel()
+
+    def _put(self, data):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(data)
+
+class AsyncQRDisplay:
+    """Awaitable rendering and display of QR codes in one long-lived window, used as an async context manager.
+
+    Rendering runs in an executor thread, showing the frame and pumping the window events run on the display thread.
+    """
+
+    def __init__(self, window_name, encoder=None, decode=None, box_size=QR_BOX_SIZE, executor=None):
+        self.window_name = window_name
+        self.encoder = encoder
+        self.decode = decode
+        self.box_size = box_size
+        self.executor = executor
+        self._pump_task = None
+        # (QR data string, error correction level) -> future of its image rendered ahead of time
+        self._prefetched = {}
+
+    async def __aenter__(self):
+        self._pump_task = asyncio.create_task(self._pump())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._pump_task.cancel()
+        for future in self._prefetched.values():
+            future.cancel()
+        self._prefetched.clear()
+        try:
+            await self._pump_task
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self):
+        """Close the window, it stays open after the context exits so back to back transfers reuse it"""
+        await self._run_on_display(close_qr_window, self.window_name)
+
+    async def render(self, qr_data_string):
+        """Render the QR code of the string into an image in an executor thread, or wait for its prefetch"""
+        future = self._prefetched.get(frame_key(qr_data_string, self.encoder))
+        if future is None or future.cancelled():
+            future = asyncio.get_running_loop().run_in_executor(self.executor, self._render, qr_data_string)
+        return await future
+
+    def prefetch(self, qr_data_strings):
+        """Start rendering the given strings in the background, dropping prefetched ones that are no longer upcoming"""
+        upcoming = [frame_key(qr_data_string, self.encoder) for qr_data_string in qr_data_strings]
+        for key in list(self._prefetched):
+            if key not in upcoming:
+                self._prefetched.pop(key).cancel()
+        loop = asyncio.get_running_loop()
+        for key in upcoming:
+            if key not in self._prefetched:
+                self._prefetched[key] = loop.run_in_executor(self.executor, self._render, key[0])
+
+    async def show_image(self, image):
+        """Show an already rendered image in the window"""
+        await self._run_on_display(show_frame, self.window_name, image)
+
+    async def show(self, qr_data_string):
+        """Render the QR code of the string and show it in the window"""
+        await self.show_image(await self.render(qr_data_string))
+
+    def _render(self, qr_data_string):
+        with timer('render'):
+            return render_qr(qr_data_string, self.encoder, self.decode, self.box_size)
+
+    async def _run_on_display(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(get_display_executor(), func, *args)
+
+    async def _pump(self):
+        while True:
+            await self._run_on_display(pump_display_events)
+            await asyncio.sleep(DISPLAY_PUMP_INTERVAL)
+
+async def run_session_async(session, frames, display, clock=time.monotonic, until=None, prefetch=False):
+    """Asyncio event loop driving a session until it is done (or until(session) is true), returns the session.
+
+    frames is an AsyncQRStream (or anything with an awaitable read(timeout=None)), display an AsyncQRDisplay
+    (or anything with an awaitable show(qr_data_string)). With prefetch the display renders the upcoming frames
+    of the session while it waits.
+    """
+    until = until or (lambda s: s.done)
+    now = clock()
+    pending = [session.start(now)]
+    while True:
+        shown = False
+        for frame in pending:
+            if frame is not None:
+                await display.show(frame)
+                shown = True
+        if shown:
+            observe('switch', clock() - now)
+            if prefetch:
+                display.prefetch(session.upcoming(PREFETCH_DEPTH))
+        if until(session):
+            return session
+        deadline = session.next_deadline()
+        qr_data_string = await frames.read(None if deadline is None else max(deadline - clock(), 0))
+        now = clock()
+        pending = [session.on_frame(qr_data_string, now) if qr_data_string is not None else None, session.on_tick(now)]
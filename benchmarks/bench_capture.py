@@ -0,0 +1,72 @@
+"""Microbenchmark comparing allocating frame capture with capture into preallocated buffers
+
+Usage: python benchmarks/bench_capture.py [--frames N]
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera_handler import CaptureBuffers
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+class SyntheticCamera:
+    """Frame source copying a fixed BGR frame like a camera driver, into the given image when it has the frame's shape.
+
+    Counts the new arrays it returns.
+    """
+
+    def __init__(self, width, height):
+        self.frame = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+        self.allocations = 0
+
+    def read(self, image=None):
+        if image is None or image.shape != self.frame.shape:
+            self.allocations += 1
+            return True, self.frame.copy()
+        np.copyto(image, self.frame)
+        return True, image
+
+def allocating_capture(cam, frames):
+    """The previous capture path: a new frame array per read and a new grayscale array per conversion"""
+    for _ in range(frames):
+        _, frame = cam.read()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        cam.allocations += 1
+
+def buffered_capture(cam, frames):
+    """The new capture path: frames read and converted into buffers given back after decoding"""
+    buffers = CaptureBuffers()
+    for _ in range(frames):
+        _, gray = buffers.capture(cam)
+        buffers.release(gray)
+    cam.allocations += buffers.allocations
+
+def measure(func, width, height, frames):
+    """Return the milliseconds per frame and the arrays allocated over the run"""
+    cam = SyntheticCamera(width, height)
+    start = time.perf_counter()
+    func(cam, frames)
+    elapsed = time.perf_counter() - start
+    return elapsed / frames * 1000, cam.allocations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300, help="frames captured per path and resolution")
+    args = parser.parse_args()
+
+    print(f"{'resolution':>10} {'alloc ms':>9} {'buffered ms':>12} {'alloc arrays':>13} {'buffered arrays':>16}")
+    for width, height in RESOLUTIONS:
+        allocating_ms, allocating_arrays = measure(allocating_capture, width, height, args.frames)
+        buffered_ms, buffered_arrays = measure(buffered_capture, width, height, args.frames)
+        resolution = f"{width}x{height}"
+        print(f"{resolution:>10} {allocating_ms:>9.3f} {buffered_ms:>12.3f} {allocating_arrays:>13} {buffered_arrays:>16}")
+
+if __name__ == '__main__':
+    main()
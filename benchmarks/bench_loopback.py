@@ -0,0 +1,193 @@
+"""End-to-end loopback throughput benchmark running the real transfer pipeline in one process
+
+Every chunk goes through the same code as a live transfer: chunking, JSON encoding, QR rendering,
+a simulated camera capture of the rendered symbol, OpenCV detection, payload parsing and reassembly.
+
+Usage: python benchmarks/bench_loopback.py [--sizes 1024 16384] [--entropy random text zeros]
+                                           [--link clean] [--seed 0]
+                                           [--output results.json] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from contextlib import contextmanager
+import cv2
+import numpy as np
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camera_handler import get_qr_from_frame
+from display_utils import render_qr
+from link_simulator import LinkSimulator, LINK_PRESETS
+from protocol_utils import create_chunks_to_send, encode_qr_data, decode_qr_data, is_starting_chunk, is_data_chunk
+from session import reassemble_file_data
+from sender import create_session_encoder
+
+STAGES = ['chunk', 'encode', 'render', 'capture', 'detect', 'parse', 'reassemble']
+DEFAULT_SIZES = [1024, 16 * 1024, 64 * 1024]
+ENTROPIES = ['random', 'text', 'zeros']
+MAX_FRAMES_PER_CHUNK = 10
+SEED = 1234
+
+class StageTimer:
+    """Accumulates wall clock and CPU time per pipeline stage"""
+
+    def __init__(self):
+        self.wall = dict.fromkeys(STAGES, 0.0)
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as part of the given stage"""
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.wall[name] += time.perf_counter() - wall_start
+            self.cpu[name] += time.process_time() - cpu_start
+
+def make_file_data(size, entropy, rng):
+    """Create file content of the given size: random bytes, English-like text or zeros"""
+    if entropy == 'random':
+        # getrandbits rather than randbytes, which needs Python 3.9
+        return rng.getrandbits(8 * size).to_bytes(size, 'little') if size else b""
+    if entropy == 'text':
+        words = [b"camera", b"chunk", b"approval", b"frame", b"transfer", b"the", b"a", b"of", b"qr", b"file"]
+        text = bytearray()
+        while len(text) < size:
+            text += rng.choice(words) + (b"\n" if rng.random() < 0.1 else b" ")
+        return bytes(text[:size])
+    return bytes(size)
+
+def run_transfer(file_name, file_data, capture=None, max_frames_per_chunk=MAX_FRAMES_PER_CHUNK):
+    """Push one file through the whole pipeline and return its timing and delivery statistics.
+
+    capture turns the displayed image into a camera frame (None for a dropped frame), a clean simulated link by default.
+    """
+    capture = capture or LinkSimulator(LINK_PRESETS['clean']).transmit
+    timer = StageTimer()
+    wall_start = time.perf_counter()
+
+    with timer.stage('chunk'):
+        chunks = create_chunks_to_send(file_name, file_data)
+        encoder = create_session_encoder(chunks)
+
+    chunks_data = {}
+    frames_captured = 0
+    lost_chunks = 0
+    for chunk in chunks:
+        with timer.stage('encode'):
+            qr_data_string = encode_qr_data(chunk)
+        with timer.stage('render'):
+            # Same decode check and mask fallback as the sender does before showing a chunk
+            qr_image = render_qr(qr_data_string, encoder, decode=get_qr_from_frame)
+
+        # Keep capturing the displayed symbol until this chunk decodes, a laggy link may still show the previous one
+        payload = None
+        for _ in range(max_frames_per_chunk):
+            with timer.stage('capture'):
+                frame = capture(qr_image)
+            frames_captured += 1
+            if frame is None:
+                continue
+            with timer.stage('detect'):
+                data = get_qr_from_frame(frame)
+            if data:
+                with timer.stage('parse'):
+                    payload = decode_qr_data(data)
+                if payload and payload['id'] == chunk['id']:
+                    break
+                payload = None
+
+        if is_data_chunk(payload):
+            chunks_data[payload['id']] = payload['data']
+        elif not is_starting_chunk(payload):
+            lost_chunks += 1
+
+    with timer.stage('reassemble'):
+        reassembled = reassemble_file_data(chunks_data)
+
+    wall_time = time.perf_counter() - wall_start
+    intact = reassembled == file_data
+    # Goodput only counts a file that arrived intact, a broken transfer delivered nothing usable
+    delivered_bytes = len(reassembled) if intact else 0
+    return {
+        'file_size': len(file_data),
+        'chunks': len(chunks),
+        'qr_version': encoder.version,
+        'intact': intact,
+        'delivered_bytes': delivered_bytes,
+        'lost_chunks': lost_chunks,
+        'frames_per_chunk': frames_captured / len(chunks),
+        'wall_time': wall_time,
+        'cpu_time': sum(timer.cpu.values()),
+        'goodput_bytes_per_sec': delivered_bytes / wall_time if wall_time else 0.0,
+        'stage_wall_time': timer.wall,
+        'stage_cpu_time': timer.cpu,
+    }
+
+def environment():
+    """Describe the machine and library versions so saved runs can be compared"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+    }
+
+def print_result(name, result):
+    """Print a one-line summary and the CPU time split per stage"""
+    status = "ok" if result['intact'] else f"INCOMPLETE ({result['lost_chunks']} chunks never decoded)"
+    print(f"{name:<14} {result['file_size']:>9} B  {result['chunks']:>6} chunks  v{result['qr_version']:<3}"
+          f"{result['goodput_bytes_per_sec']:>10.0f} B/s  {result['frames_per_chunk']:.2f} frames/chunk  {status}")
+    cpu_total = result['cpu_time'] or 1.0
+    split = "  ".join(f"{stage} {result['stage_cpu_time'][stage] * 1000:.0f}ms"
+                      f" ({result['stage_cpu_time'][stage] / cpu_total:.0%})" for stage in STAGES)
+    print(f"{'':<14} cpu: {split}")
+
+def compare(results, previous_path):
+    """Print the goodput change of every run also present in a previously saved results file"""
+    with open(previous_path) as f:
+        previous = json.load(f)['runs']
+    print(f"\nGoodput compared to {previous_path}:")
+    for name, result in results.items():
+        if name in previous:
+            before = previous[name]['goodput_bytes_per_sec']
+            after = result['goodput_bytes_per_sec']
+            change = f"{(after - before) / before:+.1%}" if before else "n/a, previous run delivered nothing"
+            print(f"{name:<14} {before:>10.0f} -> {after:>10.0f} B/s ({change})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="file sizes in bytes")
+    parser.add_argument("--entropy", nargs="+", choices=ENTROPIES, default=ENTROPIES, help="file content kinds")
+    parser.add_argument("--link", choices=LINK_PRESETS, default='clean', help="simulated camera link conditions")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated link impairments")
+    parser.add_argument("--output", help="write machine readable results to this JSON file")
+    parser.add_argument("--compare", help="previous results JSON file to compare goodput against")
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    results = {}
+    for entropy in args.entropy:
+        for size in args.sizes:
+            name = f"{entropy}-{size}"
+            simulator = LinkSimulator(LINK_PRESETS[args.link], args.seed)
+            results[name] = run_transfer(f"{name}.bin", make_file_data(size, entropy, rng), simulator.transmit)
+            results[name]['link'] = args.link
+            print_result(name, results[name])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'environment': environment(), 'runs': results}, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Microbenchmark and regression check of the protocol_utils helpers and the receiver reassembly
+
+Times every helper across chunk payload sizes and file sizes from 1 KB up to --max-size (1 GB at most),
+flags any helper whose time grows faster than linearly with the file size, and compares against a
+baseline saved on the same machine, failing when a case got slower than the threshold allows.
+
+Usage: python benchmarks/bench_protocol.py [--max-size 16M] [--repeat N]
+                                           [--save-baseline PATH] [--baseline PATH] [--threshold 0.25]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import timeit
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol_utils import (
+    encode_qr_data, decode_qr_data, divide_into_chunks, create_chunks_to_send, check_qr_chunk_approval,
+    create_qr_payload, create_approval_payload
+)
+from session import reassemble_file_data
+
+KB, MB, GB = 1024, 1024 ** 2, 1024 ** 3
+PAYLOAD_SIZES = [100, 500, 1000, 2000]
+FILE_SIZES = [KB, 16 * KB, 256 * KB, MB, 16 * MB, 256 * MB, GB]
+DEFAULT_MAX_SIZE = 16 * MB
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "protocol_baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Time growing like size ** 1.5 or faster between two file sizes is reported as superlinear
+SUPERLINEAR_EXPONENT = 1.5
+# Below this duration per call timer noise dominates the growth exponent
+MIN_SCALING_TIME = 0.001
+SEED = 1234
+
+def random_bytes(size, rng):
+    """Create random bytes of the given size with getrandbits rather than randbytes, which needs Python 3.9"""
+    return rng.getrandbits(8 * size).to_bytes(size, 'little') if size else b""
+
+def make_data(size, rng):
+    """Create random bytes of the given size, large sizes repeat a 1 MB random block to stay fast to build"""
+    if size <= MB:
+        return random_bytes(size, rng)
+    block = random_bytes(MB, rng)
+    return (block * (size // MB + 1))[:size]
+
+def best_time(func, repeat):
+    """Return the best per-call time in seconds"""
+    timer = timeit.Timer(func)
+    loops, total = timer.autorange()
+    if total >= 2:
+        return total / loops # Slow cases are measured once, the autorange run is long enough
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops
+
+def payload_cases(rng):
+    """Yield (case name, size, callable) for the per-chunk helpers"""
+    approval = encode_qr_data(create_approval_payload(7))
+    yield "check_qr_chunk_approval", 0, lambda: check_qr_chunk_approval(approval, {'id': 7})
+    for size in PAYLOAD_SIZES:
+        payload = create_qr_payload(random_bytes(size, rng), 7)
+        qr_data_string = encode_qr_data(payload)
+        yield "encode_qr_data", size, lambda payload=payload: encode_qr_data(payload)
+        yield "decode_qr_data", size, lambda qr_data_string=qr_data_string: decode_qr_data(qr_data_string)
+
+def file_cases(file_sizes, rng):
+    """Yield (case name, size, callable) for the whole-file helpers"""
+    for size in file_sizes:
+        file_data = make_data(size, rng)
+        yield "divide_into_chunks", size, lambda file_data=file_data: divide_into_chunks(file_data)
+        yield "create_chunks_to_send", size, lambda file_data=file_data: create_chunks_to_send("bench.bin", file_data)
+        chunks_data = dict(enumerate(divide_into_chunks(file_data), start=1))
+        yield "reassemble_file_data", size, lambda chunks_data=chunks_data: reassemble_file_data(chunks_data)
+        # Let the large inputs go before building the next size
+        del file_data, chunks_data
+
+def case_key(name, size):
+    return f"{name}/{size}"
+
+def run_cases(file_sizes, repeat):
+    """Time every case and return {case key: {'name', 'size', 'seconds'}}"""
+    rng = random.Random(SEED)
+    results = {}
+    print(f"{'case':<24} {'size':>11} {'time':>12} {'throughput':>14}")
+    for cases in (payload_cases(rng), file_cases(file_sizes, rng)):
+        for name, size, func in cases:
+            seconds = best_time(func, repeat)
+            results[case_key(name, size)] = {'name': name, 'size': size, 'seconds': seconds}
+            throughput = f"{size / seconds / MB:>9.1f} MB/s" if size else ""
+            print(f"{name:<24} {size:>11} {format_seconds(seconds):>12} {throughput:>14}")
+    return results
+
+def find_superlinear(results):
+    """Return a message for every helper whose time grows faster than linearly between two file sizes"""
+    problems = []
+    by_name = {}
+    for result in results.values():
+        if result['name'] in ("divide_into_chunks", "create_chunks_to_send", "reassemble_file_data"):
+            by_name.setdefault(result['name'], []).append(result)
+    for name, runs in by_name.items():
+        runs.sort(key=lambda run: run['size'])
+        for smaller, larger in zip(runs, runs[1:]):
+            if smaller['seconds'] < MIN_SCALING_TIME:
+                continue
+            exponent = math.log(larger['seconds'] / smaller['seconds']) / math.log(larger['size'] / smaller['size'])
+            if exponent >= SUPERLINEAR_EXPONENT:
+                problems.append(f"{name}: time grows like size^{exponent:.2f} from {smaller['size']} to {larger['size']} bytes")
+    return problems
+
+def find_regressions(results, baseline, threshold):
+    """Return a message for every case slower than its baseline time by more than the threshold"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]['seconds']
+        change = (result['seconds'] - before) / before
+        if change > threshold:
+            regressions.append(f"{key}: {format_seconds(before)} -> {format_seconds(result['seconds'])} ({change:+.0%})")
+    return regressions
+
+def format_seconds(seconds):
+    """Format a duration with a unit suited to its magnitude"""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def parse_size(text):
+    """Parse a size like 4096, 64K, 16M or 1G"""
+    units = {'K': KB, 'M': MB, 'G': GB}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-size", type=parse_size, default=DEFAULT_MAX_SIZE,
+                        help="largest file size to time, up to 1G (larger files need several GB of memory)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions per case")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", metavar="PATH", help="save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown against the baseline, as a fraction (0.25 = 25%% slower)")
+    args = parser.parse_args()
+
+    file_sizes = [size for size in FILE_SIZES if size <= args.max_size]
+    results = run_cases(file_sizes, args.repeat)
+    problems = find_superlinear(results)
+
+    if args.save_baseline:
+        environment = {'python': platform.python_version(), 'platform': platform.platform()}
+        with open(args.save_baseline, "w") as f:
+            json.dump({'environment': environment, 'cases': results}, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+        problems += find_regressions(results, baseline, args.threshold)
+        print(f"\nCompared against {args.baseline} with a {args.threshold:.0%} threshold")
+    else:
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline {args.baseline} to record one")
+
+    if problems:
+        print("\nFAILED:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\nOK")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Microbenchmark comparing the PIL based QR rendering path with the vectorized NumPy path
+
+Usage: python benchmarks/bench_qr_render.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+import numpy as np
+import qrcode
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from display_utils import render_qr_matrix, QR_BOX_SIZE, QR_BORDER
+
+VERSIONS = [1, 2, 5, 10, 15, 20, 25, 30, 40]
+
+def build_qr(version):
+    """Build a QR code pinned to the given version so both paths rasterize the same symbol"""
+    qr = qrcode.QRCode(version=version, box_size=QR_BOX_SIZE, border=QR_BORDER)
+    qr.add_data("x")
+    qr.make(fit=False)
+    return qr
+
+def legacy_render(qr):
+    """The previous display path: PIL image, RGB conversion and a NumPy copy"""
+    return np.array(qr.make_image().convert('RGB'))
+
+def vectorized_render(qr):
+    """The new display path: module matrix straight to a grayscale uint8 array"""
+    qr.border = 0
+    try:
+        return render_qr_matrix(qr.get_matrix())
+    finally:
+        qr.border = QR_BORDER
+
+def best_time(func, qr, repeat):
+    """Return the best per-call time in milliseconds"""
+    timer = timeit.Timer(lambda: func(qr))
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions per version")
+    args = parser.parse_args()
+
+    print(f"{'version':>7} {'pixels':>11} {'legacy ms':>10} {'vectorized ms':>14} {'speedup':>8}")
+    for version in VERSIONS:
+        qr = build_qr(version)
+        image = vectorized_render(qr)
+        legacy_ms = best_time(legacy_render, qr, args.repeat)
+        vectorized_ms = best_time(vectorized_render, qr, args.repeat)
+        pixels = f"{image.shape[1]}x{image.shape[0]}"
+        print(f"{version:>7} {pixels:>11} {legacy_ms:>10.3f} {vectorized_ms:>14.3f} {legacy_ms / vectorized_ms:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Startup benchmark reporting the import time each main.py mode pays, using python -X importtime
+
+Usage: python benchmarks/bench_startup.py [--runs N] [--top N] [--json PATH]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each mode imports, the sender and receiver modes import their module right after main
+MODE_COMMANDS = {
+    'invalid': ["main.py", "invalid"],
+    'sender': ["-c", "import main, sender"],
+    'receiver': ["-c", "import main, receiver"],
+}
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into a list of (nesting depth, module, cumulative microseconds)"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Every nesting level indents the module name by two more spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, name.strip(), int(cumulative_us)))
+    return imports
+
+def run_mode(mode):
+    """Run one startup of the given mode and return (wall clock ms, parsed imports)"""
+    command = [sys.executable, "-X", "importtime"] + MODE_COMMANDS[mode]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup of mode '{mode}' failed:\n{result.stderr}")
+    return wall_ms, parse_importtime(result.stderr)
+
+def benchmark_mode(mode, runs):
+    """Run the mode several times and return the median wall clock, total import time and per module import times"""
+    wall_times, import_totals, modules = [], [], {}
+    for _ in range(runs):
+        wall_ms, imports = run_mode(mode)
+        wall_times.append(wall_ms)
+        # Top level imports add up to the whole import time
+        import_totals.append(sum(us for depth, _, us in imports if depth == 0) / 1000)
+        # Top level modules and what they import directly, e.g. sender -> cv2, qrcode
+        for depth, name, us in imports:
+            if depth <= 1:
+                modules.setdefault(name, []).append(us / 1000)
+    return {
+        'wall_ms': statistics.median(wall_times),
+        'import_ms': statistics.median(import_totals),
+        'modules_ms': {name: statistics.median(times) for name, times in modules.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="startups per mode, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="slowest top level imports listed per mode")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in MODE_COMMANDS:
+        result = benchmark_mode(mode, args.runs)
+        results[mode] = result
+        print(f"{mode}: {result['wall_ms']:.1f} ms wall clock, {result['import_ms']:.1f} ms importing")
+        slowest = sorted(result['modules_ms'].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, ms in slowest:
+            print(f"    {ms:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
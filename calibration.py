@@ -0,0 +1,221 @@
+import json
+import os
+import random
+import time
+import uuid
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M
+from camera_handler import get_next_qr_data, get_qr_from_frame
+from display_utils import display_qr_centered
+from protocol_utils import (
+    decode_qr_data, encode_qr_data, create_calibration_payload, is_calibration_payload,
+    CALIBRATION_PROBE, CALIBRATION_ACK, CALIBRATION_LOCK
+)
+from qr_encoder import SessionQREncoder
+
+# Density levels from the sparsest to the densest symbol: (QR version, error correction level, pixels per module)
+DENSITY_LEVELS = [
+    (5, ERROR_CORRECT_M, 10),
+    (9, ERROR_CORRECT_M, 8),
+    (13, ERROR_CORRECT_M, 7),
+    (17, ERROR_CORRECT_M, 6),
+    (21, ERROR_CORRECT_L, 5),
+    (25, ERROR_CORRECT_L, 4),
+    (30, ERROR_CORRECT_L, 4),
+]
+# Seconds the sender shows one level before giving up on it, and for the whole calibration
+LEVEL_TIMEOUT = 4.0
+CALIBRATION_BUDGET = 30.0
+# A level is reliable once the receiver decodes it this many times within the decode window
+REQUIRED_DECODES = 3
+DECODE_WINDOW = 2.0
+# Largest chunk ID the chunk size leaves room for in the JSON payload
+MAX_CHUNK_ID = 10 ** 7
+
+CALIBRATION_DIR = os.path.join(os.path.expanduser("~"), ".file_transfer_over_cam")
+CALIBRATION_CACHE_PATH = os.path.join(CALIBRATION_DIR, "calibration.json")
+DEVICE_ID_PATH = os.path.join(CALIBRATION_DIR, "device_id")
+
+class LinkProfile:
+    """Session parameters locked by the calibration: QR version, error correction, module pixel size and chunk size"""
+
+    def __init__(self, level, version, error_correction, box_size, chunk_size):
+        self.level = level
+        self.version = version
+        self.error_correction = error_correction
+        self.box_size = box_size
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def for_level(cls, level):
+        """Create the profile of the given density level, with the largest chunk size its symbols carry"""
+        version, error_correction, box_size = DENSITY_LEVELS[level]
+        return cls(level, version, error_correction, box_size, chunk_size_for(version, error_correction))
+
+    def __repr__(self):
+        return (f"LinkProfile(level={self.level}, version={self.version}, error_correction={self.error_correction}, "
+                f"box_size={self.box_size}, chunk_size={self.chunk_size})")
+
+def chunk_size_for(version, error_correction):
+    """Largest chunk size whose JSON payload fits a symbol of the given version and error correction level"""
+    capacity = SessionQREncoder(version, error_correction).capacity
+    overhead = len(encode_qr_data({"id": MAX_CHUNK_ID, "data": b""}))
+    # Base64 turns every 3 bytes into 4 characters
+    return max((capacity - overhead) // 4 * 3, 1)
+
+def create_probe(level, device_id):
+    """Create the probe payload of a level, padded so its symbol is as dense as the level's file chunks"""
+    version, error_correction, _ = DENSITY_LEVELS[level]
+    capacity = SessionQREncoder(version, error_correction).capacity
+    overhead = len(encode_qr_data(create_calibration_payload(CALIBRATION_PROBE, level, device_id)))
+    # Random looking padding filling the symbol, so the probe has the module pattern of a full file chunk
+    padding_size = max((capacity - overhead) // 4 * 3, 0)
+    # getrandbits rather than randbytes, which needs Python 3.9
+    padding = random.Random(level).getrandbits(8 * padding_size).to_bytes(padding_size, 'little') if padding_size else b""
+    return create_calibration_payload(CALIBRATION_PROBE, level, device_id, padding)
+
+def get_device_id(path=DEVICE_ID_PATH):
+    """Return the random ID of this device, created and stored on first use"""
+    try:
+        with open(path) as f:
+            device_id = f.read().strip()
+        if device_id:
+            return device_id
+    except OSError:
+        pass
+    device_id = uuid.uuid4().hex[:12]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(device_id)
+    return device_id
+
+def pair_key(sender_id, receiver_id):
+    """Cache key of a sender screen to receiver camera direction"""
+    return f"{sender_id}->{receiver_id}"
+
+def load_cached_level(pair, path=CALIBRATION_CACHE_PATH):
+    """Return the density level cached for the device pair, or None when there is none or the levels changed since"""
+    try:
+        with open(path) as f:
+            entry = json.load(f).get(pair)
+    except (OSError, ValueError):
+        return None
+    if not entry or not 0 <= entry.get('level', -1) < len(DENSITY_LEVELS):
+        return None
+    if list(DENSITY_LEVELS[entry['level']]) != entry.get('parameters'):
+        return None
+    return entry['level']
+
+def save_cached_level(pair, level, path=CALIBRATION_CACHE_PATH):
+    """Store the density level locked for the device pair"""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[pair] = {'level': level, 'parameters': list(DENSITY_LEVELS[level]), 'timestamp': time.time()}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2)
+
+def calibrate_link(cam, window_name, cache_path=CALIBRATION_CACHE_PATH, device_id=None,
+                   budget=CALIBRATION_BUDGET, level_timeout=LEVEL_TIMEOUT):
+    """Sender side of the calibration handshake, returns the locked LinkProfile or None to keep the defaults.
+
+    The sparsest level doubles as a hello carrying the device IDs. A level cached for the device pair is verified
+    with one probe, otherwise the levels are probed from sparse to dense until the receiver stops acking one
+    or the time budget runs out. The densest acked level is then locked on both sides.
+    """
+    device_id = device_id or get_device_id()
+    deadline = time.monotonic() + budget
+
+    def remaining():
+        return min(level_timeout, max(deadline - time.monotonic(), 0))
+
+    print("Calibrating the link, showing test symbols of increasing density")
+    ack = probe_level(cam, window_name, 0, device_id, remaining())
+    if not ack:
+        print("Receiver did not answer the calibration, keeping the default parameters")
+        return None
+    pair = pair_key(device_id, ack['device'])
+
+    best_level = 0
+    cached_level = load_cached_level(pair, cache_path)
+    if cached_level is None:
+        cached_level = ack.get('cached_level')
+    if cached_level and probe_level(cam, window_name, cached_level, device_id, remaining()):
+        print(f"Cached density level {cached_level} still decodes")
+        best_level = cached_level
+    else:
+        for level in range(1, len(DENSITY_LEVELS)):
+            if time.monotonic() >= deadline or not probe_level(cam, window_name, level, device_id, remaining()):
+                break
+            best_level = level
+
+    lock_level(cam, window_name, best_level, device_id, remaining())
+    save_cached_level(pair, best_level, cache_path)
+    profile = LinkProfile.for_level(best_level)
+    print(f"Calibration locked {profile}")
+    return profile
+
+def probe_level(cam, window_name, level, device_id, timeout):
+    """Show the probe of a level and return the receiver ack, or None if it is not acked within the timeout"""
+    version, error_correction, box_size = DENSITY_LEVELS[level]
+    encoder = SessionQREncoder(version, error_correction)
+    display_qr_centered(encode_qr_data(create_probe(level, device_id)), window_name, encoder, get_qr_from_frame, box_size)
+    return wait_for_calibration_ack(cam, level, timeout)
+
+def lock_level(cam, window_name, level, device_id, timeout):
+    """Tell the receiver which level is locked and wait for it to confirm, returns whether it did"""
+    lock = create_calibration_payload(CALIBRATION_LOCK, level, device_id)
+    display_qr_centered(encode_qr_data(lock), window_name)
+    return wait_for_calibration_ack(cam, level, timeout, locked=True) is not None
+
+def wait_for_calibration_ack(cam, level, timeout, locked=False):
+    """Wait for the receiver ack of the given level (or of its lock), None after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while True:
+        qr_data_string = get_next_qr_data(cam, max(deadline - time.monotonic(), 0))
+        if qr_data_string is None:
+            return None
+        payload = decode_qr_data(qr_data_string)
+        # The receiver window may still show the ack of the previous level
+        if (is_calibration_payload(payload, CALIBRATION_ACK) and payload['level'] == level
+                and payload.get('locked', False) == locked):
+            return payload
+
+class CalibrationResponder:
+    """Receiver side of the calibration handshake, acks the levels it decodes reliably and caches the locked one"""
+
+    def __init__(self, show, cache_path=CALIBRATION_CACHE_PATH, device_id=None, clock=time.monotonic):
+        self.show = show
+        self.cache_path = cache_path
+        self.device_id = device_id or get_device_id()
+        self.clock = clock
+        self.locked_level = None
+        self._decodes = {}
+        self._acked = set()
+
+    def handle(self, payload):
+        """Process a calibration payload received from the sender"""
+        level, sender_id = payload['level'], payload['device']
+        pair = pair_key(sender_id, self.device_id)
+        if payload['calibration'] == CALIBRATION_LOCK:
+            if self.locked_level != level:
+                self.locked_level = level
+                save_cached_level(pair, level, self.cache_path)
+                print(f"Calibration locked {LinkProfile.for_level(level)}")
+            self._ack(level, locked=True)
+        elif payload['calibration'] == CALIBRATION_PROBE and level not in self._acked and self._is_reliable(level):
+            self._acked.add(level)
+            self._ack(level, cached_level=load_cached_level(pair, self.cache_path))
+
+    def _is_reliable(self, level):
+        """Count a decode of the level, reliable once it was decoded often enough within the decode window"""
+        now = self.clock()
+        decodes = [t for t in self._decodes.get(level, []) if now - t <= DECODE_WINDOW] + [now]
+        self._decodes[level] = decodes
+        return len(decodes) >= REQUIRED_DECODES
+
+    def _ack(self, level, **fields):
+        ack = create_calibration_payload(CALIBRATION_ACK, level, self.device_id, **fields)
+        self.show(encode_qr_data(ack))
@@ -1,20 +1,134 @@
+import threading
 import time
+from collections import deque
 import cv2
+import numpy as np
 from cv2.typing import MatLike
+from metrics import timer
 
 web_cam = None
-qr_code = cv2.QRCodeDetector()
+# One detector per thread, frames are decoded on the camera thread while the sender renders ahead on another one
+_detectors = threading.local()
+# Whether every QR code of a frame is decoded, which joins a Structured Append group into one message
+_decode_groups = False
+# Capture buffers of the threads reading frames one at a time, each frame is decoded before the next one is captured
+_capture_buffers = threading.local()
 
-def get_web_cam():
+def get_web_cam(index=0):
     """Initialize web camera object or return the existing one"""
     if web_cam:
         return web_cam
     else:
-        return cv2.VideoCapture(0)
+        return cv2.VideoCapture(index)
 
-def get_frame(web_cam : cv2.VideoCapture):
-    """Capture a single frame from the web camera"""
-    ret, frame = web_cam.read()
+class RegionCapture:
+    """Frame source reading one of count equal columns of a camera's frames, a drop-in for cv2.VideoCapture.
+
+    Lanes sharing one camera each read their column through their own RegionCapture, camera reads are serialized
+    with the shared lock.
+    """
+
+    def __init__(self, cam, index, count, lock):
+        self.cam = cam
+        self.index = index
+        self.count = count
+        self.lock = lock
+        self._frame = None
+
+    def read(self, image=None):
+        """Return (ret, frame) with the column of a newly captured frame, copied into image when it has its size"""
+        with self.lock:
+            # The full frame is read into a buffer of this lane, only its column leaves the lock
+            ret, self._frame = read_into(self.cam, self._frame)
+            if not ret:
+                return ret, None
+            width = self._frame.shape[1]
+            column = self._frame[:, width * self.index // self.count:width * (self.index + 1) // self.count]
+            if image is not None and image.shape == column.shape and image.dtype == column.dtype:
+                np.copyto(image, column)
+                return ret, image
+            return ret, column.copy()
+
+    def release(self):
+        """The shared camera is released by its owner"""
+
+class CaptureBuffers:
+    """Preallocated frame and grayscale buffers the camera frames are captured into, so capturing allocates nothing.
+
+    capture() reads a frame into a free buffer pair with cam.read(image=...) and cv2.cvtColor(dst=...), and lends
+    out the grayscale buffer. The decode stage owns it until it gives it back with release(), a lent buffer is never
+    written, so another thread can capture the next frame meanwhile. A new pair is only allocated when every pair is
+    lent or the frame size changed, counted in allocations. A frame source whose read() takes no image argument is
+    read as is and its frames are copied into the buffers.
+    """
+
+    def __init__(self):
+        self.allocations = 0
+        self._lock = threading.Lock()
+        # (frame buffer, grayscale buffer) pairs ready for a capture, and the lent pairs by grayscale buffer ID
+        self._free = []
+        self._lent = {}
+
+    def capture(self, cam):
+        """Return (ret, grayscale frame) with a newly captured frame, lent until it is released"""
+        with self._lock:
+            frame_buffer, gray_buffer = self._free.pop() if self._free else (None, None)
+        ret, frame = read_into(cam, frame_buffer)
+        if not ret:
+            self._put_back(frame_buffer, gray_buffer)
+            return ret, None
+        if frame is not frame_buffer:
+            # The frame may belong to the source, it is copied into the buffer, a new one on first use or a new size
+            if frame_buffer is not None and frame_buffer.shape == frame.shape and frame_buffer.dtype == frame.dtype:
+                np.copyto(frame_buffer, frame)
+            else:
+                frame_buffer = np.array(frame)
+                self.allocations += 1
+        if frame_buffer.ndim == 2:
+            gray_buffer = frame_buffer # Already grayscale, nothing to convert
+        else:
+            gray = cv2.cvtColor(frame_buffer, cv2.COLOR_BGR2GRAY, dst=gray_buffer)
+            if gray is not gray_buffer:
+                gray_buffer = gray
+                self.allocations += 1
+        with self._lock:
+            self._lent[id(gray_buffer)] = (frame_buffer, gray_buffer)
+        return ret, gray_buffer
+
+    def release(self, frame):
+        """Give back a frame returned by capture, its buffers are reused for a later capture"""
+        with self._lock:
+            pair = self._lent.pop(id(frame), None)
+        if pair is not None:
+            self._put_back(*pair)
+
+    def _put_back(self, frame_buffer, gray_buffer):
+        if frame_buffer is not None:
+            with self._lock:
+                self._free.append((frame_buffer, gray_buffer))
+
+def read_into(cam, image):
+    """Return (ret, frame) read into image, or a frame of its own from a source whose read() takes no image argument"""
+    try:
+        return cam.read(image=image)
+    except TypeError:
+        # Not every cv2.VideoCapture-like source reads into a given image, its frames are copied instead
+        return cam.read()
+
+def get_capture_buffers():
+    """Return the capture buffers of the calling thread"""
+    buffers = getattr(_capture_buffers, 'buffers', None)
+    if buffers is None:
+        buffers = _capture_buffers.buffers = CaptureBuffers()
+    return buffers
+
+def get_frame(web_cam : cv2.VideoCapture, buffers=None):
+    """Capture a single frame from the web camera.
+
+    With capture buffers the frame is a grayscale buffer of theirs, lent until it is given back to buffers.release.
+    """
+    with timer('capture'):
+        ret, frame = buffers.capture(web_cam) if buffers else web_cam.read()
 
     if ret:
         return frame
@@ -24,17 +138,69 @@ def get_frame(web_cam : cv2.VideoCapture):
 
 def get_qr_from_frame(frame : MatLike):
     """Detect and decode QR code from a given frame"""
-    data, _, _ = qr_code.detectAndDecode(frame) # Uses cv2 capability to detect and decode QR codes
+    with timer('detect'):
+        data, _, _ = get_qr_detector().detectAndDecode(frame) # Uses cv2 capability to detect and decode QR codes
     return data
 
-def get_next_qr_data(web_cam : cv2.VideoCapture):
-    """Continuously capture frames until QR code detected and returns its data"""
+def get_qr_codes_from_frame(frame : MatLike):
+    """Detect and decode every QR code of a given frame, returns the list of their data"""
+    with timer('detect'):
+        _, decoded, _, _ = get_qr_detector().detectAndDecodeMulti(frame)
+    return [data for data in decoded if data]
+
+def set_group_decoding(enabled):
+    """Decode frames showing Structured Append groups from now on, or only frames showing one QR code"""
+    global _decode_groups
+    _decode_groups = enabled
+
+def get_qr_message_from_frame(frame : MatLike):
+    """Detect and decode the message of a given frame, a whole Structured Append group with group decoding on.
+
+    A group is only read by decoding every symbol of the frame, which is slower, so it is left off by default.
+    """
+    if _decode_groups:
+        return next(iter(get_qr_codes_from_frame(frame)), '')
+    return get_qr_from_frame(frame)
+
+class MultiQRReader:
+    """Frame reader for a camera seeing several screens, returns the QR codes of a frame one at a time"""
+
+    def __init__(self, cam):
+        self.cam = cam
+        self._pending = deque()
+
+    def __call__(self, timeout=None):
+        """Return the next decoded QR data string, or None after timeout seconds without one"""
+        if not self._pending:
+            self._pending.extend(get_next_qr_data(self.cam, timeout, get_qr_codes_from_frame) or [])
+        return self._pending.popleft() if self._pending else None
+
+def get_qr_detector():
+    """Return the QR code detector of the calling thread, a detector must not be shared by threads"""
+    detector = getattr(_detectors, 'detector', None)
+    if detector is None:
+        detector = _detectors.detector = cv2.QRCodeDetector()
+    return detector
+
+def get_next_qr_data(web_cam : cv2.VideoCapture, timeout=None, decode=None):
+    """Continuously capture frames until QR code detected and returns its data, or None after timeout seconds without one.
+
+    decode(frame) returns the data of a frame, anything falsy when it has none (get_qr_message_from_frame by default).
+    """
+    decode = decode or get_qr_message_from_frame
+    buffers = get_capture_buffers()
+    deadline = None if timeout is None else time.monotonic() + timeout
     while True:
         # waitkey(1) is necessary on many systems to keep the qr window responsive (the .imshow call we use)
         cv2.waitKey(1)
-        frame = get_frame(web_cam)
+        frame = get_frame(web_cam, buffers)
         if frame is not None:
-            data = get_qr_from_frame(frame)
+            try:
+                data = decode(frame)
+            finally:
+                buffers.release(frame)
             if data:
                 return data
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
         time.sleep(0.1)
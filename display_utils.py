@@ -1,7 +1,13 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import cv2
 import numpy as np
 import qrcode
-import tkinter as tk
+from metrics import timer
+from protocol_utils import split_into_symbol_group
 try:
     import win32gui
     import win32con
@@ -9,11 +15,30 @@ try:
 except ImportError:
     HAS_WIN32 = False
 
-# Get screen dimensions once at module load
-_root = tk.Tk()
-SCREEN_WIDTH = _root.winfo_screenwidth()
-SCREEN_HEIGHT = _root.winfo_screenheight()
-_root.destroy()
+# Same geometry qrcode.make() uses by default: 10 pixels per module and a 4 module quiet zone
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+# Frames kept per window by the framebuffer backend, older frames are dropped like a screen only shows the latest one
+FRAMEBUFFER_QUEUE_SIZE = 4
+# Seconds a framebuffer capture waits for the first frame of an empty window before failing the read
+FRAMEBUFFER_READ_TIMEOUT = 0.1
+# Seconds between two window event pumps, keeps the OpenCV windows responsive while nothing new is shown
+DISPLAY_PUMP_INTERVAL = 0.03
+
+# The display backend every display function draws to, created on first use
+_display_backend = None
+# Window name -> (index, count) of the screen column the window is placed in instead of the screen center
+_window_regions = {}
+
+@lru_cache(maxsize=None)
+def get_screen_size():
+    """Return the (width, height) of the screen, queried once on first use"""
+    import tkinter as tk # Imported here as only placing a real window needs it
+    root = tk.Tk()
+    size = (root.winfo_screenwidth(), root.winfo_screenheight())
+    root.destroy()
+    return size
 
 def force_focus(window_name):
     """Force focus on a given window for windows OS"""
@@ -38,16 +63,285 @@ def force_focus(window_name):
     else:
         print("Given window not found")
 
-def display_qr_centered(qr_data_string, window_name):
+def make_qr_matrix(qr_data_string):
+    """Build the QR module matrix (True = dark module) for the given string, without a quiet zone"""
+    qr = qrcode.QRCode(border=0)
+    qr.add_data(qr_data_string)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+def render_qr_matrix(matrix, box_size=QR_BOX_SIZE, border=QR_BORDER):
+    """Rasterize a QR module matrix into a scaled, quiet-zone padded grayscale uint8 image"""
+    modules = np.asarray(matrix, dtype=bool)
+    # Dark modules are black, light modules and the quiet zone are white
+    symbol = np.where(modules, np.uint8(0), np.uint8(255))
+    padded = np.pad(symbol, border, constant_values=255)
+    rows, cols = padded.shape
+    # Broadcast every module to a box_size x box_size block, the reshape makes the only full-size copy
+    blocks = np.broadcast_to(padded[:, None, :, None], (rows, box_size, cols, box_size))
+    return blocks.reshape(rows * box_size, cols * box_size)
+
+def render_qr(qr_data_string, encoder=None, decode=None, box_size=QR_BOX_SIZE):
+    """Render the QR code of the given string as a grayscale image ready for cv2.imshow, using the session encoder if given.
+
+    With a decode function the session masks are tried in order until the rendered image decodes back to the string.
+    A string too long for one symbol of the session encoder is rendered as a Structured Append group.
+    """
+    if not encoder:
+        return render_qr_matrix(make_qr_matrix(qr_data_string), box_size)
+    # An adaptive encoder may change level while the frame renders, every symbol of the frame keeps one level
+    encoder = encoder.current
+    if len(qr_data_string.encode('utf-8')) > encoder.capacity:
+        return render_qr_group(qr_data_string, encoder, decode, box_size)
+    return render_symbol(qr_data_string, encoder, decode, box_size)
+
+def render_qr_group(qr_data_string, encoder, decode=None, box_size=QR_BOX_SIZE):
+    """Render the string as a Structured Append group of session symbols tiled in a grid, read back as one message"""
+    images = [render_symbol(part.decode('utf-8'), encoder, decode, box_size, structured_append)
+              for part, structured_append in split_into_symbol_group(qr_data_string, encoder.part_capacity)]
+    return tile_images(images)
+
+def render_symbol(data_string, encoder, decode=None, box_size=QR_BOX_SIZE, structured_append=None):
+    """Render one symbol of the session encoder, with a decode function the first mask that decodes back to the string"""
+    if not decode:
+        return render_qr_matrix(encoder.encode(data_string, structured_append), box_size)
+
+    first_image = None
+    for matrix in encoder.encode_candidates(data_string, structured_append):
+        image = render_qr_matrix(matrix, box_size)
+        if decode(image) == data_string:
+            return image
+        if first_image is None:
+            first_image = image
+    print("No mask produced a QR code that decodes back, showing the lowest penalty one")
+    return first_image
+
+def tile_images(images):
+    """Tile images of the same size in a grid as square as possible, row by row, empty cells left white"""
+    columns = int(np.ceil(np.sqrt(len(images))))
+    rows = -(-len(images) // columns)
+    height, width = images[0].shape
+    grid = np.full((rows * height, columns * width), 255, dtype=np.uint8)
+    for index, image in enumerate(images):
+        row, column = divmod(index, columns)
+        grid[row * height:(row + 1) * height, column * width:(column + 1) * width] = image
+    return grid
+
+def frame_key(qr_data_string, encoder=None):
+    """Key of a rendered frame, the same string renders differently once an adaptive encoder changed level"""
+    return qr_data_string, getattr(encoder, 'error_correction', None)
+
+class PrefetchingRenderer:
+    """Renders upcoming QR codes in a background thread, so showing the next one does not wait on its encoding"""
+
+    def __init__(self, encoder=None, decode=None, box_size=QR_BOX_SIZE):
+        self.encoder = encoder
+        self.decode = decode
+        self.box_size = box_size
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        # (QR data string, error correction level) -> future of its rendered image
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def prefetch(self, qr_data_strings):
+        """Start rendering the given strings in the background, dropping prefetched ones that are no longer upcoming"""
+        upcoming = [frame_key(qr_data_string, self.encoder) for qr_data_string in qr_data_strings]
+        for key in list(self._pending):
+            if key not in upcoming:
+                self._pending.pop(key).cancel()
+        for key in upcoming:
+            if key not in self._pending:
+                self._pending[key] = self._executor.submit(self._render, key[0])
+
+    def render(self, qr_data_string):
+        """Return the image of the string, waiting for its prefetch if one was started, rendering it now otherwise"""
+        # Kept until no longer upcoming, in-flight chunks are shown again until they are acknowledged
+        future = self._pending.get(frame_key(qr_data_string, self.encoder))
+        if future is not None and not future.cancelled():
+            return future.result()
+        return self._render(qr_data_string)
+
+    def close(self):
+        """Drop the prefetched frames and stop the background thread"""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+
+    def _render(self, qr_data_string):
+        with timer('render'):
+            return render_qr(qr_data_string, self.encoder, self.decode, self.box_size)
+
+def display_qr_centered(qr_data_string, window_name, encoder=None, decode=None, box_size=QR_BOX_SIZE):
     """Display QR code centered on screen with natural size"""
-    qr = qrcode.make(qr_data_string)
-    qr_np = np.array(qr.convert('RGB'))
-    # Assume QR fits on screen: center the window using the image size
-    h, w = qr_np.shape[:2]
-    x = max(0, (SCREEN_WIDTH - w) // 2)
-    y = max(0, (SCREEN_HEIGHT - h) // 2)
+    with timer('render'):
+        image = render_qr(qr_data_string, encoder, decode, box_size)
+    show_frame(window_name, image)
+
+class OpenCVWindowBackend:
+    """Display backend showing frames in OpenCV windows on the screen"""
+
+    def __init__(self):
+        # Window name -> (width, height) of the frame the open window is currently positioned for
+        self._open_windows = {}
+
+    def show(self, window_name, image):
+        """Show an image in a long-lived window, the window is only created, positioned and focused on its first frame"""
+        h, w = image.shape[:2]
+        is_new_window = window_name not in self._open_windows
+        if is_new_window:
+            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+        if self._open_windows.get(window_name) != (w, h):
+            # Re-center only when the frame size changes, same sized frames just replace the window content
+            center_window(window_name, w, h)
+            self._open_windows[window_name] = (w, h)
+
+        cv2.imshow(window_name, image)
+        cv2.waitKey(1) # Needed to display the window
+        if is_new_window:
+            force_focus(window_name) # Force focus on QR window after displaying it the first time
+
+    def pump(self):
+        """Process pending window events so the windows stay responsive between frames"""
+        if self._open_windows:
+            cv2.waitKey(1)
+
+    def close(self, window_name):
+        """Close the given window if it is open"""
+        if self._open_windows.pop(window_name, None) is not None:
+            cv2.destroyWindow(window_name)
 
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    def close_all(self):
+        """Close all windows"""
+        self._open_windows.clear()
+        cv2.destroyAllWindows()
+
+class FramebufferBackend:
+    """Off-screen display backend publishing every frame to an in-memory queue per window instead of a screen"""
+
+    def __init__(self, queue_size=FRAMEBUFFER_QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def get_queue(self, window_name):
+        """Return the frame queue of the given window, frame sources read the shown frames from it"""
+        with self._lock:
+            if window_name not in self._queues:
+                self._queues[window_name] = queue.Queue(maxsize=self._queue_size)
+            return self._queues[window_name]
+
+    def open_capture(self, window_name, timeout=FRAMEBUFFER_READ_TIMEOUT):
+        """Create a frame source that sees the given window like a camera pointed at it"""
+        return FramebufferCapture(self.get_queue(window_name), timeout)
+
+    def show(self, window_name, image):
+        """Publish a frame of the given window, published frames must not be modified afterwards"""
+        self._publish(window_name, image)
+
+    def pump(self):
+        """Nothing to process, there are no real windows"""
+
+    def close(self, window_name):
+        """Close the given window, frame sources see an empty screen from now on"""
+        self._publish(window_name, None)
+
+    def close_all(self):
+        """Close all windows"""
+        with self._lock:
+            window_names = list(self._queues)
+        for window_name in window_names:
+            self.close(window_name)
+
+    def _publish(self, window_name, frame):
+        """Put a frame in the window queue, dropping the oldest frame when the queue is full"""
+        frames = self.get_queue(window_name)
+        while True:
+            try:
+                frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    pass
+
+class FramebufferCapture:
+    """Frame source reading the frames a FramebufferBackend publishes for one window, a drop-in for cv2.VideoCapture"""
+
+    def __init__(self, frames, timeout=FRAMEBUFFER_READ_TIMEOUT):
+        self._frames = frames
+        self._timeout = timeout
+        self._current = None
+
+    def read(self, image=None):
+        """Return (ret, frame) with the latest frame shown in the window, like a camera pointed at the screen.
+
+        The frame is copied into image when it has its size, published frames are shared and must not be written.
+        """
+        try:
+            if self._current is None:
+                # Nothing on screen yet, wait a little for the first frame instead of spinning
+                self._current = self._frames.get(timeout=self._timeout)
+            while True:
+                self._current = self._frames.get_nowait()
+        except queue.Empty:
+            pass
+        current = self._current
+        if current is not None and image is not None and image.shape == current.shape and image.dtype == current.dtype:
+            np.copyto(image, current)
+            return True, image
+        return current is not None, current
+
+    def release(self):
+        """Nothing to release, provided for cv2.VideoCapture compatibility"""
+        self._current = None
+
+def get_display_backend():
+    """Return the active display backend, an OpenCV window backend unless another one was set"""
+    global _display_backend
+    if _display_backend is None:
+        _display_backend = OpenCVWindowBackend()
+    return _display_backend
+
+def set_display_backend(backend):
+    """Set the display backend every display function draws to, None restores the default on next use"""
+    global _display_backend
+    _display_backend = backend
+
+def show_frame(window_name, image):
+    """Show an image in the given long-lived window of the active display backend"""
+    with timer('display'):
+        get_display_backend().show(window_name, image)
+
+def pump_display_events():
+    """Process pending window events of the active display backend"""
+    get_display_backend().pump()
+
+def hold_display(seconds, clock=time.monotonic, sleep=time.sleep):
+    """Keep the shown frames on screen for the given seconds, pumping window events so the windows keep repainting"""
+    deadline = clock() + seconds
+    while clock() < deadline:
+        pump_display_events()
+        sleep(max(min(DISPLAY_PUMP_INTERVAL, deadline - clock()), 0))
+
+def set_window_region(window_name, index, count):
+    """Place the window in the index-th of count equal screen columns, like the lanes of a multi-lane transfer"""
+    _window_regions[window_name] = (index, count)
+
+def center_window(window_name, w, h):
+    """Resize the window to the given size and center it on screen, or in its screen column if it has one"""
+    screen_width, screen_height = get_screen_size()
+    index, count = _window_regions.get(window_name, (0, 1))
+    column_width = screen_width // count
+    # Assume QR fits on screen: center the window using the image size
+    x = index * column_width + max(0, (column_width - w) // 2)
+    y = max(0, (screen_height - h) // 2)
     try:
         cv2.resizeWindow(window_name, w, h)
     except Exception:
@@ -57,14 +351,43 @@ def display_qr_centered(qr_data_string, window_name):
     except Exception:
         pass
 
-    cv2.imshow(window_name, qr_np)
-    cv2.waitKey(1) # Needed to display the window
-    force_focus(window_name) # Force focus on QR window after displaying
+def play_carousel(frames, window_name, fps, should_stop=None, clock=time.monotonic, sleep=time.sleep):
+    """Show a list or generator of frames in the window at a fixed rate and return timing statistics.
+
+    Every frame has an absolute deadline on the monotonic clock so sleep jitter does not accumulate.
+    A frame shown a full period or more after its deadline counts as missed, and the schedule is then
+    moved to the current time instead of rushing the following frames to catch up.
+    """
+    period = 1.0 / fps
+    stats = {'frames_shown': 0, 'missed_deadlines': 0, 'max_lateness': 0.0, 'duration': 0.0}
+    start = clock()
+    deadline = start
+    for frame in frames:
+        if should_stop and should_stop():
+            break
+        # The frame is produced before waiting, so rendering overlaps the time left in the current slot
+        now = clock()
+        if now < deadline:
+            sleep(deadline - now)
+            now = clock()
+
+        lateness = now - deadline
+        stats['max_lateness'] = max(stats['max_lateness'], lateness)
+        if lateness >= period:
+            stats['missed_deadlines'] += 1
+            deadline = now
+
+        show_frame(window_name, frame)
+        stats['frames_shown'] += 1
+        deadline += period
+
+    stats['duration'] = clock() - start
+    return stats
 
 def close_qr_window(qr_window_name):
     """Close the QR code display window"""
-    cv2.destroyWindow(qr_window_name)
+    get_display_backend().close(qr_window_name)
 
 def close_all_qr_windows():
     """Close all QR code display windows"""
-    cv2.destroyAllWindows()
\ No newline at end of file
+    get_display_backend().close_all()
@@ -0,0 +1,60 @@
+from functools import partial
+import os
+from camera_handler import get_next_qr_data, get_web_cam, get_qr_from_frame
+from display_utils import display_qr_centered, close_qr_window, hold_display
+from protocol_utils import attach_ack, create_approval_payload, MAX_SACK_BLOCKS
+from file_utils import select_save_directory, read_file_data
+from calibration import MAX_CHUNK_ID
+from progress import combine_summaries
+from sender import pick_file, prepare_chunks, create_session_encoder, sent_file_summary
+from receiver import save_received_file
+from session import DuplexSession, run_session
+
+DUPLEX_WINDOW_NAME = "Duplex QR"
+# Seconds the last approval stays on screen after the exchange, until the peer sees it
+DUPLEX_LINGER = 1.5
+# Longest ack field a frame can carry, the symbol version leaves room for it next to every chunk
+LARGEST_APPROVAL = create_approval_payload(MAX_CHUNK_ID, [(MAX_CHUNK_ID, MAX_CHUNK_ID)] * MAX_SACK_BLOCKS)
+
+def duplex_main(file_path=None, output_dir=None, open_files=True):
+    """Main duplex function that sends a file to the peer while receiving the file the peer sends at the same time.
+
+    The file is picked in a dialog when no path is given, and the received file is saved in output_dir, or in a
+    directory picked in a dialog. Returns the summary of both files, or None if no file was selected.
+    """
+    cam = get_web_cam()
+    file_name, file_data = read_file_data(file_path) if file_path else pick_file()
+    if not file_name:
+        print("No file selected, aborting.")
+        return None
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        directory_to_save_in = output_dir
+    else:
+        directory_to_save_in = select_save_directory()
+    if not directory_to_save_in:
+        print("No directory selected, aborting.")
+        return None
+
+    sent_summary, (file_metadata, received_data) = exchange_files(cam, file_name, file_data)
+    close_qr_window(DUPLEX_WINDOW_NAME)
+    received_summary = save_received_file(directory_to_save_in, file_metadata, received_data, open_files)
+    return combine_summaries([sent_summary, received_summary])
+
+def exchange_files(cam, file_name, file_data, window_name=DUPLEX_WINDOW_NAME, on_progress=None):
+    """Send the file while receiving the peer's file, every frame carrying a chunk and the approval for the peer.
+
+    Returns the summary of the sent file, and the metadata and data of the received file.
+    """
+    chunks_to_send, _, box_size = prepare_chunks(file_name, file_data)
+    encoder = create_session_encoder([attach_ack(chunk, LARGEST_APPROVAL) for chunk in chunks_to_send])
+    session = DuplexSession(chunks_to_send, on_progress)
+
+    def show(qr_data_string):
+        display_qr_centered(qr_data_string, window_name, encoder, get_qr_from_frame, box_size)
+
+    print(f"Exchanging files, sending '{file_name}'")
+    run_session(session, partial(get_next_qr_data, cam), show)
+    hold_display(DUPLEX_LINGER) # Keep the last approval on screen until the peer sees it
+    print(f"Received file: {session.receiver.file_metadata['file_name']}")
+    return sent_file_summary(session.sender, file_name, file_data), (session.receiver.file_metadata, session.receiver.file_data())
@@ -0,0 +1,53 @@
+from collections import deque
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+
+# Error correction levels from the least to the most redundant, qrcode's constants are not ordered
+ERROR_CORRECTION_LEVELS = [ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H]
+LEVEL_NAMES = {ERROR_CORRECT_L: "L", ERROR_CORRECT_M: "M", ERROR_CORRECT_Q: "Q", ERROR_CORRECT_H: "H"}
+# Outcomes of the most recent chunks the level is judged on
+ADAPT_WINDOW = 16
+# Share of retransmission timeouts among the recent outcomes that moves to a more redundant level
+RAISE_LOSS_RATE = 0.25
+# Smoothed round-trip time in seconds under which a clean link counts as fast and moves to a less redundant level
+FAST_RTT = 0.5
+
+class ErrorCorrectionAdapter:
+    """Error correction level of the sender, following the receiver feedback of the transfer.
+
+    Every approved chunk and every retransmission timeout is an outcome. When timeouts make up RAISE_LOSS_RATE of
+    the last window outcomes the level moves up to a more redundant one. When the last window outcomes are all
+    approvals and the smoothed round-trip time is under fast_rtt it moves down. The outcomes are cleared on every
+    change, so the new level is judged on its own frames.
+    """
+
+    def __init__(self, level=ERROR_CORRECT_M, window=ADAPT_WINDOW, raise_loss_rate=RAISE_LOSS_RATE, fast_rtt=FAST_RTT):
+        self.level = level
+        self.window = window
+        self.raise_loss_rate = raise_loss_rate
+        self.fast_rtt = fast_rtt
+        self.changes = 0
+        # True for a retransmission timeout, False for an approved chunk
+        self._outcomes = deque(maxlen=window)
+
+    def delivered(self, srtt):
+        """Count an approved chunk, srtt being the smoothed round-trip time so far (None before the first sample)"""
+        self._outcomes.append(False)
+        if len(self._outcomes) == self.window and not any(self._outcomes) and srtt is not None and srtt < self.fast_rtt:
+            self._step(-1)
+
+    def lost(self):
+        """Count a retransmission timeout"""
+        self._outcomes.append(True)
+        if sum(self._outcomes) >= self.raise_loss_rate * self.window:
+            self._step(1)
+
+    def snapshot(self):
+        """Return the level and the number of changes as a dict"""
+        return {'level': LEVEL_NAMES[self.level], 'changes': self.changes}
+
+    def _step(self, direction):
+        index = ERROR_CORRECTION_LEVELS.index(self.level) + direction
+        if 0 <= index < len(ERROR_CORRECTION_LEVELS):
+            self.level = ERROR_CORRECTION_LEVELS[index]
+            self.changes += 1
+            self._outcomes.clear()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from camera_handler import get_web_cam, get_qr_from_frame, RegionCapture
+from display_utils import set_window_region, close_qr_window
+from protocol_utils import create_lane_chunks
+from async_runtime import AsyncQRStream, AsyncQRDisplay, run_session_async
+from sender import create_session_encoder
+from session import SenderSession, ReceiverSession, reassemble_striped_file_data
+from rtt import combine_rtt_snapshots, format_rtt
+
+class Lane:
+    """One path of a multi-lane transfer: a window in its own screen column and the frame source watching the peer's lane"""
+
+    def __init__(self, window_name, cam):
+        self.window_name = window_name
+        self.cam = cam
+
+def open_lanes(window_name, count, camera_indices=None):
+    """Create count lanes with windows side by side in screen columns, lane i is watched by the peer's lane i.
+
+    Every lane reads its own camera when camera indices are given, otherwise the lanes share one camera and each
+    reads its column of the frames.
+    """
+    if camera_indices:
+        if len(camera_indices) != count:
+            raise ValueError(f"{count} lanes need {count} cameras, got {len(camera_indices)}")
+        cams = [get_web_cam(index) for index in camera_indices]
+    else:
+        cam, lock = get_web_cam(), threading.Lock()
+        cams = [RegionCapture(cam, index, count, lock) for index in range(count)]
+
+    lanes = []
+    for index, cam in enumerate(cams):
+        lane_window_name = f"{window_name} lane {index + 1}"
+        set_window_region(lane_window_name, index, count)
+        lanes.append(Lane(lane_window_name, cam))
+    return lanes
+
+def close_lanes(lanes):
+    """Close the windows of the lanes"""
+    for lane in lanes:
+        close_qr_window(lane.window_name)
+
+async def send_file_lanes(lanes, file_name, file_data):
+    """Send the file striped over the lanes, each lane running its own sender session and flow control.
+
+    Returns the transfer summary: file name, file size, number of data chunks, lane count and combined timer statistics.
+    """
+    lane_chunks = create_lane_chunks(file_name, file_data, len(lanes))
+    # One encoder for every lane keeps all symbols the same size
+    encoder = create_session_encoder([chunk for chunks in lane_chunks for chunk in chunks])
+    sessions = [SenderSession(chunks) for chunks in lane_chunks]
+
+    async def run_lane(lane, session):
+        async with AsyncQRStream(lane.cam) as frames, AsyncQRDisplay(lane.window_name, encoder, get_qr_from_frame) as display:
+            await run_session_async(session, frames, display, prefetch=True)
+
+    await asyncio.gather(*(run_lane(lane, session) for lane, session in zip(lanes, sessions)))
+    print(f"File '{file_name}' sent successfully over {len(lanes)} lanes!")
+    rtt = combine_rtt_snapshots([session.rtt.snapshot() for session in sessions])
+    print(format_rtt(rtt))
+    return {
+        'file_name': file_name,
+        'file_size': len(file_data),
+        'total_chunks': sum(len(chunks) - 1 for chunks in lane_chunks),
+        'lanes': len(lanes),
+        'rtt': rtt,
+    }
+
+async def receive_file_lanes(lanes):
+    """Receive a file striped over the lanes, each lane running its own receiver session.
+
+    Returns the file metadata and the file data reassembled from every lane.
+    """
+    print(f"Waiting for file transfer to start on {len(lanes)} lanes")
+    sessions = [ReceiverSession() for _ in lanes]
+
+    async def run_lane(lane, session):
+        async with AsyncQRStream(lane.cam) as frames, AsyncQRDisplay(lane.window_name) as display:
+            await run_session_async(session, frames, display)
+            await asyncio.sleep(1.5) # Keep the last approval on screen until the sender sees it
+
+    await asyncio.gather(*(run_lane(lane, session) for lane, session in zip(lanes, sessions)))
+    # Lanes are put back in the sender's lane order, a camera may see the peer's lanes in another order
+    sessions.sort(key=lambda session: session.file_metadata.get('lane', -1))
+    file_metadata = check_lane_metadata([session.file_metadata for session in sessions])
+    print("Reconstructing the file from the chunks of every lane")
+    return file_metadata, reassemble_striped_file_data([session.chunks_data for session in sessions])
+
+def check_lane_metadata(lanes_metadata):
+    """Return the metadata of the file received over the lanes, raises ValueError if the lanes carried different files"""
+    file_names = {metadata['file_name'] for metadata in lanes_metadata}
+    lane_indices = [metadata.get('lane') for metadata in lanes_metadata]
+    if len(file_names) != 1 or lane_indices != list(range(len(lanes_metadata))):
+        raise ValueError(f"Lanes do not carry one file: names {sorted(file_names)}, lanes {lane_indices}")
+    return {
+        'file_name': lanes_metadata[0]['file_name'],
+        'total_chunks': sum(metadata['total_chunks'] for metadata in lanes_metadata),
+    }
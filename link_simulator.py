@@ -0,0 +1,229 @@
+import collections
+import cv2
+import numpy as np
+
+CAMERA_WIDTH, CAMERA_HEIGHT = 1280, 720
+# How much of the camera frame height the displayed symbol covers
+SYMBOL_FRAME_COVERAGE = 0.8
+# Gray level of whatever surrounds the screen in the camera view
+BACKGROUND_LEVEL = 128
+
+# Every impairment draws from its own random stream per frame, so enabling one never changes the draws of another
+IMPAIRMENTS = ['drop', 'tear', 'warp', 'moire', 'motion', 'exposure', 'noise']
+
+class LinkConditions:
+    """Impairments of a simulated screen to camera link, every impairment is off by default.
+
+    perspective:    max corner displacement of the perspective warp, as a fraction of the symbol size
+    defocus:        radius in camera pixels of the defocus blur disk
+    motion_blur:    length in camera pixels of the motion blur streak, drawn at a random angle per frame
+    noise:          standard deviation of the Gaussian sensor noise, in gray levels
+    exposure:       mean gain applied to the frame brightness (1.0 = correctly exposed)
+    exposure_jitter: standard deviation of the per frame gain around exposure
+    moire:          amplitude of the interference fringes, as a fraction of the brightness
+    drop_rate:      probability the camera delivers no frame
+    tear_rate:      probability a frame catches the screen half refreshed, new symbol on top and old one below
+    latency_frames: frames between a symbol being shown and the camera seeing it
+    """
+
+    def __init__(self, perspective=0.0, defocus=0.0, motion_blur=0, noise=0.0, exposure=1.0, exposure_jitter=0.0,
+                 moire=0.0, drop_rate=0.0, tear_rate=0.0, latency_frames=0,
+                 frame_size=(CAMERA_WIDTH, CAMERA_HEIGHT), coverage=SYMBOL_FRAME_COVERAGE):
+        if not 0 <= drop_rate <= 1 or not 0 <= tear_rate <= 1:
+            raise ValueError(f"Drop and tear rates should be probabilities (got {drop_rate}, {tear_rate})")
+        if latency_frames < 0:
+            raise ValueError(f"Latency should not be negative (got {latency_frames} frames)")
+        self.perspective = perspective
+        self.defocus = defocus
+        self.motion_blur = motion_blur
+        self.noise = noise
+        self.exposure = exposure
+        self.exposure_jitter = exposure_jitter
+        self.moire = moire
+        self.drop_rate = drop_rate
+        self.tear_rate = tear_rate
+        self.latency_frames = latency_frames
+        self.frame_size = frame_size
+        self.coverage = coverage
+
+    def __repr__(self):
+        settings = ", ".join(f"{name}={value!r}" for name, value in vars(self).items())
+        return f"LinkConditions({settings})"
+
+# Named links so benchmarks and tests compare protocol variants on the same conditions
+LINK_PRESETS = {
+    'clean': LinkConditions(),
+    'handheld': LinkConditions(perspective=0.05, motion_blur=5, noise=4.0, exposure_jitter=0.05),
+    'dim': LinkConditions(exposure=0.45, exposure_jitter=0.05, noise=8.0, defocus=1.5),
+    'noisy': LinkConditions(perspective=0.03, defocus=1.0, noise=10.0, moire=0.08, drop_rate=0.1, tear_rate=0.1,
+                            latency_frames=1),
+}
+
+class LinkSimulator:
+    """Seeded screen to camera channel turning each displayed image into the frame a camera would capture.
+
+    The same conditions and seed always produce the same frames for the same sequence of displayed images.
+    """
+
+    def __init__(self, conditions=None, seed=0):
+        self.conditions = conditions or LinkConditions()
+        self.seed = seed
+        self.reset()
+
+    def reset(self):
+        """Forget the screen history and start again from the first frame"""
+        # Screen contents still on their way to the camera, the oldest one is what the camera sees now
+        self._in_flight = collections.deque(maxlen=self.conditions.latency_frames + 1)
+        self._previous_screen = None
+        self.frames_transmitted = 0
+        self.frames_dropped = 0
+        self.frames_torn = 0
+
+    def transmit(self, image):
+        """Return the BGR camera frame of the displayed image, or None when the frame is dropped or nothing is shown yet"""
+        self.frames_transmitted += 1
+        self._in_flight.append(image)
+        screen = self._in_flight[0] if len(self._in_flight) == self._in_flight.maxlen else None
+
+        if screen is not None:
+            previous_screen, self._previous_screen = self._previous_screen, screen
+            tear_rng = self._rng('tear')
+            torn = previous_screen is not None and tear_rng.random() < self.conditions.tear_rate
+            if torn and previous_screen.shape == screen.shape:
+                screen = self._tear(screen, previous_screen, tear_rng.random())
+                self.frames_torn += 1
+
+        if self._rng('drop').random() < self.conditions.drop_rate:
+            self.frames_dropped += 1
+            return None
+        if screen is None:
+            return None
+        return self._capture(screen)
+
+    def _rng(self, impairment):
+        """Random generator of the given impairment for the current frame, only depends on the seed and the frame number"""
+        return np.random.default_rng((self.seed, IMPAIRMENTS.index(impairment), self.frames_transmitted))
+
+    def _tear(self, screen, previous_screen, position):
+        """Combine the top of the new screen with the bottom of the previous one at the refresh row position"""
+        row = 1 + int(position * (screen.shape[0] - 1))
+        torn = screen.copy()
+        torn[row:] = previous_screen[row:]
+        return torn
+
+    def _capture(self, screen):
+        """Apply the optics and the sensor of the camera to the screen contents"""
+        conditions = self.conditions
+        frame = self._place(screen)
+        frame = self._warp(frame)
+        frame = self._add_moire(frame)
+        if conditions.defocus > 0:
+            frame = cv2.filter2D(frame, -1, _disk_kernel(conditions.defocus), borderType=cv2.BORDER_REPLICATE)
+        frame = self._blur_motion(frame)
+        frame = self._expose(frame)
+        frame = self._add_noise(frame)
+        gray = np.clip(frame, 0, 255).astype(np.uint8)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+    def _place(self, screen):
+        """Scale the screen into the middle of the camera frame as a float32 grayscale image"""
+        width, height = self.conditions.frame_size
+        if screen.ndim == 3:
+            screen = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
+        scale = self.conditions.coverage * height / screen.shape[0]
+        symbol = cv2.resize(screen, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        h, w = symbol.shape
+        h, w = min(h, height), min(w, width)
+        frame = np.full((height, width), BACKGROUND_LEVEL, dtype=np.float32)
+        y, x = (height - h) // 2, (width - w) // 2
+        frame[y:y + h, x:x + w] = symbol[:h, :w]
+        self._symbol_box = (x, y, w, h)
+        return frame
+
+    def _warp(self, frame):
+        """Apply a random perspective warp by moving each symbol corner up to the configured fraction"""
+        if self.conditions.perspective <= 0:
+            return frame
+        jitter = self._rng('warp').uniform(-1, 1, size=(4, 2))
+        x, y, w, h = self._symbol_box
+        corners = np.float32([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+        moved = corners + (jitter * self.conditions.perspective * max(w, h)).astype(np.float32)
+        matrix = cv2.getPerspectiveTransform(corners, moved)
+        height, width = frame.shape
+        return cv2.warpPerspective(frame, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=BACKGROUND_LEVEL)
+
+    def _add_moire(self, frame):
+        """Overlay interference fringes of a random orientation and phase, near the camera pixel pitch"""
+        if self.conditions.moire <= 0:
+            return frame
+        rng = self._rng('moire')
+        angle, phase = rng.uniform(0, np.pi), rng.uniform(0, 2 * np.pi)
+        period = rng.uniform(3.0, 8.0)
+        height, width = frame.shape
+        ys, xs = np.ogrid[:height, :width]
+        projection = (xs * np.cos(angle) + ys * np.sin(angle)).astype(np.float32)
+        fringes = np.sin(projection * np.float32(2 * np.pi / period) + np.float32(phase))
+        return frame * (1 + np.float32(self.conditions.moire) * fringes)
+
+    def _blur_motion(self, frame):
+        """Smear the frame along a random direction like a camera moving during the exposure"""
+        length = int(self.conditions.motion_blur)
+        if length <= 1:
+            return frame
+        angle = self._rng('motion').uniform(0, 180)
+        return cv2.filter2D(frame, -1, _motion_kernel(length, angle), borderType=cv2.BORDER_REPLICATE)
+
+    def _expose(self, frame):
+        """Scale the brightness by the exposure gain of this frame"""
+        gain = self.conditions.exposure
+        if self.conditions.exposure_jitter > 0:
+            gain += self.conditions.exposure_jitter * self._rng('exposure').standard_normal()
+        if gain == 1.0:
+            return frame
+        return frame * np.float32(max(gain, 0.0))
+
+    def _add_noise(self, frame):
+        """Add Gaussian sensor noise"""
+        if self.conditions.noise <= 0:
+            return frame
+        noise = self._rng('noise').standard_normal(frame.shape, dtype=np.float32)
+        return frame + noise * np.float32(self.conditions.noise)
+
+class SimulatedCamera:
+    """Frame source passing the frames of another source through a link simulator, a drop-in for cv2.VideoCapture"""
+
+    def __init__(self, source, simulator):
+        self.source = source
+        self.simulator = simulator
+
+    def read(self, image=None):
+        """Return (ret, frame) with the next frame of the source as the simulated camera captures it.
+
+        The frame is copied into image when it has its size, like cv2.VideoCapture.read does.
+        """
+        ret, source_image = self.source.read()
+        frame = self.simulator.transmit(source_image if ret else None)
+        if frame is not None and image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return True, image
+        return frame is not None, frame
+
+    def release(self):
+        """Release the wrapped frame source"""
+        self.source.release()
+
+def _disk_kernel(radius):
+    """Normalized disk kernel of the given radius, the blur of an out of focus lens"""
+    size = 2 * int(np.ceil(radius)) + 1
+    kernel = np.zeros((size, size), dtype=np.float32)
+    cv2.circle(kernel, (size // 2, size // 2), max(int(round(radius)), 1), 1.0, thickness=-1)
+    return kernel / kernel.sum()
+
+def _motion_kernel(length, angle):
+    """Normalized line kernel of the given length and angle in degrees"""
+    kernel = np.zeros((length, length), dtype=np.float32)
+    kernel[length // 2, :] = 1.0
+    rotation = cv2.getRotationMatrix2D(((length - 1) / 2, (length - 1) / 2), angle, 1.0)
+    kernel = cv2.warpAffine(kernel, rotation, (length, length))
+    return kernel / kernel.sum()
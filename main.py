@@ -1,18 +1,109 @@
+import argparse
 import sys
-from receiver import receiver_main
-from sender import sender_main
+from functools import partial
 
 def main():
     """The main entry point for the application. It reads command-line arguments to determine the mode for the applicationn sender/receiver"""
     mode = sys.argv[1]
+    # Each mode imports its own module so the heavy camera, QR and GUI dependencies load only when needed
     if mode == 'sender':
+        from sender import sender_main
+        options = parse_options(mode, sys.argv[2:])
         print('Starting sender mode')
-        sender_main()
+        run_mode(mode, partial(sender_main, file_paths=options.files, calibrate=options.calibrate, lanes=options.lanes,
+                               cameras=options.cameras, broadcast=options.broadcast, symbols=options.symbols,
+                               adaptive_ecc=options.adaptive_ecc), options)
     elif mode == 'receiver':
+        from receiver import receiver_main
+        options = parse_options(mode, sys.argv[2:])
         print('Starting receiver mode')
-        receiver_main()
+        run_mode(mode, partial(receiver_main, output_dir=options.output_dir, count=options.count,
+                               open_files=not options.no_open, lanes=options.lanes, cameras=options.cameras,
+                               broadcast=options.broadcast, groups=options.groups), options)
+    elif mode == 'duplex':
+        from duplex import duplex_main
+        options = parse_options(mode, sys.argv[2:])
+        print('Starting duplex mode')
+        run_mode(mode, partial(duplex_main, file_path=options.file, output_dir=options.output_dir,
+                               open_files=not options.no_open), options)
     else:
-        print("Invalid mode. Use 'sender' or 'receiver'.")
+        print("Invalid mode. Use 'sender', 'receiver' or 'duplex'.")
+
+def parse_options(mode, args):
+    """Parse the command-line arguments following the mode.
+
+    Without files (sender, duplex) or --output-dir (receiver, duplex) the file dialogs are used, like when running
+    without options.
+    """
+    from profiling import PROFILERS, DEFAULT_PROFILER
+    from protocol_utils import MAX_GROUP_SYMBOLS
+    parser = argparse.ArgumentParser(prog=f"main.py {mode}")
+    if mode == 'sender':
+        parser.add_argument('files', nargs='*', help="files sent back to back in one session, picked in a dialog when none are given")
+        parser.add_argument('--calibrate', action='store_true', help="pick the QR density with a calibration handshake first")
+        parser.add_argument('--broadcast', type=int, default=0, metavar='RECEIVERS', help="show the files as a carousel until this many receivers have them")
+        parser.add_argument('--adaptive-ecc', action='store_true', help="move the QR error correction level between L and H with the receiver feedback")
+        parser.add_argument('--symbols', type=int, default=1, help=f"show every chunk as a Structured Append group of up to this many symbols (at most {MAX_GROUP_SYMBOLS})")
+    elif mode == 'duplex':
+        parser.add_argument('file', nargs='?', help="file sent to the peer, picked in a dialog when not given")
+    if mode != 'sender':
+        parser.add_argument('-o', '--output-dir', help="directory the files are saved in, picked in a dialog when not given")
+        parser.add_argument('--no-open', action='store_true', help="do not open the received files")
+    if mode == 'receiver':
+        parser.add_argument('-n', '--count', type=int, default=1, help="number of files received back to back, 0 keeps receiving until interrupted")
+        parser.add_argument('--broadcast', action='store_true', help="receive from a sender broadcasting to several receivers")
+        parser.add_argument('--groups', action='store_true', help="read chunks a sender shows as groups of symbols with --symbols")
+    if mode != 'duplex':
+        parser.add_argument('--lanes', type=int, default=1, help="stripe files over this many windows side by side, watched by as many cameras or camera columns")
+        parser.add_argument('--cameras', type=int, nargs='+', help="camera index of every lane, the lanes share camera 0 when not given")
+    parser.add_argument('--metrics', help="write per-stage timing to this file (JSON, or Prometheus text for .prom/.txt)")
+    parser.add_argument('--metrics-interval', type=float, default=None, help="seconds between two metrics file updates")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PROFILER, choices=PROFILERS, help="run under the profiler")
+    parser.add_argument('--profile-output', default=f"{mode}_profile", help="prefix of the profile output files")
+    options = parser.parse_args(args)
+    if mode != 'duplex':
+        if options.lanes < 1:
+            parser.error("--lanes must be at least 1")
+        if options.cameras and len(options.cameras) != options.lanes:
+            parser.error("--cameras needs one camera index per lane")
+        if mode == 'sender' and options.calibrate and options.lanes > 1:
+            parser.error("--calibrate needs a single lane")
+        if options.broadcast and options.lanes > 1:
+            parser.error("--broadcast needs a single lane")
+        if mode == 'sender' and options.calibrate and options.broadcast:
+            parser.error("--calibrate needs a single receiver, not --broadcast")
+        if mode == 'sender' and not 1 <= options.symbols <= MAX_GROUP_SYMBOLS:
+            parser.error(f"--symbols must be between 1 and {MAX_GROUP_SYMBOLS}")
+        if mode == 'sender' and options.symbols > 1 and options.lanes > 1:
+            parser.error("--symbols needs a single lane")
+        if mode == 'sender' and options.adaptive_ecc and (options.calibrate or options.broadcast or options.lanes > 1):
+            parser.error("--adaptive-ecc needs a single lane to a single receiver, without --calibrate")
+    return options
+
+def run_mode(mode, mode_main, options):
+    """Run the mode, under the profiler when --profile is given"""
+    if not options.profile:
+        return run_with_metrics(mode_main, options)
+
+    from profiling import SessionProfiler
+    profiler = SessionProfiler(options.profile)
+    summary = profiler.run(run_with_metrics, mode_main, options)
+    paths = profiler.write(options.profile_output, dict(summary or {}, mode=mode))
+    print(f"Profile written to {', '.join(paths)}")
+    return summary
+
+def run_with_metrics(mode_main, options):
+    """Run the mode, with per-stage timing exported to the --metrics file (JSON, or Prometheus text for .prom/.txt)"""
+    if not options.metrics:
+        return mode_main()
+
+    from metrics import enable_metrics, MetricsExporter, DEFAULT_EXPORT_INTERVAL
+    enable_metrics()
+    interval = options.metrics_interval if options.metrics_interval is not None else DEFAULT_EXPORT_INTERVAL
+    with MetricsExporter(options.metrics, interval):
+        summary = mode_main()
+    print(f"Stage timing metrics written to {options.metrics}")
+    return summary
 
 if __name__ == '__main__':
     main()
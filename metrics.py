@@ -0,0 +1,215 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Upper bounds in seconds of the histogram buckets, shared by every stage so exports line up
+BUCKET_BOUNDS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+PROMETHEUS_METRIC = "file_transfer_stage_duration_seconds"
+DEFAULT_EXPORT_INTERVAL = 10.0
+
+# Timers hand out this shared do-nothing context while instrumentation is off
+_DISABLED_TIMER = nullcontext()
+
+_enabled = False
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds, percentiles are estimated from the bucket counts"""
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = bounds
+        # The last bucket holds the values above the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one duration"""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, quantile):
+        """Estimate the given quantile (0 to 1) by linear interpolation inside the bucket that holds it"""
+        with self._lock:
+            counts, count, low, high = list(self.counts), self.count, self.min, self.max
+        if not count:
+            return None
+        rank = quantile * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else high
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                # The observed extremes are exact, never estimate outside them
+                return min(max(estimate, low), high)
+            seen += bucket_count
+        return high
+
+    def snapshot(self):
+        """Return the histogram summary as a JSON serializable dict"""
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, buckets = 0, {}
+        for bound, bucket_count in zip(list(self.bounds) + ["+Inf"], counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        summary = {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else None,
+            'min': self.min,
+            'max': self.max,
+            'buckets': buckets,
+        }
+        for quantile in QUANTILES:
+            summary[f"p{round(quantile * 100)}"] = self.percentile(quantile)
+        return summary
+
+class _StageTimer:
+    """Context manager adding the duration of the enclosed block to a stage histogram"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+def enable_metrics():
+    """Turn the stage timers on, already recorded histograms are kept"""
+    global _enabled
+    _enabled = True
+
+def disable_metrics():
+    """Turn the stage timers off, timers then cost a single flag check"""
+    global _enabled
+    _enabled = False
+
+def metrics_enabled():
+    """Return whether the stage timers record durations"""
+    return _enabled
+
+def reset_metrics():
+    """Drop every recorded histogram"""
+    with _histograms_lock:
+        _histograms.clear()
+
+def get_histogram(stage):
+    """Return the histogram of the given stage, created on first use"""
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(stage, Histogram())
+    return histogram
+
+def timer(stage):
+    """Time the enclosed block as the given stage: `with timer('capture'): ...`, a no-op while metrics are off"""
+    if not _enabled:
+        return _DISABLED_TIMER
+    return _StageTimer(get_histogram(stage))
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere for the given stage"""
+    if _enabled:
+        get_histogram(stage).observe(seconds)
+
+def metrics_snapshot():
+    """Return every stage summary as a JSON serializable dict keyed by stage name"""
+    with _histograms_lock:
+        histograms = dict(_histograms)
+    return {stage: histogram.snapshot() for stage, histogram in sorted(histograms.items())}
+
+def metrics_to_json():
+    """Export every stage summary as JSON text"""
+    return json.dumps({'timestamp': time.time(), 'stages': metrics_snapshot()}, indent=2)
+
+def metrics_to_prometheus():
+    """Export every stage as a Prometheus histogram, plus the p50/p95/p99 estimates as a gauge"""
+    snapshot = metrics_snapshot()
+    lines = [
+        f"# HELP {PROMETHEUS_METRIC} Duration of each file transfer pipeline stage.",
+        f"# TYPE {PROMETHEUS_METRIC} histogram",
+    ]
+    for stage, summary in snapshot.items():
+        for bound, cumulative in summary['buckets'].items():
+            lines.append(f'{PROMETHEUS_METRIC}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PROMETHEUS_METRIC}_sum{{stage="{stage}"}} {summary["sum"]}')
+        lines.append(f'{PROMETHEUS_METRIC}_count{{stage="{stage}"}} {summary["count"]}')
+
+    quantile_metric = f"{PROMETHEUS_METRIC}_quantile"
+    lines.append(f"# HELP {quantile_metric} Estimated quantiles of each stage duration.")
+    lines.append(f"# TYPE {quantile_metric} gauge")
+    for stage, summary in snapshot.items():
+        for quantile in QUANTILES:
+            value = summary[f"p{round(quantile * 100)}"]
+            if value is not None:
+                lines.append(f'{quantile_metric}{{stage="{stage}",quantile="{quantile}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path, metrics_format=None):
+    """Write the metrics to a file, as Prometheus text for .prom/.txt paths and JSON otherwise"""
+    if metrics_format is None:
+        metrics_format = 'prometheus' if path.endswith(('.prom', '.txt')) else 'json'
+    text = metrics_to_prometheus() if metrics_format == 'prometheus' else metrics_to_json()
+    # Write next to the target and swap it in, so a reader polling the file never sees half an export
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+class MetricsExporter:
+    """Background thread writing the metrics to a file every interval seconds during a transfer, and once more on stop"""
+
+    def __init__(self, path, interval=DEFAULT_EXPORT_INTERVAL, metrics_format=None):
+        self.path = path
+        self.interval = interval
+        self.metrics_format = metrics_format
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the periodic export"""
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the periodic export and write the final metrics"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        write_metrics(self.path, self.metrics_format)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            write_metrics(self.path, self.metrics_format)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
@@ -0,0 +1,123 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILERS = ['cprofile', 'sample']
+DEFAULT_PROFILER = 'cprofile'
+# Seconds between two stack samples, 200 Hz keeps the sampler overhead to a few percent of one core
+SAMPLE_INTERVAL = 0.005
+
+class SamplingProfiler:
+    """Background thread sampling the stack of every other thread at a fixed interval"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        # (thread name, frame labels from the outermost call) -> sample count
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling"""
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampler thread to finish"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    self.samples[(thread_names.get(ident, str(ident)), _stack_labels(frame))] += 1
+
+    def collapsed_lines(self, root_label):
+        """Return the samples as collapsed stack lines ("root;thread;outer;...;inner count") for flamegraph tools"""
+        root_label = root_label.replace(";", ",")
+        lines = []
+        for (thread_name, stack), count in sorted(self.samples.items()):
+            lines.append(";".join((root_label, f"thread {thread_name}") + stack) + f" {count}")
+        return lines
+
+class SessionProfiler:
+    """Profiles one sender or receiver run and writes its results labelled with the session metadata.
+
+    The cprofile profiler records exact call counts of the main thread into a pstats file, the sample profiler
+    only samples stacks, at a much lower overhead. Both write a collapsed-stack file of every thread.
+    """
+
+    def __init__(self, profiler=DEFAULT_PROFILER, interval=SAMPLE_INTERVAL):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profiler}', use one of {PROFILERS}")
+        self.profiler = profiler
+        self.sampler = SamplingProfiler(interval)
+        self.cprofile = cProfile.Profile() if profiler == 'cprofile' else None
+        self.duration = None
+
+    def run(self, func, *args, **kwargs):
+        """Call the function under the profiler and return its result"""
+        start = time.perf_counter()
+        self.sampler.start()
+        if self.cprofile:
+            self.cprofile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if self.cprofile:
+                self.cprofile.disable()
+            self.sampler.stop()
+            self.duration = time.perf_counter() - start
+
+    def write(self, output_prefix, metadata):
+        """Write <prefix>.pstats (cprofile only), <prefix>.collapsed and <prefix>.meta.json, return the written paths"""
+        metadata = dict(metadata, profiler=self.profiler, duration=self.duration,
+                        samples=sum(self.sampler.samples.values()), sample_interval=self.sampler.interval)
+        paths = []
+        directory = os.path.dirname(output_prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if self.cprofile:
+            paths.append(f"{output_prefix}.pstats")
+            self.cprofile.dump_stats(paths[-1])
+
+        paths.append(f"{output_prefix}.collapsed")
+        with open(paths[-1], "w") as f:
+            # The session label is the root frame, so every flamegraph of the file shows what run it came from
+            f.write("\n".join(self.sampler.collapsed_lines(session_label(metadata))) + "\n")
+
+        paths.append(f"{output_prefix}.meta.json")
+        with open(paths[-1], "w") as f:
+            json.dump(metadata, f, indent=2)
+        return paths
+
+def session_label(metadata):
+    """One line summary of a profiled session, e.g. "sender example.pdf 52100B 522chunks 84.2s\""""
+    parts = [str(metadata.get('mode', 'session'))]
+    if metadata.get('file_name'):
+        parts.append(str(metadata['file_name']))
+    if metadata.get('file_size') is not None:
+        parts.append(f"{metadata['file_size']}B")
+    if metadata.get('total_chunks') is not None:
+        parts.append(f"{metadata['total_chunks']}chunks")
+    if metadata.get('duration') is not None:
+        parts.append(f"{metadata['duration']:.1f}s")
+    return " ".join(parts)
+
+def _stack_labels(frame):
+    """Return the labels of a frame and its callers, outermost call first"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(labels))
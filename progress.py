@@ -0,0 +1,148 @@
+import time
+from rtt import combine_rtt_snapshots
+
+# Seconds between two progress reports, fast chunk loops otherwise spend a noticeable share of time printing
+PROGRESS_REPORT_INTERVAL = 0.25
+# Weight of the newest rate sample in the exponentially smoothed rates
+RATE_SMOOTHING = 0.3
+
+class ProgressReporter:
+    """Rate-limited transfer progress with smoothed throughput, ETA and duplicate/retransmit counts.
+
+    Reports go to the console (print by default) and to an optional callback receiving the snapshot dict,
+    at most once per interval and once more when the transfer finishes.
+    """
+
+    def __init__(self, total_chunks, callback=None, interval=PROGRESS_REPORT_INTERVAL, smoothing=RATE_SMOOTHING,
+                 clock=time.monotonic, output=print):
+        self.total_chunks = total_chunks
+        self.callback = callback
+        self.interval = interval
+        self.smoothing = smoothing
+        self.clock = clock
+        self.output = output
+
+        self.chunks = 0
+        self.bytes = 0
+        self.duplicates = 0
+        self.retransmits = 0
+        self.chunk_rate = None
+        self.byte_rate = None
+        self.start_time = clock()
+        # Progress at the previous rate sample, rates are smoothed over report intervals rather than single chunks
+        self._sample_time, self._sample_chunks, self._sample_bytes = self.start_time, 0, 0
+        self._next_report_time = self.start_time
+
+    def chunk_done(self, size):
+        """Count a newly received (or acknowledged) chunk of the given size in bytes"""
+        self.chunks += 1
+        self.bytes += size
+        self._maybe_report()
+
+    def duplicate(self):
+        """Count a chunk that was already received"""
+        self.duplicates += 1
+        self._maybe_report()
+
+    def retransmit(self):
+        """Count a chunk that had to be sent again"""
+        self.retransmits += 1
+        self._maybe_report()
+
+    def finish(self):
+        """Report the final progress regardless of the rate limit"""
+        self._update_rates(self.clock())
+        self._report(final=True)
+
+    def snapshot(self):
+        """Return the current progress numbers as a dict"""
+        elapsed = self.clock() - self.start_time
+        remaining_chunks = max(self.total_chunks - self.chunks, 0)
+        if remaining_chunks == 0:
+            eta = 0.0
+        elif self.chunk_rate:
+            eta = remaining_chunks / self.chunk_rate
+        else:
+            eta = None
+        return {
+            'chunks': self.chunks,
+            'total_chunks': self.total_chunks,
+            'percent': 100.0 * self.chunks / self.total_chunks if self.total_chunks else 100.0,
+            'bytes': self.bytes,
+            'elapsed': elapsed,
+            'bytes_per_sec': self.byte_rate,
+            'chunks_per_sec': self.chunk_rate,
+            'eta': eta,
+            'duplicates': self.duplicates,
+            'retransmits': self.retransmits,
+        }
+
+    def _maybe_report(self):
+        """Report if the last report is at least one interval old"""
+        now = self.clock()
+        if now < self._next_report_time:
+            return
+        self._next_report_time = now + self.interval
+        self._update_rates(now)
+        self._report()
+
+    def _update_rates(self, now):
+        """Fold the progress since the previous sample into the smoothed rates"""
+        elapsed = now - self._sample_time
+        if elapsed <= 0:
+            return
+        chunk_rate = (self.chunks - self._sample_chunks) / elapsed
+        byte_rate = (self.bytes - self._sample_bytes) / elapsed
+        if self.chunk_rate is None:
+            self.chunk_rate, self.byte_rate = chunk_rate, byte_rate
+        else:
+            self.chunk_rate += self.smoothing * (chunk_rate - self.chunk_rate)
+            self.byte_rate += self.smoothing * (byte_rate - self.byte_rate)
+        self._sample_time, self._sample_chunks, self._sample_bytes = now, self.chunks, self.bytes
+
+    def _report(self, final=False):
+        snapshot = self.snapshot()
+        if self.output:
+            self.output(format_progress(snapshot, final))
+        if self.callback:
+            self.callback(snapshot)
+
+def format_progress(snapshot, final=False):
+    """Format a progress snapshot as a single console line"""
+    rate = snapshot['bytes_per_sec']
+    rate_text = f"{format_size(rate)}/s" if rate is not None else "-- B/s"
+    if final:
+        timing = f"done in {snapshot['elapsed']:.1f}s"
+    else:
+        timing = f"ETA {snapshot['eta']:.0f}s" if snapshot['eta'] is not None else "ETA --"
+    return (f"Progress: {snapshot['percent']:.1f}% ({snapshot['chunks']}/{snapshot['total_chunks']} chunks, "
+            f"{format_size(snapshot['bytes'])}) - {rate_text}, {timing}, "
+            f"{snapshot['duplicates']} duplicates, {snapshot['retransmits']} retransmits")
+
+def format_size(size):
+    """Format a byte count with a binary unit"""
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def combine_summaries(summaries):
+    """Combine the summaries of the files of one session, None when no file was transferred"""
+    if not summaries:
+        return None
+    combined = {
+        'file_name': ", ".join(summary['file_name'] for summary in summaries),
+        'file_size': sum(summary['file_size'] for summary in summaries),
+        'total_chunks': sum(summary['total_chunks'] for summary in summaries),
+        'files': len(summaries),
+    }
+    # Only the sending side measures round trips
+    rtt = combine_rtt_snapshots([summary['rtt'] for summary in summaries if 'rtt' in summary])
+    if rtt:
+        combined['rtt'] = rtt
+    # Only an adaptive sender changes its error correction level, the latest level and every change are kept
+    ecc = [summary['error_correction'] for summary in summaries if 'error_correction' in summary]
+    if ecc:
+        combined['error_correction'] = dict(ecc[-1], changes=sum(snapshot['changes'] for snapshot in ecc))
+    return combined
@@ -1,9 +1,24 @@
 import json
 import base64
+from metrics import timer
 
 FIRST_CHUNK_ID = 0
 STARTING_CHUNK_DATA = b"STARTING"
 APPROVED_CHUNK_DATA = b"APPROVED"
+# Calibration payloads use an ID no chunk can have, so they are never mistaken for file data or approvals
+CALIBRATION_CHUNK_ID = -1
+CALIBRATION_PROBE = "probe"
+CALIBRATION_ACK = "ack"
+CALIBRATION_LOCK = "lock"
+# Broadcast receivers report their missing chunks with an ID no chunk can have either
+NACK_CHUNK_ID = -2
+# Ranges of missing chunk IDs one report carries, the lowest IDs first
+MAX_NACK_RANGES = 8
+DEFAULT_CHUNK_SIZE = 100
+# Selective ack blocks one approval carries beyond its cumulative chunk ID, the most recently received first
+MAX_SACK_BLOCKS = 3
+# Symbols a Structured Append group links at most, the limit of the QR standard
+MAX_GROUP_SYMBOLS = 16
 
 def encode_qr_data(payload):
     """Serialize payload to JSON string for QR code"""
@@ -14,21 +29,40 @@ def encode_qr_data(payload):
 
 def decode_qr_data(qr_data_str):
     """Deserialize JSON string from QR code back to payload"""
-    try:
-        payload = json.loads(qr_data_str)
-        # Convert base64 back to bytes
-        payload["data"] = base64.b64decode(payload["data"])
-        return payload
-    except (json.JSONDecodeError, ValueError):
-        return None
+    with timer('parse'):
+        try:
+            payload = json.loads(qr_data_str)
+            # Convert base64 back to bytes
+            payload["data"] = base64.b64decode(payload["data"])
+            return payload
+        except (json.JSONDecodeError, ValueError):
+            return None
 
-def create_chunks_to_send(file_name, file_data):
+def create_chunks_to_send(file_name, file_data, chunk_size=DEFAULT_CHUNK_SIZE):
     """Divide file data into chunks and create payloads for each chunk"""
-    file_chunks = divide_into_chunks(file_data)
+    file_chunks = divide_into_chunks(file_data, chunk_size)
     first_chunk = create_first_qr_payload(file_name, file_chunks)
     return [first_chunk] + [create_qr_payload(chunk, i) for i, chunk in enumerate(file_chunks, start=1)]
 
-def divide_into_chunks(data, size=100):
+def create_lane_chunks(file_name, file_data, lanes, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stripe the file chunks over the lanes and create the payloads each lane sends.
+
+    Lane i sends a starting chunk, then file chunks i, i + lanes, ... renumbered from 1. Every payload names its lane,
+    so a lane receiver never takes the data chunks of a neighbouring lane its camera also sees.
+    """
+    file_chunks = divide_into_chunks(file_data, chunk_size)
+    lane_chunks = []
+    for lane in range(lanes):
+        stripe = file_chunks[lane::lanes]
+        first_chunk = create_first_qr_payload(file_name, stripe)
+        first_chunk["lanes"] = lanes
+        chunks = [first_chunk] + [create_qr_payload(chunk, i) for i, chunk in enumerate(stripe, start=1)]
+        for chunk in chunks:
+            chunk["lane"] = lane
+        lane_chunks.append(chunks)
+    return lane_chunks
+
+def divide_into_chunks(data, size=DEFAULT_CHUNK_SIZE):
     """Divide data into chunks of given size"""
     return [data[i:i+size] for i in range(0, len(data), size)]
 
@@ -46,19 +80,120 @@ def create_qr_payload(chunk, chunk_id):
         "data": chunk
     }
 
-def create_approval_payload(chunk_id):
-    """Create approval payload for a received chunk"""
-    return {
+def create_approval_payload(chunk_id, sack_blocks=(), lane=None):
+    """Create approval payload for every chunk up to chunk_id, plus the chunks of the given (first, last) ID ranges.
+
+    In a multi-lane transfer the approval names its lane, so a sender lane never takes another lane's approval.
+    """
+    payload = {
         "id": chunk_id,
         "data": APPROVED_CHUNK_DATA
     }
+    if sack_blocks:
+        payload["sack"] = [[first, last] for first, last in sack_blocks]
+    if lane is not None:
+        payload["lane"] = lane
+    return payload
+
+def create_calibration_payload(kind, level, device_id, data=b"", **fields):
+    """Create a calibration handshake payload of the given kind (probe, ack or lock) for a density level"""
+    payload = {
+        "id": CALIBRATION_CHUNK_ID,
+        "data": data,
+        "calibration": kind,
+        "level": level,
+        "device": device_id
+    }
+    payload.update(fields)
+    return payload
+
+def create_nack_payload(receiver_id, missing_ranges, session_id=None):
+    """Create the report of a broadcast receiver listing the (first, last) ID ranges of the chunks it misses.
+
+    An empty list reports the file complete. The report echoes the session ID of the broadcast's starting chunk once
+    the receiver has it, so a sender never takes a report about a previous file.
+    """
+    payload = {
+        "id": NACK_CHUNK_ID,
+        "data": b"",
+        "receiver": receiver_id,
+        "nack": [[first, last] for first, last in missing_ranges[:MAX_NACK_RANGES]]
+    }
+    if session_id is not None:
+        payload["session"] = session_id
+    return payload
+
+def is_nack_payload(payload):
+    """Check if the given payload is the missing chunk report of a broadcast receiver"""
+    if not payload:
+        return False
+    return payload.get("id") == NACK_CHUNK_ID and "receiver" in payload and isinstance(payload.get("nack"), list)
+
+def id_ranges(chunk_ids):
+    """Group chunk IDs into sorted (first, last) ranges of consecutive IDs"""
+    ranges = []
+    for chunk_id in sorted(chunk_ids):
+        if ranges and ranges[-1][1] == chunk_id - 1:
+            ranges[-1] = (ranges[-1][0], chunk_id)
+        else:
+            ranges.append((chunk_id, chunk_id))
+    return ranges
+
+def split_into_symbol_group(qr_data_string, symbol_capacity):
+    """Split a QR data string into the parts of a Structured Append group, each fitting symbol_capacity bytes.
+
+    Returns a list of (part, (index, total, parity)) tuples, the parity being the XOR of every byte of the string.
+    Raises ValueError if the string needs more than MAX_GROUP_SYMBOLS symbols.
+    """
+    data = qr_data_string.encode('utf-8')
+    total = max(-(-len(data) // symbol_capacity), 1)
+    if total > MAX_GROUP_SYMBOLS:
+        raise ValueError(f"{len(data)} bytes need {total} symbols of {symbol_capacity} bytes, a group links at most {MAX_GROUP_SYMBOLS}")
+    parity = 0
+    for byte in data:
+        parity ^= byte
+    # Parts of even size keep every symbol of the group equally dense
+    part_size = -(-len(data) // total)
+    return [(data[index * part_size:(index + 1) * part_size], (index, total, parity)) for index in range(total)]
+
+def is_calibration_payload(payload, kind=None):
+    """Check if the given payload is part of the calibration handshake, optionally of the given kind"""
+    if not payload or payload.get("id") != CALIBRATION_CHUNK_ID or "calibration" not in payload:
+        return False
+    return kind is None or payload["calibration"] == kind
 
 def check_qr_chunk_approval(qr_data_str, current_chunk):
     """Check if received QR data is an approval for the current chunk"""
-    decoded_data = decode_qr_data(qr_data_str)
-    if not decoded_data:
+    return approval_covers(decode_qr_data(qr_data_str), current_chunk.get("id"))
+
+def is_approval_payload(payload):
+    """Check if the given payload is an approval"""
+    if not payload:
+        return False
+    return payload.get("id", -1) >= FIRST_CHUNK_ID and payload.get("data") == APPROVED_CHUNK_DATA
+
+def approval_covers(payload, chunk_id):
+    """Check if the approval payload acknowledges the chunk, cumulatively or through one of its selective ack blocks"""
+    if not is_approval_payload(payload):
         return False
-    return decoded_data.get("id") == current_chunk.get("id") and decoded_data.get("data") == APPROVED_CHUNK_DATA
+    if chunk_id == FIRST_CHUNK_ID:
+        # Only an approval of exactly the starting chunk, the last cumulative approval of the previous file may still be on screen
+        return payload["id"] == FIRST_CHUNK_ID
+    return chunk_id <= payload["id"] or any(first <= chunk_id <= last for first, last in payload.get("sack", []))
+
+def attach_ack(payload, approval):
+    """Return a copy of the payload carrying the approval of the reverse stream in its ack field, for duplex peers"""
+    ack = {"id": approval["id"]}
+    if "sack" in approval:
+        ack["sack"] = approval["sack"]
+    return dict(payload, ack=ack)
+
+def piggybacked_approval(payload):
+    """Return the approval carried in the ack field of a duplex payload, None without one"""
+    ack = payload.get("ack") if payload else None
+    if not isinstance(ack, dict) or not isinstance(ack.get("id"), int):
+        return None
+    return create_approval_payload(ack["id"], ack.get("sack", ()))
 
 def is_starting_chunk(payload):
     """Check if the given payload is a starting chunk"""
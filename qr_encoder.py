@@ -0,0 +1,329 @@
+import numpy as np
+import qrcode
+from qrcode import LUT, base, util
+from qrcode.constants import ERROR_CORRECT_M
+from qrcode.exceptions import DataOverflowError
+
+MODE_INDICATOR_BITS = 4
+# Structured Append header: mode indicator, symbol position, last position of the group and parity byte
+STRUCTURED_APPEND_MODE = 0b0011
+STRUCTURED_APPEND_HEADER_BITS = MODE_INDICATOR_BITS + 4 + 4 + 8
+PAD_CODEWORDS = (0xEC, 0x11)
+# Finder-like 1:1:3:1:1 patterns with four light modules on one side, penalized by mask evaluation
+FINDER_LIKE_PATTERN_LENGTH = 11
+FINDER_LIKE_PATTERNS = (0b10111010000, 0b00001011101)
+
+class SessionQREncoder:
+    """QR encoder pinned to one version and error correction level for a whole transfer session.
+
+    The function patterns, the format/version bits of every mask and the data module placement
+    order are computed once, so encoding a chunk only packs its codewords, scores the masks and
+    fills the data modules. Data is always encoded as a single byte mode segment.
+    """
+
+    def __init__(self, version, error_correction=ERROR_CORRECT_M, mask_pattern=None):
+        util.check_version(version)
+        if mask_pattern is not None and mask_pattern not in range(8):
+            raise ValueError(f"Mask pattern should be in range(8) (got {mask_pattern})")
+        self.version = version
+        self.error_correction = error_correction
+        self.mask_pattern = mask_pattern
+        self.size = version * 4 + 17
+
+        self._rs_blocks = base.rs_blocks(version, error_correction)
+        self._data_codewords_count = sum(block.data_count for block in self._rs_blocks)
+        self._length_bits = util.length_in_bits(util.MODE_8BIT_BYTE, version)
+        self._generators = {}
+
+        qr = self._blank_qr()
+        self._data_rows, self._data_cols = self._data_module_positions(qr.modules)
+        # Template used to score masks, format and version areas are left light like qrcode does
+        self._test_template = np.array(qr.modules, dtype=bool)
+        self._templates = {}
+        self._mask_bits = {}
+
+    @classmethod
+    def fitting(cls, max_length, error_correction=ERROR_CORRECT_M, mask_pattern=None, structured_append=False):
+        """Create an encoder with the smallest version that fits byte strings of up to max_length bytes.
+
+        With structured_append the strings are parts of Structured Append groups, whose header takes some room.
+        """
+        for version in range(1, 41):
+            encoder = cls(version, error_correction, mask_pattern)
+            if (encoder.part_capacity if structured_append else encoder.capacity) >= max_length:
+                return encoder
+        raise DataOverflowError(f"{max_length} bytes do not fit in any QR version")
+
+    @property
+    def capacity(self):
+        """Maximum number of bytes a single symbol of this session can carry"""
+        return (self._data_codewords_count * 8 - MODE_INDICATOR_BITS - self._length_bits) // 8
+
+    @property
+    def current(self):
+        """Encoder of the next symbol, this one as its level never changes"""
+        return self
+
+    @property
+    def part_capacity(self):
+        """Maximum number of bytes a symbol of a Structured Append group can carry"""
+        header_bits = STRUCTURED_APPEND_HEADER_BITS + MODE_INDICATOR_BITS + self._length_bits
+        return (self._data_codewords_count * 8 - header_bits) // 8
+
+    def encode(self, data, structured_append=None):
+        """Encode the given string or bytes and return the module matrix (True = dark) without a quiet zone"""
+        return next(self.encode_candidates(data, structured_append))
+
+    def encode_candidates(self, data, structured_append=None):
+        """Yield the symbol of the given data once per mask, the fixed mask first and then by increasing penalty.
+
+        The first candidate is the symbol qrcode itself would produce. Later ones let the caller fall back
+        to another mask when a decoder fails on the preferred one. structured_append is the (index, total, parity)
+        header of a symbol that is part of a Structured Append group.
+        """
+        data_bits = self._data_bits(util.to_bytestring(data), structured_append)
+        if self.mask_pattern is not None:
+            # Yielded before any penalty is computed, so a fixed mask costs nothing extra
+            yield self._place(data_bits, self.mask_pattern)
+
+        # Same mask ranking as qrcode: penalty with format and version areas left light, ties by mask number
+        penalties = []
+        for pattern in range(8):
+            if pattern == self.mask_pattern:
+                continue
+            candidate = self._test_template.copy()
+            candidate[self._data_rows, self._data_cols] = data_bits ^ self._get_mask_bits(pattern)
+            penalties.append((mask_penalty(candidate), pattern))
+        for _, pattern in sorted(penalties):
+            yield self._place(data_bits, pattern)
+
+    def _blank_qr(self):
+        """Build a qrcode.QRCode holding only the function patterns, with format and version areas reserved"""
+        qr = qrcode.QRCode(version=self.version, error_correction=self.error_correction)
+        qr.modules_count = self.size
+        qr.modules = [[None] * self.size for _ in range(self.size)]
+        qr.setup_position_probe_pattern(0, 0)
+        qr.setup_position_probe_pattern(self.size - 7, 0)
+        qr.setup_position_probe_pattern(0, self.size - 7)
+        qr.setup_position_adjust_pattern()
+        qr.setup_timing_pattern()
+        qr.setup_type_info(True, 0)
+        if self.version >= 7:
+            qr.setup_type_number(True)
+        return qr
+
+    def _data_module_positions(self, modules):
+        """Return the row and column indices of the data modules in placement order"""
+        rows, cols = [], []
+        row, inc = self.size - 1, -1
+        for col in range(self.size - 1, 0, -2):
+            if col <= 6:
+                col -= 1  # Skip the vertical timing pattern
+            while True:
+                for c in (col, col - 1):
+                    if modules[row][c] is None:
+                        rows.append(row)
+                        cols.append(c)
+                row += inc
+                if row < 0 or row >= self.size:
+                    row -= inc
+                    inc = -inc
+                    break
+        return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)
+
+    def _get_template(self, mask_pattern):
+        """Return the function pattern template with the format and version bits of the given mask"""
+        if mask_pattern not in self._templates:
+            qr = self._blank_qr()
+            qr.setup_type_info(False, mask_pattern)
+            if self.version >= 7:
+                qr.setup_type_number(False)
+            self._templates[mask_pattern] = np.array(qr.modules, dtype=bool)
+        return self._templates[mask_pattern]
+
+    def _get_mask_bits(self, mask_pattern):
+        """Return the mask values of the data modules for the given mask"""
+        if mask_pattern not in self._mask_bits:
+            mask = util.mask_func(mask_pattern)
+            positions = zip(self._data_rows.tolist(), self._data_cols.tolist())
+            self._mask_bits[mask_pattern] = np.array([mask(row, col) for row, col in positions], dtype=bool)
+        return self._mask_bits[mask_pattern]
+
+    def _place(self, data_bits, mask_pattern):
+        """Fill the data modules of the cached template with the masked data bits"""
+        matrix = self._get_template(mask_pattern).copy()
+        matrix[self._data_rows, self._data_cols] = data_bits ^ self._get_mask_bits(mask_pattern)
+        return matrix
+
+    def _data_bits(self, data, structured_append=None):
+        """Build the interleaved data and error correction codewords as a bit array sized to the data modules"""
+        codewords = self._interleave(self._data_codewords(data, structured_append))
+        bits = np.unpackbits(np.frombuffer(bytes(codewords), dtype=np.uint8)).astype(bool)
+        # Remainder bits after the last codeword are left light before masking
+        data_bits = np.zeros(len(self._data_rows), dtype=bool)
+        data_bits[:len(bits)] = bits
+        return data_bits
+
+    def _data_codewords(self, data, structured_append=None):
+        """Pack data as a byte mode segment with terminator and padding, the same way qrcode does.
+
+        A Structured Append header goes before the segment when given.
+        """
+        capacity = self.capacity if structured_append is None else self.part_capacity
+        if len(data) > capacity:
+            raise DataOverflowError(
+                f"Code length overflow. Data size ({len(data)} bytes) > capacity ({capacity} bytes)"
+            )
+        bit_limit = self._data_codewords_count * 8
+        value, length = 0, 0
+        if structured_append is not None:
+            index, total, parity = structured_append
+            value = (((STRUCTURED_APPEND_MODE << 4 | index) << 4 | (total - 1)) << 8) | parity
+            length = STRUCTURED_APPEND_HEADER_BITS
+        value = (value << MODE_INDICATOR_BITS) | util.MODE_8BIT_BYTE
+        value = (value << self._length_bits) | len(data)
+        value = (value << (8 * len(data))) | int.from_bytes(data, 'big')
+        length += MODE_INDICATOR_BITS + self._length_bits + 8 * len(data)
+
+        # Terminator of up to four zero bits, then zero bits up to the next byte boundary
+        terminator = min(bit_limit - length, 4)
+        terminator += (-(length + terminator)) % 8
+        value <<= terminator
+        length += terminator
+
+        codewords = list(value.to_bytes(length // 8, 'big'))
+        for i in range(self._data_codewords_count - len(codewords)):
+            codewords.append(PAD_CODEWORDS[i % 2])
+        return codewords
+
+    def _interleave(self, data_codewords):
+        """Split the data codewords into blocks, add Reed-Solomon codewords and interleave them"""
+        data_blocks, ec_blocks = [], []
+        offset = 0
+        for block in self._rs_blocks:
+            data_block = data_codewords[offset:offset + block.data_count]
+            offset += block.data_count
+            data_blocks.append(data_block)
+            ec_blocks.append(self._reed_solomon(data_block, block.total_count - block.data_count))
+
+        codewords = []
+        for blocks in (data_blocks, ec_blocks):
+            for i in range(max(len(b) for b in blocks)):
+                codewords.extend(b[i] for b in blocks if i < len(b))
+        return codewords
+
+    def _reed_solomon(self, data_block, ec_count):
+        """Compute the error correction codewords of a block with a shift register division"""
+        generator = self._get_generator_logs(ec_count)
+        exp_table, log_table = base.EXP_TABLE, base.LOG_TABLE
+        remainder = [0] * ec_count
+        for codeword in data_block:
+            factor = codeword ^ remainder[0]
+            remainder = remainder[1:] + [0]
+            if factor:
+                factor_log = log_table[factor]
+                for i, coefficient_log in enumerate(generator):
+                    remainder[i] ^= exp_table[(factor_log + coefficient_log) % 255]
+        return remainder
+
+    def _get_generator_logs(self, ec_count):
+        """Return the logs of the generator polynomial coefficients (leading term excluded)"""
+        if ec_count not in self._generators:
+            if ec_count in LUT.rsPoly_LUT:
+                coefficients = LUT.rsPoly_LUT[ec_count]
+            else:
+                poly = base.Polynomial([1], 0)
+                for i in range(ec_count):
+                    poly = poly * base.Polynomial([1, base.gexp(i)], 0)
+                coefficients = [poly[i] for i in range(len(poly))]
+            self._generators[ec_count] = [base.glog(c) for c in coefficients[1:]]
+        return self._generators[ec_count]
+
+class AdaptiveQREncoder:
+    """Session encoder following the error correction level of an adapter, one pinned encoder per level.
+
+    Each level uses the smallest version that fits every string of the session, so the symbol only changes size
+    when the level changes. Used like a SessionQREncoder, the level is read again for every symbol encoded, and
+    current pins the level for the symbols of one frame.
+    """
+
+    def __init__(self, max_length, adapter, structured_append=False):
+        self.max_length = max_length
+        self.adapter = adapter
+        self.structured_append = structured_append
+        # Error correction level -> encoder fitted on first use
+        self._encoders = {}
+
+    @property
+    def error_correction(self):
+        """Error correction level the next symbol is encoded with"""
+        return self.adapter.level
+
+    @property
+    def current(self):
+        """Session encoder of the current level"""
+        level = self.adapter.level
+        if level not in self._encoders:
+            self._encoders[level] = SessionQREncoder.fitting(self.max_length, level, structured_append=self.structured_append)
+        return self._encoders[level]
+
+    @property
+    def version(self):
+        return self.current.version
+
+    @property
+    def size(self):
+        return self.current.size
+
+    @property
+    def capacity(self):
+        return self.current.capacity
+
+    @property
+    def part_capacity(self):
+        return self.current.part_capacity
+
+    def encode(self, data, structured_append=None):
+        """Encode the given string or bytes at the current level, like SessionQREncoder.encode"""
+        return self.current.encode(data, structured_append)
+
+    def encode_candidates(self, data, structured_append=None):
+        """Yield the symbols of the given data at the current level, like SessionQREncoder.encode_candidates"""
+        return self.current.encode_candidates(data, structured_append)
+
+def mask_penalty(modules):
+    """Score a module matrix like qrcode.util.lost_point does, vectorized with NumPy"""
+    modules = np.asarray(modules, dtype=bool)
+    penalty = 0
+    for lines in (modules, modules.T):
+        penalty += _run_penalty(lines) + _finder_like_penalty(lines)
+
+    # Uniform 2x2 blocks
+    top, bottom = modules[:-1], modules[1:]
+    uniform = (top[:, :-1] == top[:, 1:]) & (top[:, 1:] == bottom[:, 1:]) & (bottom[:, 1:] == bottom[:, :-1])
+    penalty += 3 * int(np.count_nonzero(uniform))
+
+    # Dark module ratio, every 5% away from 50% costs 10 points
+    percent = float(np.count_nonzero(modules)) / modules.size
+    penalty += int(abs(percent * 100 - 50) / 5) * 10
+    return penalty
+
+def _run_penalty(lines):
+    """Penalty of same colored runs of five or more modules along each row"""
+    # Every row starts a new run, so runs never continue from one row to the next
+    run_starts = np.ones(lines.shape, dtype=bool)
+    run_starts[:, 1:] = lines[:, 1:] != lines[:, :-1]
+    run_lengths = np.diff(np.append(np.flatnonzero(run_starts), lines.size))
+    long_runs = run_lengths[run_lengths >= 5]
+    return int(np.sum(long_runs - 2))
+
+def _finder_like_penalty(lines):
+    """Penalty of finder-like patterns along each row"""
+    # Read every 11 module window as an integer, first module as the most significant bit
+    window_count = lines.shape[1] - FINDER_LIKE_PATTERN_LENGTH + 1
+    windows = np.zeros((lines.shape[0], window_count), dtype=np.uint16)
+    for offset in range(FINDER_LIKE_PATTERN_LENGTH):
+        windows <<= 1
+        windows |= lines[:, offset:offset + window_count]
+    matches = sum(np.count_nonzero(windows == pattern) for pattern in FINDER_LIKE_PATTERNS)
+    return 40 * int(matches)
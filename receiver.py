@@ -1,20 +1,87 @@
-from camera_handler import get_next_qr_data, get_web_cam
-from protocol_utils import (
-    decode_qr_data, encode_qr_data, create_approval_payload,
-    is_starting_chunk, is_data_chunk
-)
-from display_utils import display_qr_centered, close_all_qr_windows
+from functools import partial
+from camera_handler import get_next_qr_data, get_web_cam, set_group_decoding
+from display_utils import display_qr_centered, close_qr_window, hold_display
 from file_utils import select_save_directory, save_file_data, open_file
+from progress import combine_summaries
+from calibration import CalibrationResponder
+from session import ReceiverSession, BroadcastReceiverSession, run_session
+import asyncio
+import os
 import time
+import uuid
 
-def receiver_main():
-    """Main receiver function that processes incoming QR codes and reconstructs the file"""
-    cam = get_web_cam()
-    directory_to_save_in = select_save_directory()
+RECEIVER_WINDOW_NAME = "Receiver QR"
+# Seconds a broadcast receiver keeps its complete report on screen, the sender waits for the report of every receiver
+BROADCAST_LINGER = 3.0
+
+def receiver_main(output_dir=None, count=1, open_files=True, lanes=1, cameras=None, broadcast=False, groups=False):
+    """Main receiver function that receives count files back to back (0 keeps receiving until interrupted).
+
+    Files are saved in output_dir, or in a directory picked in a dialog when none is given. With several lanes every
+    file arrives striped over that many windows side by side, watched by the given cameras or by columns of one camera.
+    With broadcast the files come from a carousel shown to several receivers. With groups chunks shown as
+    Structured Append groups are read. Returns the summary of the whole session, or None if no file was received.
+    """
+    set_group_decoding(groups)
+    receiver_lanes = None
+    if lanes > 1:
+        from lanes import open_lanes, close_lanes, receive_file_lanes # Only multi-lane transfers need asyncio and lanes
+        receiver_lanes = open_lanes(RECEIVER_WINDOW_NAME, lanes, cameras)
+        receive = lambda: asyncio.run(receive_file_lanes(receiver_lanes))
+    elif broadcast:
+        receive = partial(receive_broadcast, get_web_cam())
+    else:
+        receive = partial(receive_file, get_web_cam())
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        directory_to_save_in = output_dir
+    else:
+        directory_to_save_in = select_save_directory()
     if not directory_to_save_in:
         print("No directory selected, aborting.")
-        return
+        return None
+
+    summaries = []
+    try:
+        while not count or len(summaries) < count:
+            summaries.append(receive_and_save_file(receive, directory_to_save_in, open_files))
+    except KeyboardInterrupt:
+        print(f"Receiving interrupted after {len(summaries)} file(s)")
+    if receiver_lanes:
+        close_lanes(receiver_lanes)
+    else:
+        close_qr_window(RECEIVER_WINDOW_NAME)
+    return combine_summaries(summaries)
+
+def receive_and_save_file(receive, directory_to_save_in, open_files=True):
+    """Receive one file with receive(), returning its metadata and data, and save it in the directory.
+
+    Returns its transfer summary.
+    """
+    file_metadata, file_data = receive()
+    return save_received_file(directory_to_save_in, file_metadata, file_data, open_files)
+
+def save_received_file(directory_to_save_in, file_metadata, file_data, open_files=True):
+    """Save a received file in the directory and open it if asked, returns its transfer summary"""
+    save_path, is_successful = save_file_data(directory_to_save_in, file_metadata['file_name'], file_data)
     
+    if is_successful:
+        print(f"File saved successfully to: {save_path}")
+        if open_files:
+            open_file(save_path)
+    else:
+        print(f"Failed to save file '{file_metadata['file_name']}'")
+    return {
+        'file_name': file_metadata['file_name'],
+        'file_size': len(file_data),
+        'total_chunks': file_metadata['total_chunks'],
+    }
+
+def receive_file(cam, on_progress=None):
+    """Receive a whole file through the given frame source, returns the file metadata and the file data.
+
+    on_progress is called with a progress snapshot dict a few times per second while chunks arrive.
+    """
     print("Waiting for file transfer to start")
     
     file_metadata = wait_for_starting_chunk(cam)
@@ -22,69 +89,46 @@ def receiver_main():
     print(f"Receiving file: {file_metadata['file_name']}")
     print(f"Total chunks expected: {file_metadata['total_chunks']}")
     
-    file_data = receive_file_chunks(cam, file_metadata['total_chunks'])
-    save_path, is_successful = save_file_data(directory_to_save_in, file_metadata['file_name'], file_data)
-    
-    if is_successful:
-        print(f"File saved successfully to: {save_path}")
-        open_file(save_path)
-    else:
-        print(f"Failed to save file '{file_metadata['file_name']}'")
+    file_data = receive_file_chunks(cam, file_metadata['total_chunks'], on_progress)
+    return file_metadata, file_data
+
+async def receive_file_async(cam, on_progress=None):
+    """Asyncio version of receive_file, capture, decoding and rendering run in executor threads."""
+    from async_runtime import AsyncQRStream, AsyncQRDisplay, run_session_async # Only asyncio callers need it
+    print("Waiting for file transfer to start")
+    session = ReceiverSession(on_progress=on_progress, calibration_factory=CalibrationResponder)
+    async with AsyncQRStream(cam) as frames, AsyncQRDisplay(RECEIVER_WINDOW_NAME) as display:
+        await run_session_async(session, frames, display)
+        await asyncio.sleep(1.5) # Keep the last approval on screen until the sender sees it
+    print("Reconstructing the file from received chunks")
+    return session.file_metadata, session.file_data()
 
+def receive_broadcast(cam, receiver_id=None, on_progress=None):
+    """Receive a file from a broadcast carousel, reporting the missing chunks, returns the file metadata and data"""
+    receiver_id = receiver_id or uuid.uuid4().hex[:8]
+    print(f"Waiting for broadcast as receiver {receiver_id}")
+    session = BroadcastReceiverSession(receiver_id, on_progress)
+    run_session(session, partial(get_next_qr_data, cam), show_receiver_qr)
+    hold_display(BROADCAST_LINGER) # Keep the complete report on screen until the sender sees it
+    print(f"Received file: {session.file_metadata['file_name']}")
+    return session.file_metadata, session.file_data()
 
 def wait_for_starting_chunk(cam):
     """Wait for starting chunk and process the chunk that contains the file metadata"""
-    while True:
-        print("Scanning for starting chunk")
-        qr_data_string = get_next_qr_data(cam)
-        payload = decode_qr_data(qr_data_string)
-        
-        if is_starting_chunk(payload):
-            send_approval(payload['id'])
-            return {
-                'file_name': payload.get('file_name', 'unknown_file'),
-                'total_chunks': payload.get('total_chunks', 0)
-            }
+    print("Scanning for starting chunk")
+    # Answers the calibration handshake of a sender that runs one
+    session = ReceiverSession(calibration_factory=CalibrationResponder)
+    run_session(session, partial(get_next_qr_data, cam), show_receiver_qr, until=lambda s: s.file_metadata)
+    return session.file_metadata
 
-def receive_file_chunks(cam, total_chunks):
+def receive_file_chunks(cam, total_chunks, on_progress=None):
     """Receive and reconstruct file data from chunks"""
-    chunks_data = {}
-    received_count = 0
-    
-    while received_count < total_chunks:
-        progress = (received_count / total_chunks) * 100
-        print(f"Progress: {progress:.1f}% - Waiting for chunk {received_count + 1}/{total_chunks}")
-        
-        qr_data_string = get_next_qr_data(cam)
-        payload = decode_qr_data(qr_data_string)
-        
-        if is_data_chunk(payload):
-            chunk_id = payload['id']
-            chunk_data = payload['data']
-            
-            # Store chunk data if it's a new one
-            if chunk_id not in chunks_data:
-                chunks_data[chunk_id] = chunk_data
-                received_count += 1
-                progress = (received_count / total_chunks) * 100
-                send_approval(chunk_id)
-            else:
-                print(f"Duplicate chunk {chunk_id} received, ignoring")
+    session = run_session(ReceiverSession(total_chunks, on_progress), partial(get_next_qr_data, cam), show_receiver_qr)
     time.sleep(1.5) # Added small sleep delay to ensure approval QR is seen by sender
-    # Reconstruct file data in correct order
     print("Reconstructing the file from received chunks")
-    file_data = b""
-    for chunk_id in sorted(chunks_data.keys()):
-        file_data += chunks_data[chunk_id]
-    
-    return file_data
+    return session.file_data()
 
-def send_approval(chunk_id):
-    """Send approval QR code for received chunk"""
-    approval_payload = create_approval_payload(chunk_id)
-    approval_qr_string = encode_qr_data(approval_payload)
-    close_all_qr_windows() # Close previous approval windows
-    
-    window_name = f"Approval for chunk {chunk_id}"
-    display_qr_centered(approval_qr_string, window_name)
-    print(f"Approval QR displayed for chunk {chunk_id} - keeping it visible until next chunk arrives")
+def show_receiver_qr(qr_data_string):
+    """Show a QR code in the long-lived receiver window"""
+    # The window is reused, the new approval replaces the previous one in place
+    display_qr_centered(qr_data_string, RECEIVER_WINDOW_NAME)
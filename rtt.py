@@ -0,0 +1,69 @@
+# Retransmission timeout before the first round-trip sample, RFC 6298 (2.1)
+INITIAL_RTO = 1.0
+# Bounds of the retransmission timeout in seconds, the lower one keeps a fast link from timing out on one slow decode
+MIN_RTO = 0.5
+MAX_RTO = 60.0
+# Gains of the smoothed RTT and of its variance, and the variance multiplier of the timeout, RFC 6298 (2.3)
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+RTT_K = 4
+
+class RttEstimator:
+    """Smoothed round-trip time, its variance and the retransmission timeout derived from them, as in RFC 6298.
+
+    Samples are the seconds from a chunk being shown to its approval. Following Karn's algorithm the caller only
+    samples chunks shown once, and each timeout doubles the timeout until the next sample.
+    """
+
+    def __init__(self, initial_rto=INITIAL_RTO, min_rto=MIN_RTO, max_rto=MAX_RTO, granularity=0.0):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        # Clock granularity, here the time one frame stays on screen
+        self.granularity = granularity
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self.samples = 0
+        self.timeouts = 0
+
+    def sample(self, rtt):
+        """Fold a measured round-trip time in seconds into the estimate and recompute the timeout"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        self.samples += 1
+        self.rto = self._bounded(self.srtt + max(self.granularity, RTT_K * self.rttvar))
+
+    def timeout(self):
+        """Count a retransmission timeout and back the timeout off"""
+        self.timeouts += 1
+        self.rto = self._bounded(self.rto * 2)
+
+    def snapshot(self):
+        """Return the timer statistics as a dict"""
+        return {
+            'srtt': self.srtt,
+            'rttvar': self.rttvar,
+            'rto': self.rto,
+            'samples': self.samples,
+            'timeouts': self.timeouts,
+        }
+
+    def _bounded(self, rto):
+        return min(max(rto, self.min_rto), self.max_rto)
+
+def format_rtt(snapshot):
+    """Format timer statistics as a single console line"""
+    srtt_text = f"{snapshot['srtt']:.2f}s" if snapshot['srtt'] is not None else "--"
+    return (f"Round trip: smoothed {srtt_text}, timeout {snapshot['rto']:.2f}s, "
+            f"{snapshot['samples']} samples, {snapshot['timeouts']} timeouts")
+
+def combine_rtt_snapshots(snapshots):
+    """Combine the timer statistics of the files of one session: the latest estimate, the counts summed"""
+    if not snapshots:
+        return None
+    return dict(snapshots[-1], samples=sum(s['samples'] for s in snapshots),
+                timeouts=sum(s['timeouts'] for s in snapshots))
@@ -1,45 +1,194 @@
-from camera_handler import get_next_qr_data, get_web_cam
-from protocol_utils import check_qr_chunk_approval, create_chunks_to_send, encode_qr_data
-from display_utils import display_qr_centered, close_qr_window
+from functools import partial
+import uuid
+from camera_handler import get_next_qr_data, get_web_cam, get_qr_from_frame, MultiQRReader
+from protocol_utils import create_chunks_to_send, encode_qr_data, DEFAULT_CHUNK_SIZE
+from display_utils import show_frame, close_qr_window, PrefetchingRenderer, QR_BOX_SIZE
 from file_utils import select_file_to_send, read_file_data
+from qr_encoder import SessionQREncoder, AdaptiveQREncoder
+from ecc import ErrorCorrectionAdapter
+from calibration import calibrate_link, chunk_size_for, MAX_CHUNK_ID
+from progress import combine_summaries
+from session import SenderSession, BroadcastSenderSession, run_session
+from rtt import format_rtt
 
-def sender_main():
-    """Main sender function that processes outgoing QR codes and sends the file"""
+SENDER_WINDOW_NAME = "Sender QR"
+
+def sender_main(file_paths=None, calibrate=False, lanes=1, cameras=None, broadcast=0, symbols=1, adaptive_ecc=False):
+    """Main sender function that sends the given files back to back, or a file picked in a dialog when none are given.
+
+    With several lanes every file is striped over that many windows side by side, watched by the given cameras or
+    by columns of one camera. With broadcast every file is shown as a carousel until that many receivers have it.
+    With several symbols every chunk is that many times larger and shown as a Structured Append group in a grid.
+    With adaptive_ecc the error correction level follows the receiver feedback, carried over from file to file.
+    Returns the summary of the whole session, or None if no file was sent.
+    """
+    if lanes > 1:
+        return send_files_over_lanes(file_paths, lanes, cameras)
     cam = get_web_cam()
+    files = select_files(file_paths)
+    if files is None:
+        return None
+
+    # Optional handshake picking the QR density before the first starting chunk, the defaults are kept without it
+    link_profile = calibrate_link(cam, SENDER_WINDOW_NAME) if calibrate else None
+    ecc = ErrorCorrectionAdapter() if adaptive_ecc else None
+    if broadcast:
+        summaries = [broadcast_file(cam, file_name, file_data, broadcast, symbols) for file_name, file_data in files]
+    else:
+        summaries = [send_file(cam, file_name, file_data, link_profile, symbols, ecc) for file_name, file_data in files]
+    close_qr_window(SENDER_WINDOW_NAME)
+    return combine_summaries(summaries)
+
+def send_files_over_lanes(file_paths, lanes, cameras=None):
+    """Send the given files, or a file picked in a dialog, striped over the lanes"""
+    import asyncio
+    from lanes import open_lanes, close_lanes, send_file_lanes # Only multi-lane transfers need asyncio and lanes
+    sender_lanes = open_lanes(SENDER_WINDOW_NAME, lanes, cameras)
+    files = select_files(file_paths)
+    if files is None:
+        return None
+
+    summaries = [asyncio.run(send_file_lanes(sender_lanes, file_name, file_data)) for file_name, file_data in files]
+    close_lanes(sender_lanes)
+    return combine_summaries(summaries)
+
+def select_files(file_paths):
+    """Return the queued files to send, or the file picked in a dialog when no path is given (None if none was picked)"""
+    if file_paths:
+        # Files are only read when their turn comes, so a long queue never holds more than one file in memory
+        return read_queued_files(file_paths)
     file_name, file_data = pick_file()
     if not file_name:
         print("No file selected, aborting.")
-        return
+        return None
+    return [(file_name, file_data)]
+
+def read_queued_files(file_paths):
+    """Yield (file name, file data) for every readable file of the queue, skipping the others"""
+    for file_path in file_paths:
+        file_name, file_data = read_file_data(file_path)
+        if not file_name:
+            print(f"Could not read '{file_path}', skipping it")
+            continue
+        yield file_name, file_data
+
+def send_file(cam, file_name, file_data, link_profile=None, symbols=1, ecc=None):
+    """Send the file chunk by chunk, waiting for the receiver approval of each chunk through the given frame source.
+
+    A calibrated link profile sets the chunk size, QR version, error correction and module size. With several
+    symbols every chunk spans a Structured Append group of up to that many symbols. With an error correction
+    adapter every frame is encoded at its current level, which follows the approvals and timeouts of the session.
+    Returns the transfer summary: file name, file size, number of data chunks and round-trip timer statistics.
+    """
+    chunks_to_send, encoder, box_size = prepare_chunks(file_name, file_data, link_profile, symbols, ecc)
+    session = SenderSession(chunks_to_send, ecc=ecc)
+
+    # The next chunks are rendered while the current one waits for its approval, so the switch only shows a ready image
+    with PrefetchingRenderer(encoder, get_qr_from_frame, box_size) as renderer:
+        def show(qr_data_string):
+            print(f"Sending chunk {session.current_chunk['id']}")
+            show_sender_qr(qr_data_string, renderer)
 
-    chunks_to_send = create_chunks_to_send(file_name, file_data)
-    for chunk in chunks_to_send:
-        print(f"Sending chunk {chunk['id']}")
-        qr_window_name = f"Chunk {chunk['id']} - Sender QR"
-        display_qr_for_chunk(chunk, qr_window_name)
-        wait_for_chunk_approval(cam, chunk)
-        close_qr_window(qr_window_name)
-    print(f"File '{file_name}' sent successfully! All {len(chunks_to_send)} chunks transferred.")
+        run_session(session, partial(get_next_qr_data, cam), show, prefetch=renderer.prefetch)
+    return sent_file_summary(session, file_name, file_data)
+
+async def send_file_async(cam, file_name, file_data, link_profile=None, symbols=1, ecc=None):
+    """Asyncio version of send_file, capture, decoding and rendering run in executor threads."""
+    from async_runtime import AsyncQRStream, AsyncQRDisplay, run_session_async # Only asyncio callers need it
+    chunks_to_send, encoder, box_size = prepare_chunks(file_name, file_data, link_profile, symbols, ecc)
+    session = SenderSession(chunks_to_send, ecc=ecc)
+    async with AsyncQRStream(cam) as frames, AsyncQRDisplay(SENDER_WINDOW_NAME, encoder, get_qr_from_frame, box_size) as display:
+        await run_session_async(session, frames, display, prefetch=True)
+    return sent_file_summary(session, file_name, file_data)
+
+def sent_file_summary(session, file_name, file_data):
+    """Report a finished sender session and return its transfer summary"""
+    print(f"File '{file_name}' sent successfully! All {len(session.chunks)} chunks transferred.")
+    rtt = session.rtt.snapshot()
+    print(format_rtt(rtt))
+    summary = {'file_name': file_name, 'file_size': len(file_data), 'total_chunks': len(session.chunks) - 1, 'rtt': rtt}
+    if session.ecc:
+        summary['error_correction'] = session.ecc.snapshot()
+        print(f"Error correction: level {summary['error_correction']['level']} after "
+              f"{summary['error_correction']['changes']} changes")
+    return summary
+
+def broadcast_file(cam, file_name, file_data, receivers, symbols=1):
+    """Show the file as a carousel to several receivers at once, until the given number of them reported it complete.
+
+    The receivers report their missing chunks, the chunks missing at the most receivers are repeated first.
+    Returns the transfer summary: file name, file size, number of data chunks, receivers, frames shown and repeats.
+    """
+    # A new session ID per file, reports still on screen from the previous file do not count for this one
+    chunks_to_send, encoder, box_size = prepare_chunks(file_name, file_data, symbols=symbols, session_id=uuid.uuid4().hex[:8])
+    session = BroadcastSenderSession(chunks_to_send, receivers)
+    print(f"Broadcasting '{file_name}' to {receivers} receivers")
+    with PrefetchingRenderer(encoder, get_qr_from_frame, box_size) as renderer:
+        # The camera sees the report of every receiver at once
+        run_session(session, MultiQRReader(cam), lambda qr_data_string: show_sender_qr(qr_data_string, renderer),
+                    prefetch=renderer.prefetch)
+    print(f"File '{file_name}' broadcast successfully! {session.frames_shown} frames shown, "
+          f"{session.retransmits} repeats for {receivers} receivers.")
+    return {
+        'file_name': file_name,
+        'file_size': len(file_data),
+        'total_chunks': len(chunks_to_send) - 1,
+        'receivers': receivers,
+        'frames_shown': session.frames_shown,
+        'retransmits': session.retransmits,
+    }
+
+def prepare_chunks(file_name, file_data, link_profile=None, symbols=1, ecc=None, session_id=None):
+    """Return the chunks of the file, the session encoder and the module pixel size, from the link profile if given.
+
+    With several symbols the chunks are that many times larger, each shown as a group of up to that many symbols.
+    With an error correction adapter the chunks are sized for its current level. A session ID, when given, is named
+    by the starting chunk.
+    """
+    if ecc:
+        chunks_to_send = create_chunks_to_send(file_name, file_data, adaptive_chunk_size(ecc.level) * symbols)
+        box_size = QR_BOX_SIZE
+    elif link_profile:
+        chunks_to_send = create_chunks_to_send(file_name, file_data, link_profile.chunk_size * symbols)
+        box_size = link_profile.box_size
+    else:
+        chunks_to_send = create_chunks_to_send(file_name, file_data, DEFAULT_CHUNK_SIZE * symbols)
+        box_size = QR_BOX_SIZE
+    if session_id is not None:
+        chunks_to_send[0]['session'] = session_id
+    return chunks_to_send, create_session_encoder(chunks_to_send, link_profile, symbols, ecc), box_size
+
+def adaptive_chunk_size(error_correction):
+    """Chunk size filling the symbol of a default chunk at the given level, less redundancy leaves room for more data"""
+    default_length = len(encode_qr_data({"id": MAX_CHUNK_ID, "data": bytes(DEFAULT_CHUNK_SIZE)}))
+    default_version = SessionQREncoder.fitting(default_length).version
+    return chunk_size_for(default_version, error_correction)
 
 def pick_file():
     """Let's user select a file from the file explorer and reads the file content"""
     file_path = select_file_to_send()
     return read_file_data(file_path)
 
-def wait_for_chunk_approval(cam, chunk):
-    """Wait for approval QR code from receiver for the given chunk"""
-    print(f"Waiting for approval from receiver for chunk {chunk['id']}")
-    received_approval = False
-    
-    while not received_approval:
-        qr_data_string = get_next_qr_data(cam)
-        if check_qr_chunk_approval(qr_data_string, chunk):
-            print(f"Approval received for chunk {chunk['id']}!")
-            received_approval = True
-        else:
-            print("Waiting for correct approval")
-    print(f"Chunk {chunk['id']} confirmed, moving to next")
-
-def display_qr_for_chunk(chunk, qr_window_name):
-    """Display QR code for the given chunk"""
-    qr_data_string = encode_qr_data(chunk)
-    display_qr_centered(qr_data_string, qr_window_name)
+def create_session_encoder(chunks, link_profile=None, symbols=1, ecc=None):
+    """Create a QR encoder pinned to the smallest version that fits every chunk, so the symbol size stays the same.
+
+    With several symbols a chunk only has to fit a Structured Append group of that many symbols. With an error
+    correction adapter the encoder follows its level, pinned to the smallest version fitting every chunk per level.
+    """
+    max_length = max(len(encode_qr_data(chunk)) for chunk in chunks)
+    structured_append = symbols > 1
+    if structured_append:
+        max_length = -(-max_length // symbols)
+    if ecc:
+        return AdaptiveQREncoder(max_length, ecc, structured_append)
+    if not link_profile:
+        return SessionQREncoder.fitting(max_length, structured_append=structured_append)
+    encoder = SessionQREncoder(link_profile.version, link_profile.error_correction)
+    if (encoder.part_capacity if structured_append else encoder.capacity) >= max_length:
+        return encoder
+    # Only a long file name in the starting chunk can outgrow the calibrated version
+    return SessionQREncoder.fitting(max_length, link_profile.error_correction, structured_append=structured_append)
+
+def show_sender_qr(qr_data_string, renderer):
+    """Show a chunk QR code in the sender window, prefetched by the renderer when it was upcoming"""
+    show_frame(SENDER_WINDOW_NAME, renderer.render(qr_data_string))
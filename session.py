@@ -0,0 +1,630 @@
+import itertools
+import time
+from protocol_utils import (
+    decode_qr_data, encode_qr_data, create_approval_payload, is_approval_payload, approval_covers, attach_ack,
+    piggybacked_approval, create_nack_payload, is_nack_payload, id_ranges, is_starting_chunk, is_data_chunk, is_calibration_payload, FIRST_CHUNK_ID, MAX_SACK_BLOCKS
+)
+from progress import ProgressReporter
+from metrics import observe
+from rtt import RttEstimator
+
+# Frames prepared ahead of the in-flight ones, the next chunk to enter the window is usually the only one needed
+PREFETCH_DEPTH = 2
+# Chunks the sender keeps in flight, shown in turn until the receiver acknowledges them
+SEND_WINDOW = 4
+# Seconds an in-flight chunk stays on screen before the next in-flight one replaces it
+FRAME_INTERVAL = 0.2
+# Seconds between two updates of the receiver ack display
+ACK_INTERVAL = 0.2
+# Seconds between two missing chunk reports of a broadcast receiver
+REPORT_INTERVAL = 0.5
+
+class SenderSession:
+    """Sender side of the transfer protocol as a state machine without camera or display I/O.
+
+    Up to window chunks are in flight and shown in turn, each for frame_interval seconds, until an approval
+    acknowledges them. Approvals are cumulative with selective ack blocks, so one approval can acknowledge many
+    chunks. The starting chunk is always in flight alone. An in-flight chunk not shown again within the
+    retransmission timeout, derived from the measured round-trip times, is shown again right away. An error
+    correction adapter, when given, is told of every approved chunk and every timeout. The session is fed the
+    decoded camera frames and clock ticks, and returns the QR data string to show next (None keeps the current one).
+    """
+
+    def __init__(self, chunks, window=SEND_WINDOW, frame_interval=FRAME_INTERVAL, on_progress=None, ecc=None):
+        self.chunks = chunks
+        self.window = window
+        self.frame_interval = frame_interval
+        self.acked = [False] * len(chunks)
+        # Lane of a multi-lane transfer, named by the starting chunk
+        self.lane = chunks[0].get('lane') if chunks else None
+        # Index of the first chunk not acknowledged yet, and of the chunk on screen
+        self.base = 0
+        self.current = None
+        self.rtt = RttEstimator(granularity=frame_interval)
+        self.ecc = ecc
+        self.progress = ProgressReporter(sum(1 for chunk in chunks if chunk['id'] != FIRST_CHUNK_ID),
+                                         callback=on_progress)
+        self._shown_at = None
+        self._first_shown_at = {}
+        # Chunk index -> time it was last shown and number of times it was shown, for the retransmission timer
+        self._last_shown_at = {}
+        self._shows = {}
+        # Chunk index -> QR data string, in-flight frames are encoded once and reused every time they are shown
+        self._frames = {}
+
+    @property
+    def done(self):
+        """Whether every chunk was approved"""
+        return self.base >= len(self.chunks)
+
+    @property
+    def current_chunk(self):
+        """The chunk on screen, None once done"""
+        return None if self.done or self.current is None else self.chunks[self.current]
+
+    def start(self, now):
+        """Return the first frame to show"""
+        return self._show_next(now)
+
+    def on_frame(self, qr_data_string, now):
+        """Process a frame decoded by the camera, returns the next frame to show once the one on screen is approved"""
+        return self.on_payload(decode_qr_data(qr_data_string), now)
+
+    def on_payload(self, payload, now):
+        """Process an already decoded payload, like on_frame"""
+        if self.done or not is_approval_payload(payload) or payload.get('lane') != self.lane:
+            return None
+        approved = [index for index in self._in_flight() if approval_covers(payload, self.chunks[index]['id'])]
+        for index in approved:
+            self._acknowledge(index, now)
+        while not self.done and self.acked[self.base]:
+            self.base += 1
+        if self.done:
+            self.progress.finish()
+        if self.current in approved:
+            return self._show_next(now)
+        return None
+
+    def on_tick(self, now):
+        """Process the passing of time, a chunk whose retransmission timeout expired is shown again right away,
+        otherwise the next in-flight chunk replaces the one on screen once its interval is over"""
+        expired = self._expired(now)
+        if expired is not None:
+            self.rtt.timeout()
+            self.progress.retransmit()
+            if self.ecc:
+                self.ecc.lost()
+            return self._show(expired, now)
+        deadline = self._rotation_deadline()
+        if deadline is None or now < deadline:
+            return None
+        return self._show_next(now)
+
+    def next_deadline(self):
+        """Clock time the session wants a tick at: the next rotation or the earliest retransmission timeout"""
+        deadlines = [self._last_shown_at[index] + self.rtt.rto for index in self._in_flight() if index in self._last_shown_at]
+        rotation_deadline = self._rotation_deadline()
+        if rotation_deadline is not None:
+            deadlines.append(rotation_deadline)
+        return min(deadlines, default=None)
+
+    def upcoming(self, count):
+        """Return the frames shown after the current one: the other in-flight chunks, then count chunks entering the window"""
+        rotation = self._rotation()
+        if rotation == [self.current]:
+            rotation = [] # Alone in flight, the chunk on screen is not shown again
+        window_end = self._window_end()
+        entering = range(window_end, min(window_end + count, len(self.chunks)))
+        return [self._frame(index) for index in rotation + list(entering)]
+
+    def _acknowledge(self, index, now):
+        self.acked[index] = True
+        self._frames.pop(index, None)
+        first_shown_at = self._first_shown_at.pop(index, now)
+        observe('ack_wait', now - first_shown_at)
+        # Karn's algorithm, the approval of a chunk shown more than once cannot tell which showing it answers
+        if self._shows.pop(index, 0) == 1:
+            self.rtt.sample(now - first_shown_at)
+        if self.ecc:
+            self.ecc.delivered(self.rtt.srtt)
+        self._last_shown_at.pop(index, None)
+        if self.chunks[index]['id'] != FIRST_CHUNK_ID:
+            self.progress.chunk_done(len(self.chunks[index]['data']))
+
+    def _expired(self, now):
+        """Index of the in-flight chunk shown the longest ago if its retransmission timeout expired, else None"""
+        shown = [index for index in self._in_flight() if index in self._last_shown_at]
+        if not shown:
+            return None
+        oldest = min(shown, key=lambda index: self._last_shown_at[index])
+        return oldest if now >= self._last_shown_at[oldest] + self.rtt.rto else None
+
+    def _rotation_deadline(self):
+        """Clock time the chunk on screen gives way to the next in-flight one, None while it is the only one in flight"""
+        rotation = self._rotation()
+        if not rotation or rotation == [self.current]:
+            return None
+        return self._shown_at + self.frame_interval
+
+    def _window_end(self):
+        if self.done:
+            return self.base
+        if self.chunks[self.base]['id'] == FIRST_CHUNK_ID:
+            return self.base + 1 # The receiver ignores data chunks until it approved the starting chunk
+        return min(self.base + self.window, len(self.chunks))
+
+    def _in_flight(self):
+        """Indices of the chunks in the window that are not acknowledged yet"""
+        return [index for index in range(self.base, self._window_end()) if not self.acked[index]]
+
+    def _rotation(self):
+        """In-flight indices in the order they are shown, starting after the chunk on screen"""
+        in_flight = self._in_flight()
+        if self.current is None:
+            return in_flight
+        return [index for index in in_flight if index > self.current] + [index for index in in_flight if index <= self.current]
+
+    def _frame(self, index):
+        if index not in self._frames:
+            self._frames[index] = encode_qr_data(self.chunks[index])
+        return self._frames[index]
+
+    def _show_next(self, now):
+        rotation = [index for index in self._rotation() if index != self.current] or self._rotation()
+        if not rotation:
+            self.current = None
+            return None
+        return self._show(rotation[0], now)
+
+    def _show(self, index, now):
+        self.current = index
+        self._shown_at = now
+        self._first_shown_at.setdefault(index, now)
+        self._last_shown_at[index] = now
+        self._shows[index] = self._shows.get(index, 0) + 1
+        return self._frame(index)
+
+class ReceiverSession:
+    """Receiver side of the transfer protocol as a state machine without camera or display I/O.
+
+    Without total_chunks the session first waits for the starting chunk (answering a calibrating sender when a
+    calibration_factory is given), then collects the data chunks. Approvals acknowledge every chunk up to a
+    cumulative ID plus selective ack blocks of the chunks received beyond it. The approval on screen is updated at
+    most once per ack_interval, right away for the starting chunk, the last chunk, and a chunk the sender repeats
+    because the approval on screen does not cover it yet. In a multi-lane transfer only the data chunks of the lane
+    named by the starting chunk are taken. The session is fed the decoded camera frames and clock ticks, and returns
+    the QR data string to show next (None keeps the current one).
+    """
+
+    def __init__(self, total_chunks=None, on_progress=None, calibration_factory=None, ack_interval=ACK_INTERVAL):
+        self.on_progress = on_progress
+        self.calibration_factory = calibration_factory
+        self.ack_interval = ack_interval
+        self.calibration = None
+        self.file_metadata = None
+        self.lane = None
+        self.total_chunks = None
+        self.chunks_data = {}
+        self.progress = None
+        # Every chunk up to this ID was received
+        self.cumulative = FIRST_CHUNK_ID
+        self._arrivals = {}
+        self._shown_approval = None
+        self._approval_shown_at = None
+        self._approval_pending = False
+        self._frame = None
+        if total_chunks is not None:
+            self._start_receiving(total_chunks)
+
+    @property
+    def done(self):
+        """Whether every data chunk was received and the approval of the last one is on screen"""
+        return (self.total_chunks is not None and len(self.chunks_data) >= self.total_chunks
+                and not self._approval_pending)
+
+    def start(self, now):
+        """Return the first frame to show, the receiver has none before the sender shows something"""
+        return None
+
+    def on_frame(self, qr_data_string, now):
+        """Process a frame decoded by the camera, returns the approval (or calibration ack) to show"""
+        return self.on_payload(decode_qr_data(qr_data_string), now)
+
+    def on_payload(self, payload, now):
+        """Process an already decoded payload, like on_frame"""
+        self._frame = None
+        if self.total_chunks is None:
+            self._handle_before_start(payload, now)
+        # A camera watching one lane may also see the neighbouring lanes, their chunks reuse the same IDs
+        elif is_data_chunk(payload) and not self.done and payload.get('lane') == self.lane:
+            self._handle_data_chunk(payload, now)
+        return self._frame
+
+    def on_tick(self, now):
+        """Process the passing of time, pending approvals go out with the next decoded frame"""
+        return None
+
+    def next_deadline(self):
+        """Clock time the session wants a tick at, None while it only waits for frames"""
+        return None
+
+    def file_data(self):
+        """Return the file data reassembled from the received chunks"""
+        return reassemble_file_data(self.chunks_data)
+
+    def piggyback_approval(self, now):
+        """Return the latest approval for a frame carrying it to the sender, None before the starting chunk.
+
+        A pending approval counts as shown, it goes out with that frame rather than waiting for the interval.
+        """
+        self._send_approval(now, force=True)
+        return self._shown_approval
+
+    def _handle_before_start(self, payload, now):
+        if is_calibration_payload(payload):
+            if self.calibration_factory:
+                # Created on the first calibration payload, only a calibrating sender needs it
+                self.calibration = self.calibration or self.calibration_factory(self._show)
+                self.calibration.handle(payload)
+        elif is_starting_chunk(payload):
+            self.file_metadata = {
+                'file_name': payload.get('file_name', 'unknown_file'),
+                'total_chunks': payload.get('total_chunks', 0)
+            }
+            if 'lane' in payload:
+                self.lane = payload['lane']
+                self.file_metadata.update(lane=payload['lane'], lanes=payload.get('lanes'))
+            self._approval_pending = True
+            self._send_approval(now, force=True)
+            self._start_receiving(self.file_metadata['total_chunks'])
+
+    def _handle_data_chunk(self, payload, now):
+        chunk_id = payload['id']
+        if chunk_id in self.chunks_data:
+            self.progress.duplicate()
+            # The sender still shows a chunk we have, the approval it waits for must not wait for the interval
+            sender_waiting = not approval_covers(self._shown_approval, chunk_id)
+            self._send_approval(now, force=sender_waiting)
+            return
+        self.chunks_data[chunk_id] = payload['data']
+        self._arrivals[chunk_id] = len(self._arrivals)
+        while self.cumulative + 1 in self.chunks_data:
+            self.cumulative += 1
+        self._approval_pending = True
+        self.progress.chunk_done(len(payload['data']))
+        is_last_chunk = len(self.chunks_data) >= self.total_chunks
+        self._send_approval(now, force=is_last_chunk)
+        if self.done:
+            self.progress.finish()
+
+    def _send_approval(self, now, force=False):
+        """Show the pending approval if the last one is at least one interval old, or right away when forced"""
+        if not self._approval_pending:
+            return
+        if not force and self._approval_shown_at is not None and now - self._approval_shown_at < self.ack_interval:
+            return
+        self._shown_approval = create_approval_payload(self.cumulative, self._sack_blocks(), self.lane)
+        self._approval_shown_at = now
+        self._approval_pending = False
+        self._show(encode_qr_data(self._shown_approval))
+
+    def _sack_blocks(self):
+        """Ranges of the chunks received beyond the cumulative ID, the most recently received first"""
+        blocks, first = [], None
+        highest = max(self.chunks_data, default=self.cumulative)
+        for chunk_id in range(self.cumulative + 2, highest + 2):
+            if chunk_id in self.chunks_data:
+                first = chunk_id if first is None else first
+            elif first is not None:
+                blocks.append((first, chunk_id - 1))
+                first = None
+        blocks.sort(key=lambda block: max(self._arrivals[chunk_id] for chunk_id in range(block[0], block[1] + 1)),
+                    reverse=True)
+        return blocks[:MAX_SACK_BLOCKS]
+
+    def _start_receiving(self, total_chunks):
+        self.total_chunks = total_chunks
+        # Reports are rate limited, printing on every frame would slow down small chunks
+        self.progress = ProgressReporter(total_chunks, callback=self.on_progress)
+        if self.done:
+            self.progress.finish()
+
+    def _show(self, qr_data_string):
+        self._frame = qr_data_string
+
+class DuplexSession:
+    """Both sides of the transfer protocol at once, for two peers sending each other a file at the same time.
+
+    Every frame shows the in-flight chunk of the outgoing file with the approval of the incoming file in its ack field,
+    so neither direction spends frames on approvals alone. Once the outgoing file is approved the frames carry only
+    the approval. The session is fed the decoded camera frames and clock ticks, and returns the QR data string to
+    show next (None keeps the current one).
+    """
+
+    def __init__(self, chunks, on_progress=None, window=SEND_WINDOW, frame_interval=FRAME_INTERVAL,
+                 ack_interval=ACK_INTERVAL):
+        self.sender = SenderSession(chunks, window, frame_interval)
+        self.receiver = ReceiverSession(on_progress=on_progress, ack_interval=ack_interval)
+
+    @property
+    def done(self):
+        """Whether the outgoing file was approved and the incoming one received"""
+        return self.sender.done and self.receiver.done
+
+    @property
+    def current_chunk(self):
+        """The outgoing chunk on screen, None once the outgoing file is approved"""
+        return self.sender.current_chunk
+
+    def start(self, now):
+        """Return the first frame to show, the starting chunk of the outgoing file"""
+        self.sender.start(now)
+        return self._frame(now)
+
+    def on_frame(self, qr_data_string, now):
+        """Process a frame of the peer, returns the next frame once the outgoing chunk or the approval changes"""
+        payload = decode_qr_data(qr_data_string)
+        # The peer shows plain approvals once its own file is through
+        switched = self.sender.on_payload(piggybacked_approval(payload) or payload, now)
+        approved = self.receiver.on_payload(payload, now)
+        return self._frame(now) if switched or approved else None
+
+    def on_tick(self, now):
+        """Process the passing of time, the outgoing in-flight chunks are shown in turn"""
+        return self._frame(now) if self.sender.on_tick(now) else None
+
+    def next_deadline(self):
+        """Clock time the session wants a tick at, None while only one outgoing chunk is in flight"""
+        return self.sender.next_deadline()
+
+    def _frame(self, now):
+        approval = self.receiver.piggyback_approval(now)
+        chunk = self.sender.current_chunk
+        if chunk is None:
+            return encode_qr_data(approval) if approval else None
+        return encode_qr_data(attach_ack(chunk, approval) if approval else chunk)
+
+class BroadcastSenderSession:
+    """Sender side of a one-to-many broadcast as a state machine without camera or display I/O.
+
+    The chunks are shown as a carousel, one every frame_interval seconds. Receivers report the chunks they miss, and
+    the chunk reported missing by the most receivers since it was last shown comes next, the longest unshown one
+    among equals, so one repeat serves every receiver that lost it. A chunk never shown counts as missing at every
+    receiver. The session is done once receivers receivers reported the file complete. The session is fed the
+    decoded camera frames and clock ticks, and returns the QR data string to show next (None keeps the current one).
+    Reports naming another session than the one of the starting chunk are about a previous file and ignored.
+    """
+
+    def __init__(self, chunks, receivers, frame_interval=FRAME_INTERVAL):
+        self.chunks = chunks
+        self.receivers = receivers
+        self.frame_interval = frame_interval
+        # Session ID of the broadcast, named by the starting chunk and echoed by the receiver reports
+        self.session_id = chunks[0].get('session') if chunks else None
+        # Receiver ID -> (indices of the chunks it misses, time of the report), no missing chunk once it has the file
+        self.reports = {}
+        self.frames_shown = 0
+        self.current = None
+        self._shown_at = None
+        self._last_shown_at = {}
+        self._index_of_id = {chunk['id']: index for index, chunk in enumerate(chunks)}
+        # Chunk index -> QR data string, every chunk is shown many times
+        self._frames = {}
+
+    @property
+    def done(self):
+        """Whether enough receivers reported the file complete"""
+        return sum(1 for missing, _ in self.reports.values() if not missing) >= self.receivers
+
+    @property
+    def current_chunk(self):
+        """The chunk on screen, None before the start"""
+        return None if self.current is None else self.chunks[self.current]
+
+    @property
+    def retransmits(self):
+        """Frames that repeated an already shown chunk"""
+        return self.frames_shown - len(self._last_shown_at)
+
+    def start(self, now):
+        """Return the first frame to show"""
+        return self._show(self._schedule(1)[0], now)
+
+    def on_frame(self, qr_data_string, now):
+        """Process a frame decoded by the camera, reports only change what comes next so nothing is shown right away"""
+        return self.on_payload(decode_qr_data(qr_data_string), now)
+
+    def on_payload(self, payload, now):
+        """Process an already decoded payload, like on_frame"""
+        # A receiver without the starting chunk reports no session, it only misses the starting chunk
+        if is_nack_payload(payload) and payload.get('session', self.session_id) == self.session_id:
+            missing = {self._index_of_id[chunk_id] for first, last in payload['nack']
+                       for chunk_id in range(first, last + 1) if chunk_id in self._index_of_id}
+            self.reports[payload['receiver']] = (missing, now)
+        return None
+
+    def on_tick(self, now):
+        """Process the passing of time, the next scheduled chunk replaces the one on screen once its interval is over"""
+        deadline = self.next_deadline()
+        if deadline is None or now < deadline:
+            return None
+        return self._show(self._schedule(1)[0], now)
+
+    def next_deadline(self):
+        """Clock time the session wants a tick at, the end of the interval of the chunk on screen"""
+        if self.done or self._shown_at is None:
+            return None
+        return self._shown_at + self.frame_interval
+
+    def upcoming(self, count):
+        """Return the frames scheduled after the current one, as long as no new report changes the schedule"""
+        return [self._frame(index) for index in self._schedule(count)]
+
+    def _schedule(self, count):
+        """Indices of the next count chunks to show"""
+        last_shown_at = dict(self._last_shown_at)
+        scheduled = []
+        for _ in range(min(count, len(self.chunks))):
+            index = max(range(len(self.chunks)), key=lambda index: (
+                self._demand(index, last_shown_at), -last_shown_at.get(index, float('-inf')), -index))
+            scheduled.append(index)
+            # A scheduled chunk serves every report received so far
+            last_shown_at[index] = float('inf')
+        return scheduled
+
+    def _demand(self, index, last_shown_at):
+        """Number of receivers waiting for the chunk"""
+        if index not in last_shown_at:
+            return max(self.receivers, len(self.reports))
+        # Only reports made at least a frame after the chunk was shown tell it was lost rather than not yet decoded
+        shown_at = last_shown_at[index]
+        return sum(1 for missing, reported_at in self.reports.values()
+                   if index in missing and reported_at >= shown_at + self.frame_interval)
+
+    def _frame(self, index):
+        if index not in self._frames:
+            self._frames[index] = encode_qr_data(self.chunks[index])
+        return self._frames[index]
+
+    def _show(self, index, now):
+        self.current = index
+        self._shown_at = now
+        self._last_shown_at[index] = now
+        self.frames_shown += 1
+        return self._frame(index)
+
+class BroadcastReceiverSession:
+    """Receiver side of a one-to-many broadcast as a state machine without camera or display I/O.
+
+    Chunks are collected in whatever order the carousel shows them, data chunks seen before the starting chunk
+    included. The receiver shows a report of the chunks it misses at most once per report_interval, the starting
+    chunk until it has the metadata, and a last report once the file is complete. The session is fed the decoded
+    camera frames and clock ticks, and returns the QR data string to show next (None keeps the current one).
+    """
+
+    def __init__(self, receiver_id, on_progress=None, report_interval=REPORT_INTERVAL):
+        self.receiver_id = receiver_id
+        self.on_progress = on_progress
+        self.report_interval = report_interval
+        self.session_id = None
+        self.file_metadata = None
+        self.total_chunks = None
+        self.chunks_data = {}
+        self.progress = None
+        self._reported_at = None
+        self._complete_reported = False
+
+    @property
+    def complete(self):
+        """Whether every data chunk was received"""
+        return self.total_chunks is not None and len(self.chunks_data) >= self.total_chunks
+
+    @property
+    def done(self):
+        """Whether the file is complete and the report saying so is on screen"""
+        return self._complete_reported
+
+    def start(self, now):
+        """Return the first frame to show, the receiver has none before the carousel shows something"""
+        return None
+
+    def on_frame(self, qr_data_string, now):
+        """Process a frame decoded by the camera, returns the missing chunk report to show when one is due"""
+        return self.on_payload(decode_qr_data(qr_data_string), now)
+
+    def on_payload(self, payload, now):
+        """Process an already decoded payload, like on_frame"""
+        if self.done:
+            return None
+        if is_starting_chunk(payload) and self.file_metadata is None:
+            self.file_metadata = {
+                'file_name': payload.get('file_name', 'unknown_file'),
+                'total_chunks': payload.get('total_chunks', 0)
+            }
+            self.total_chunks = self.file_metadata['total_chunks']
+            self.session_id = payload.get('session')
+            self.progress = ProgressReporter(self.total_chunks, callback=self.on_progress)
+            for data in self.chunks_data.values():
+                self.progress.chunk_done(len(data))
+        elif is_data_chunk(payload):
+            self._handle_data_chunk(payload)
+        return self._report(now)
+
+    def on_tick(self, now):
+        """Process the passing of time, the next report is shown once the interval is over"""
+        return self._report(now)
+
+    def next_deadline(self):
+        """Clock time the session wants a tick at, the next report"""
+        if self.done or self._reported_at is None:
+            return None
+        return self._reported_at + self.report_interval
+
+    def file_data(self):
+        """Return the file data reassembled from the received chunks"""
+        return reassemble_file_data(self.chunks_data)
+
+    def _handle_data_chunk(self, payload):
+        chunk_id = payload['id']
+        if chunk_id in self.chunks_data:
+            if self.progress:
+                self.progress.duplicate()
+            return
+        self.chunks_data[chunk_id] = payload['data']
+        if self.progress:
+            self.progress.chunk_done(len(payload['data']))
+
+    def _missing_ids(self):
+        if self.total_chunks is None:
+            return [FIRST_CHUNK_ID]
+        return [chunk_id for chunk_id in range(FIRST_CHUNK_ID + 1, self.total_chunks + 1) if chunk_id not in self.chunks_data]
+
+    def _report(self, now):
+        """Return the report when one is due, right away once the file is complete"""
+        if self.complete:
+            self._complete_reported = True
+            self.progress.finish()
+        elif self._reported_at is not None and now - self._reported_at < self.report_interval:
+            return None
+        self._reported_at = now
+        return encode_qr_data(create_nack_payload(self.receiver_id, id_ranges(self._missing_ids()), self.session_id))
+
+def reassemble_file_data(chunks_data):
+    """Reconstruct the file data from the received chunks in chunk ID order"""
+    # A single join copies every byte once, appending to a bytes object copies the whole file per chunk
+    return b"".join(chunks_data[chunk_id] for chunk_id in sorted(chunks_data))
+
+def reassemble_striped_file_data(lanes_chunks_data):
+    """Reconstruct the file data from chunks striped over lanes, given the received chunks of every lane in lane order"""
+    stripes = [[chunks_data[chunk_id] for chunk_id in sorted(chunks_data)] for chunks_data in lanes_chunks_data]
+    # File chunk n went to lane n % lanes, so the file reads one chunk of every lane in turn
+    return b"".join(chunk for row in itertools.zip_longest(*stripes, fillvalue=b"") for chunk in row)
+
+def run_session(session, read_frame, show, clock=time.monotonic, until=None, prefetch=None):
+    """Event loop driving a session with real I/O until it is done (or until(session) is true), returns the session.
+
+    read_frame(timeout=None) returns the next decoded QR data string, or None when the timeout passed without one.
+    show(qr_data_string) puts a frame on screen. prefetch(qr_data_strings), when given, is told the upcoming frames
+    of the session after each shown one, so they can be prepared while the session waits.
+    """
+    until = until or (lambda s: s.done)
+    now = clock()
+    frames = [session.start(now)]
+    while True:
+        shown = False
+        for frame in frames:
+            if frame is not None:
+                show(frame)
+                shown = True
+        if shown:
+            # Time from the frame that triggered the switch to the new frame being on screen
+            observe('switch', clock() - now)
+            if prefetch:
+                prefetch(session.upcoming(PREFETCH_DEPTH))
+        if until(session):
+            return session
+        deadline = session.next_deadline()
+        # Block on the camera unless the session waits for a deadline
+        qr_data_string = read_frame() if deadline is None else read_frame(max(deadline - clock(), 0))
+        now = clock()
+        frames = [session.on_frame(qr_data_string, now) if qr_data_string is not None else None, session.on_tick(now)]
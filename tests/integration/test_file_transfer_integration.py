@@ -6,7 +6,7 @@ from unittest.mock import MagicMock, patch
 # Add the parent directory to the path so we can import our modules  
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-from sender import wait_for_chunk_approval
+from session import SenderSession, run_session
 from receiver import wait_for_starting_chunk, receive_file_chunks
 from protocol_utils import (
     encode_qr_data, create_approval_payload,
@@ -38,7 +38,7 @@ class TestSenderReceiverIntegration(unittest.TestCase):
         non_starting_qr = encode_qr_data(non_starting_payload)
         
         with patch('receiver.get_next_qr_data') as mock_get_qr, \
-             patch('receiver.send_approval') as mock_send_approval:
+             patch('receiver.show_receiver_qr') as mock_show:
             
             mock_cam = MagicMock()
             # First QR is not starting, second is starting
@@ -49,13 +49,13 @@ class TestSenderReceiverIntegration(unittest.TestCase):
             
             # Verify retry behavior with real protocol validation
             self.assertEqual(mock_get_qr.call_count, 2)
-            mock_send_approval.assert_called_once_with(starting_payload['id'])
+            mock_show.assert_called_once_with(encode_qr_data(create_approval_payload(starting_payload['id'])))
             self.assertEqual(result['file_name'], "test.txt")
             self.assertEqual(result['total_chunks'], 2)
 
     def test_sender_receiver_approval_protocol_integration(self):
-        """Test actual sender function waiting for receiver-generated approval QRs"""
-        # This tests cross-module integration: sender function + receiver-generated approvals
+        """Test actual sender session waiting for receiver-generated approval QRs"""
+        # This tests cross-module integration: sender session + receiver-generated approvals
         test_chunk = create_qr_payload(b"test data", 5)
         
         # Create approval QR like receiver would send
@@ -66,20 +66,21 @@ class TestSenderReceiverIntegration(unittest.TestCase):
         wrong_approval = create_approval_payload(3)
         wrong_approval_qr = encode_qr_data(wrong_approval)
         
-        # Test actual sender function with receiver-generated approvals
-        with patch('sender.get_next_qr_data') as mock_get_qr:
-            mock_cam = MagicMock()
-            
-            # Test sender accepts correct approval from receiver
-            mock_get_qr.return_value = approval_qr
-            wait_for_chunk_approval(mock_cam, test_chunk)  # Should complete without error
-            
-            # Test sender rejects wrong approval and retries until correct one
-            mock_get_qr.side_effect = [wrong_approval_qr, approval_qr]
-            wait_for_chunk_approval(mock_cam, test_chunk)  # Should retry and then succeed
-            
-            # Verify sender actually called camera twice due to retry
-            self.assertEqual(mock_get_qr.call_count, 3)  # 1 from first test + 2 from retry test
+        # Test actual sender session with receiver-generated approvals
+        read_frame = MagicMock()
+        
+        # Test sender accepts correct approval from receiver
+        read_frame.return_value = approval_qr
+        session = run_session(SenderSession([test_chunk]), read_frame, show=MagicMock())
+        self.assertTrue(session.done)
+        
+        # Test sender rejects wrong approval and retries until correct one
+        read_frame.side_effect = [wrong_approval_qr, approval_qr]
+        session = run_session(SenderSession([test_chunk]), read_frame, show=MagicMock())
+        self.assertTrue(session.done)
+        
+        # Verify sender actually read the camera twice due to retry
+        self.assertEqual(read_frame.call_count, 3)  # 1 from first test + 2 from retry test
 
     def test_protocol_data_integrity_across_modules(self):
         """Test that data survives the complete sender => protocol => receiver pipeline""" 
@@ -98,7 +99,7 @@ class TestSenderReceiverIntegration(unittest.TestCase):
         qr_iterator = iter(transmitted_qr_strings)
         
         with patch('receiver.get_next_qr_data') as mock_get_qr, \
-             patch('receiver.send_approval'):
+             patch('receiver.show_receiver_qr'):
             
             mock_cam = MagicMock()
             mock_get_qr.side_effect = lambda cam: next(qr_iterator)
@@ -0,0 +1,230 @@
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from functools import partial
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from camera_handler import set_group_decoding
+from display_utils import FramebufferBackend, set_display_backend
+from sender import send_file, send_file_async, broadcast_file, SENDER_WINDOW_NAME
+from ecc import ErrorCorrectionAdapter
+from receiver import receive_file, receive_file_async, receive_broadcast, RECEIVER_WINDOW_NAME
+from duplex import exchange_files
+from lanes import Lane, send_file_lanes, receive_file_lanes
+from calibration import CalibrationResponder, calibrate_link, load_cached_level, pair_key, DENSITY_LEVELS
+
+# Seconds the whole transfer may take before the test fails instead of hanging on a side that never finishes
+TRANSFER_TIMEOUT = 120
+
+class TestHeadlessLoopback(unittest.TestCase):
+    """Integration test running a real sender to receiver transfer in one process without a screen or camera"""
+
+    def setUp(self):
+        """Route every window to an in-memory framebuffer"""
+        self.backend = FramebufferBackend()
+        set_display_backend(self.backend)
+        self.test_file_path = os.path.join(os.path.dirname(__file__), "test_file.txt")
+        with open(self.test_file_path, 'rb') as f:
+            self.test_file_data = f.read()
+
+    def tearDown(self):
+        """Restore the default display backend"""
+        set_display_backend(None)
+
+    def test_file_transfer_over_framebuffer(self):
+        """Test the file survives a full transfer where each side reads the other side's window"""
+        # Each side's camera looks at the other side's window
+        sender_cam = self.backend.open_capture(RECEIVER_WINDOW_NAME)
+        receiver_cam = self.backend.open_capture(SENDER_WINDOW_NAME)
+
+        # Both sides run in daemon threads so a stalled transfer fails the test instead of blocking the run
+        received = {}
+        sender_thread = threading.Thread(
+            target=send_file, args=(sender_cam, "test_file.txt", self.test_file_data), daemon=True
+        )
+        receiver_thread = threading.Thread(
+            target=lambda: received.update(result=receive_file(receiver_cam)), daemon=True
+        )
+        sender_thread.start()
+        receiver_thread.start()
+        receiver_thread.join(timeout=TRANSFER_TIMEOUT)
+        sender_thread.join(timeout=5)
+
+        self.assertFalse(receiver_thread.is_alive(), f"Receiver did not finish within {TRANSFER_TIMEOUT}s")
+        self.assertFalse(sender_thread.is_alive(), "Sender did not finish after the receiver")
+        file_metadata, file_data = received['result']
+        self.assertEqual(file_metadata['file_name'], "test_file.txt")
+        self.assertEqual(file_data, self.test_file_data)
+
+    def test_async_transfer_over_framebuffer(self):
+        """Test the asyncio runtime transfers the file with both sides sharing one event loop"""
+        sender_cam = self.backend.open_capture(RECEIVER_WINDOW_NAME)
+        receiver_cam = self.backend.open_capture(SENDER_WINDOW_NAME)
+
+        async def transfer():
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    send_file_async(sender_cam, "test_file.txt", self.test_file_data),
+                    receive_file_async(receiver_cam)
+                ),
+                TRANSFER_TIMEOUT
+            )
+
+        summary, (file_metadata, file_data) = asyncio.run(transfer())
+
+        self.assertEqual(summary['file_size'], len(self.test_file_data))
+        self.assertEqual(file_metadata['file_name'], "test_file.txt")
+        self.assertEqual(file_data, self.test_file_data)
+
+    def test_lanes_transfer_over_framebuffer(self):
+        """Test a file striped over two lanes, each lane's camera reading the peer's window of the same lane"""
+        sender_lanes = [Lane(f"Sender lane {i}", self.backend.open_capture(f"Receiver lane {i}")) for i in range(2)]
+        receiver_lanes = [Lane(f"Receiver lane {i}", self.backend.open_capture(f"Sender lane {i}")) for i in range(2)]
+
+        async def transfer():
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    send_file_lanes(sender_lanes, "test_file.txt", self.test_file_data),
+                    receive_file_lanes(receiver_lanes)
+                ),
+                TRANSFER_TIMEOUT
+            )
+
+        summary, (file_metadata, file_data) = asyncio.run(transfer())
+
+        self.assertEqual(summary['lanes'], 2)
+        self.assertEqual(file_metadata, {'file_name': "test_file.txt", 'total_chunks': summary['total_chunks']})
+        self.assertEqual(file_data, self.test_file_data)
+
+    def test_symbol_group_transfer_over_framebuffer(self):
+        """Test chunks four times the default size shown as Structured Append groups arrive whole"""
+        sender_cam = self.backend.open_capture(RECEIVER_WINDOW_NAME)
+        receiver_cam = self.backend.open_capture(SENDER_WINDOW_NAME)
+        file_data = self.test_file_data * 4
+        set_group_decoding(True)
+        self.addCleanup(set_group_decoding, False)
+
+        async def transfer():
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    send_file_async(sender_cam, "test_file.txt", file_data, symbols=4),
+                    receive_file_async(receiver_cam)
+                ),
+                TRANSFER_TIMEOUT
+            )
+
+        summary, (_, received_data) = asyncio.run(transfer())
+
+        self.assertEqual(summary['total_chunks'], -(-len(file_data) // 400))
+        self.assertEqual(received_data, file_data)
+
+    def test_adaptive_error_correction_over_framebuffer(self):
+        """Test the error correction level moves down on a clean link while the file transfers"""
+        sender_cam = self.backend.open_capture(RECEIVER_WINDOW_NAME)
+        receiver_cam = self.backend.open_capture(SENDER_WINDOW_NAME)
+        file_data = self.test_file_data * 10
+        ecc = ErrorCorrectionAdapter(window=4, fast_rtt=TRANSFER_TIMEOUT)
+
+        async def transfer():
+            return await asyncio.wait_for(
+                asyncio.gather(
+                    send_file_async(sender_cam, "test_file.txt", file_data, ecc=ecc),
+                    receive_file_async(receiver_cam)
+                ),
+                TRANSFER_TIMEOUT
+            )
+
+        summary, (_, received_data) = asyncio.run(transfer())
+
+        self.assertEqual(received_data, file_data)
+        self.assertEqual(summary['error_correction']['level'], "L")
+
+    @patch('receiver.BROADCAST_LINGER', 0.5)
+    def test_broadcast_over_framebuffer(self):
+        """Test the carousel runs until the receiver reports the file complete"""
+        sender_cam = self.backend.open_capture(RECEIVER_WINDOW_NAME)
+        receiver_cam = self.backend.open_capture(SENDER_WINDOW_NAME)
+
+        results = {}
+        sender_thread = threading.Thread(target=lambda: results.update(summary=broadcast_file(
+            sender_cam, "test_file.txt", self.test_file_data, receivers=1)), daemon=True)
+        receiver_thread = threading.Thread(target=lambda: results.update(received=receive_broadcast(receiver_cam, 'r1')),
+                                           daemon=True)
+        sender_thread.start()
+        receiver_thread.start()
+        receiver_thread.join(timeout=TRANSFER_TIMEOUT)
+        sender_thread.join(timeout=5)
+
+        self.assertFalse(receiver_thread.is_alive(), f"Receiver did not finish within {TRANSFER_TIMEOUT}s")
+        self.assertFalse(sender_thread.is_alive(), "Sender did not see the complete report")
+        file_metadata, file_data = results['received']
+        self.assertEqual(file_metadata['file_name'], "test_file.txt")
+        self.assertEqual(file_data, self.test_file_data)
+        self.assertEqual(results['summary']['receivers'], 1)
+
+    def test_duplex_exchange_over_framebuffer(self):
+        """Test two duplex peers send each other a file at the same time, each reading the other's window"""
+        peer_a_cam = self.backend.open_capture("Duplex B")
+        peer_b_cam = self.backend.open_capture("Duplex A")
+        reply_data = b"reply from peer b\n" * 40
+
+        results = {}
+        peer_a_thread = threading.Thread(target=lambda: results.update(a=exchange_files(
+            peer_a_cam, "test_file.txt", self.test_file_data, "Duplex A")), daemon=True)
+        peer_b_thread = threading.Thread(target=lambda: results.update(b=exchange_files(
+            peer_b_cam, "reply.txt", reply_data, "Duplex B")), daemon=True)
+        peer_a_thread.start()
+        peer_b_thread.start()
+        peer_a_thread.join(timeout=TRANSFER_TIMEOUT)
+        peer_b_thread.join(timeout=5)
+
+        self.assertFalse(peer_a_thread.is_alive(), f"Peer a did not finish within {TRANSFER_TIMEOUT}s")
+        self.assertFalse(peer_b_thread.is_alive(), "Peer b did not finish after peer a")
+        self.assertEqual(results['a'][1], ({'file_name': "reply.txt", 'total_chunks': 8}, reply_data))
+        self.assertEqual(results['b'][1], ({'file_name': "test_file.txt", 'total_chunks': results['a'][0]['total_chunks']},
+                                           self.test_file_data))
+
+    def test_calibrated_transfer_over_framebuffer(self):
+        """Test the calibration locks the densest level on a perfect link and the file survives the denser chunks"""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        sender_cache = os.path.join(temp_dir.name, "sender.json")
+        receiver_cache = os.path.join(temp_dir.name, "receiver.json")
+        sender_cam = self.backend.open_capture(RECEIVER_WINDOW_NAME)
+        receiver_cam = self.backend.open_capture(SENDER_WINDOW_NAME)
+
+        def calibrate_and_send():
+            profile = calibrate_link(sender_cam, SENDER_WINDOW_NAME, sender_cache, "sender")
+            sent['profile'] = profile
+            send_file(sender_cam, "test_file.txt", self.test_file_data, profile)
+
+        sent, received = {}, {}
+        responder = partial(CalibrationResponder, cache_path=receiver_cache, device_id="receiver")
+        with patch('receiver.CalibrationResponder', responder):
+            sender_thread = threading.Thread(target=calibrate_and_send, daemon=True)
+            receiver_thread = threading.Thread(
+                target=lambda: received.update(result=receive_file(receiver_cam)), daemon=True
+            )
+            sender_thread.start()
+            receiver_thread.start()
+            receiver_thread.join(timeout=TRANSFER_TIMEOUT)
+            sender_thread.join(timeout=5)
+
+        self.assertFalse(receiver_thread.is_alive(), f"Receiver did not finish within {TRANSFER_TIMEOUT}s")
+        self.assertFalse(sender_thread.is_alive(), "Sender did not finish after the receiver")
+        densest_level = len(DENSITY_LEVELS) - 1
+        self.assertEqual(sent['profile'].level, densest_level)
+        self.assertEqual(received['result'][1], self.test_file_data)
+        # Both sides cached the locked level for this device pair
+        pair = pair_key("sender", "receiver")
+        self.assertEqual(load_cached_level(pair, sender_cache), densest_level)
+        self.assertEqual(load_cached_level(pair, receiver_cache), densest_level)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
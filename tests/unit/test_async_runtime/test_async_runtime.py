@@ -0,0 +1,131 @@
+import unittest
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+import numpy as np
+from async_runtime import AsyncQRStream, AsyncQRDisplay, run_session_async
+from display_utils import FramebufferBackend, render_qr, set_display_backend
+from session import SenderSession
+from protocol_utils import encode_qr_data, decode_qr_data, create_chunks_to_send, create_approval_payload
+
+class FakeCamera:
+    """Frame source returning a fixed image"""
+
+    def __init__(self, image):
+        self.image = image
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        return self.image is not None, self.image
+
+class TestAsyncQRStream(unittest.TestCase):
+    """Test cases for the async stream of decoded camera frames"""
+
+    def test_stream_yields_decoded_frames(self):
+        """Test frames captured and decoded in executor threads come out of the stream"""
+        cam = FakeCamera(render_qr("hello"))
+
+        async def first_two():
+            async with AsyncQRStream(cam) as frames:
+                return [await frames.read(timeout=5), await frames.__anext__()]
+
+        self.assertEqual(asyncio.run(first_two()), ["hello", "hello"])
+        self.assertGreaterEqual(cam.reads, 2)
+
+    def test_read_times_out_without_qr(self):
+        """Test a read returns None once the timeout passes without a decoded frame"""
+        cam = FakeCamera(np.full((64, 64), 255, dtype=np.uint8))
+
+        async def read_blank():
+            async with AsyncQRStream(cam) as frames:
+                return await frames.read(timeout=0.2)
+
+        self.assertIsNone(asyncio.run(read_blank()))
+
+    def test_capture_error_surfaces_on_read(self):
+        """Test an error of the capture task is raised to the reader instead of hanging it"""
+        class BrokenCamera:
+            def read(self):
+                raise RuntimeError("camera unplugged")
+
+        async def read_broken():
+            async with AsyncQRStream(BrokenCamera()) as frames:
+                await asyncio.sleep(0.1)
+                await frames.read(timeout=1)
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(read_broken())
+
+    def test_failed_decode_gives_back_buffers(self):
+        """Test a frame whose decode raised is given back to the capture buffers"""
+        decoded = []
+
+        def broken_decode(frame):
+            decoded.append(frame)
+            raise RuntimeError("decoder crashed")
+
+        releases = []
+
+        async def read_broken():
+            async with AsyncQRStream(FakeCamera(render_qr("hello"))) as frames:
+                frames.buffers.release = MagicMock(wraps=frames.buffers.release)
+                releases.append(frames.buffers.release)
+                await asyncio.sleep(0.1)
+                await frames.read(timeout=1)
+
+        with patch('async_runtime.get_qr_message_from_frame', broken_decode), self.assertRaises(RuntimeError):
+            asyncio.run(read_broken())
+
+        releases[0].assert_any_call(decoded[0])
+
+class TestAsyncQRDisplay(unittest.TestCase):
+    """Test cases for the awaitable QR display"""
+
+    def setUp(self):
+        self.backend = FramebufferBackend()
+        set_display_backend(self.backend)
+        self.addCleanup(set_display_backend, None)
+
+    def test_show_renders_into_window(self):
+        """Test a shown QR code reaches the window and the window closes on request"""
+        async def show_and_close():
+            async with AsyncQRDisplay("window") as display:
+                await display.show("hello")
+                await display.close()
+
+        asyncio.run(show_and_close())
+
+        frames = self.backend.get_queue("window")
+        self.assertEqual(frames.get_nowait().shape, render_qr("hello").shape)
+        self.assertIsNone(frames.get_nowait())
+
+class TestRunSessionAsync(unittest.TestCase):
+    """Test cases for the asyncio event loop driving a session"""
+
+    def test_sender_session_completes(self):
+        """Test every chunk is shown and the session finishes once each one is approved"""
+        chunks = create_chunks_to_send("a.txt", b"x" * 150)
+        shown = []
+
+        class Display:
+            async def show(self, qr_data_string):
+                shown.append(qr_data_string)
+
+        class Frames:
+            async def read(self, timeout=None):
+                # Approves whatever chunk is on screen
+                return encode_qr_data(create_approval_payload(decode_qr_data(shown[-1])['id']))
+
+        session = asyncio.run(run_session_async(SenderSession(chunks), Frames(), Display()))
+
+        self.assertTrue(session.done)
+        self.assertEqual(shown, [encode_qr_data(chunk) for chunk in chunks])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
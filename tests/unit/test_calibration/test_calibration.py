@@ -0,0 +1,162 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from calibration import (
+    CalibrationResponder, LinkProfile, DENSITY_LEVELS, MAX_CHUNK_ID, REQUIRED_DECODES, DECODE_WINDOW,
+    chunk_size_for, create_probe, get_device_id, load_cached_level, save_cached_level, pair_key
+)
+from protocol_utils import (
+    encode_qr_data, decode_qr_data, create_calibration_payload, is_calibration_payload, is_data_chunk,
+    CALIBRATION_PROBE, CALIBRATION_ACK, CALIBRATION_LOCK
+)
+from qr_encoder import SessionQREncoder
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestDensityLevels(unittest.TestCase):
+    """Test cases for the density levels and their payload sizes"""
+
+    def test_levels_get_denser(self):
+        """Test every level carries bigger chunks than the previous one"""
+        chunk_sizes = [LinkProfile.for_level(level).chunk_size for level in range(len(DENSITY_LEVELS))]
+
+        self.assertEqual(chunk_sizes, sorted(set(chunk_sizes)))
+
+    def test_chunks_fit_level_symbol(self):
+        """Test a full chunk with the largest chunk ID fits the symbol of its level"""
+        for level, (version, error_correction, _) in enumerate(DENSITY_LEVELS):
+            with self.subTest(level=level):
+                chunk = {"id": MAX_CHUNK_ID, "data": bytes(chunk_size_for(version, error_correction))}
+                capacity = SessionQREncoder(version, error_correction).capacity
+                self.assertLessEqual(len(encode_qr_data(chunk)), capacity)
+
+    def test_probe_fills_level_symbol(self):
+        """Test a probe fits its level and is nearly as long as the symbol capacity"""
+        for level, (version, error_correction, _) in enumerate(DENSITY_LEVELS):
+            with self.subTest(level=level):
+                probe = encode_qr_data(create_probe(level, "0123456789ab"))
+                capacity = SessionQREncoder(version, error_correction).capacity
+                self.assertTrue(capacity - 4 <= len(probe) <= capacity)
+
+    def test_probe_is_not_file_data(self):
+        """Test calibration payloads are never taken for file chunks"""
+        probe = decode_qr_data(encode_qr_data(create_probe(2, "device")))
+
+        self.assertTrue(is_calibration_payload(probe, CALIBRATION_PROBE))
+        self.assertFalse(is_calibration_payload(probe, CALIBRATION_ACK))
+        self.assertFalse(is_data_chunk(probe))
+
+class TestCalibrationCache(unittest.TestCase):
+    """Test cases for the per device pair calibration cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache_path = os.path.join(self.temp_dir.name, "calibration.json")
+
+    def test_cache_round_trip(self):
+        """Test a saved level is loaded back for the same pair only"""
+        save_cached_level(pair_key("a", "b"), 3, self.cache_path)
+
+        self.assertEqual(load_cached_level(pair_key("a", "b"), self.cache_path), 3)
+        self.assertIsNone(load_cached_level(pair_key("b", "a"), self.cache_path))
+
+    def test_missing_or_broken_cache(self):
+        """Test a missing or unreadable cache has no level"""
+        self.assertIsNone(load_cached_level("a->b", self.cache_path))
+
+        with open(self.cache_path, "w") as f:
+            f.write("not json")
+        self.assertIsNone(load_cached_level("a->b", self.cache_path))
+
+    def test_cache_ignored_when_levels_change(self):
+        """Test a level cached with other parameters is not reused"""
+        with open(self.cache_path, "w") as f:
+            json.dump({"a->b": {"level": 1, "parameters": [40, 0, 1]}}, f)
+
+        self.assertIsNone(load_cached_level("a->b", self.cache_path))
+
+    def test_device_id_is_stable(self):
+        """Test the device ID is created once and then read back"""
+        path = os.path.join(self.temp_dir.name, "nested", "device_id")
+
+        device_id = get_device_id(path)
+
+        self.assertTrue(device_id)
+        self.assertEqual(get_device_id(path), device_id)
+
+class TestCalibrationResponder(unittest.TestCase):
+    """Test cases for the receiver side of the calibration handshake"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache_path = os.path.join(self.temp_dir.name, "calibration.json")
+        self.clock = FakeClock()
+        self.shown = []
+        self.responder = CalibrationResponder(self.shown.append, self.cache_path, "receiver", self.clock)
+
+    def shown_payloads(self):
+        return [decode_qr_data(qr_data_string) for qr_data_string in self.shown]
+
+    def test_ack_after_reliable_decodes(self):
+        """Test a level is acked once, after enough decodes within the decode window"""
+        probe = create_probe(1, "sender")
+        for _ in range(REQUIRED_DECODES - 1):
+            self.responder.handle(probe)
+            self.clock.now += 0.1
+        self.assertEqual(self.shown, [])
+
+        self.responder.handle(probe)
+        self.responder.handle(probe)
+
+        acks = self.shown_payloads()
+        self.assertEqual(len(acks), 1)
+        self.assertTrue(is_calibration_payload(acks[0], CALIBRATION_ACK))
+        self.assertEqual((acks[0]['level'], acks[0]['device']), (1, "receiver"))
+        self.assertIsNone(acks[0]['cached_level'])
+
+    def test_no_ack_for_sporadic_decodes(self):
+        """Test decodes spread wider than the decode window never ack the level"""
+        probe = create_probe(4, "sender")
+        for _ in range(REQUIRED_DECODES * 2):
+            self.responder.handle(probe)
+            self.clock.now += DECODE_WINDOW
+
+        self.assertEqual(self.shown, [])
+
+    def test_ack_carries_cached_level(self):
+        """Test the ack tells the sender the level cached for the pair"""
+        save_cached_level(pair_key("sender", "receiver"), 5, self.cache_path)
+
+        for _ in range(REQUIRED_DECODES):
+            self.responder.handle(create_probe(0, "sender"))
+
+        self.assertEqual(self.shown_payloads()[0]['cached_level'], 5)
+
+    def test_lock_caches_level_and_acks(self):
+        """Test the locked level is cached for the pair and confirmed to the sender"""
+        lock = create_calibration_payload(CALIBRATION_LOCK, 2, "sender")
+
+        self.responder.handle(lock)
+
+        ack = self.shown_payloads()[0]
+        self.assertEqual((ack['level'], ack['locked']), (2, True))
+        self.assertEqual(self.responder.locked_level, 2)
+        self.assertEqual(load_cached_level(pair_key("sender", "receiver"), self.cache_path), 2)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,171 @@
+import unittest
+import sys
+import os
+import threading
+import cv2
+import numpy as np
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from camera_handler import CaptureBuffers, RegionCapture, get_frame, get_capture_buffers, get_next_qr_data
+from display_utils import render_qr
+
+class FakeVideoCapture:
+    """Frame source filling the given image in place like cv2.VideoCapture, a new array when it has another size"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.allocations = 0
+
+    def read(self, image=None):
+        if not self.frames:
+            return False, None
+        frame = self.frames.pop(0)
+        if frame is None:
+            return False, None
+        if image is None or image.shape != frame.shape:
+            self.allocations += 1
+            return True, frame.copy()
+        image[...] = frame
+        return True, image
+
+class PlainCapture:
+    """Frame source whose read() takes no image argument, returning frames of its own"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self):
+        return True, self.frames.pop(0)
+
+def bgr_frame(value, shape=(48, 64)):
+    frame = np.zeros(shape + (3,), dtype=np.uint8)
+    frame[..., 1] = value
+    return frame
+
+class TestCaptureBuffers(unittest.TestCase):
+    """Test cases for capturing frames into preallocated buffers"""
+
+    def test_buffers_reused_once_released(self):
+        """Test a steady capture and release loop allocates only the first frame and grayscale buffers"""
+        buffers = CaptureBuffers()
+        cam = FakeVideoCapture(bgr_frame(value) for value in range(10))
+
+        for value in range(10):
+            ret, gray = buffers.capture(cam)
+            self.assertTrue(ret)
+            np.testing.assert_array_equal(gray, cv2.cvtColor(bgr_frame(value), cv2.COLOR_BGR2GRAY))
+            buffers.release(gray)
+
+        self.assertEqual(buffers.allocations, 2)
+        self.assertEqual(cam.allocations, 1)
+
+    def test_lent_frame_not_overwritten(self):
+        """Test a frame still being decoded keeps its content while the next frames are captured"""
+        buffers = CaptureBuffers()
+        cam = FakeVideoCapture(bgr_frame(value) for value in (50, 100, 150))
+        _, first = buffers.capture(cam)
+        expected = first.copy()
+
+        _, second = buffers.capture(cam)
+        buffers.release(second)
+        buffers.capture(cam)
+
+        self.assertIsNot(first, second)
+        np.testing.assert_array_equal(first, expected)
+
+    def test_frame_size_change_reallocates(self):
+        """Test a new frame size gets new buffers instead of a failed conversion"""
+        buffers = CaptureBuffers()
+        cam = FakeVideoCapture([bgr_frame(1), bgr_frame(2, (24, 32))])
+        _, gray = buffers.capture(cam)
+        buffers.release(gray)
+
+        _, gray = buffers.capture(cam)
+
+        self.assertEqual(gray.shape, (24, 32))
+        self.assertEqual(buffers.allocations, 4)
+
+    def test_failed_read_keeps_buffers(self):
+        """Test a failed grab returns no frame and the buffers stay available"""
+        buffers = CaptureBuffers()
+        cam = FakeVideoCapture([bgr_frame(1), None, bgr_frame(2)])
+        buffers.release(buffers.capture(cam)[1])
+
+        self.assertIsNone(get_frame(cam, buffers))
+        ret, gray = buffers.capture(cam)
+
+        self.assertTrue(ret)
+        self.assertEqual(buffers.allocations, 2)
+
+    def test_grayscale_source_not_converted(self):
+        """Test a grayscale source is lent as read, without a conversion buffer"""
+        buffers = CaptureBuffers()
+        cam = FakeVideoCapture([np.full((8, 8), 7, dtype=np.uint8)] * 2)
+        buffers.release(buffers.capture(cam)[1])
+
+        _, gray = buffers.capture(cam)
+
+        self.assertEqual(gray.ndim, 2)
+        self.assertEqual(buffers.allocations, 1)
+
+    def test_source_without_image_argument(self):
+        """Test a source whose read() takes no image is read as is, its frames copied into the same buffers"""
+        buffers = CaptureBuffers()
+        cam = PlainCapture(bgr_frame(value) for value in range(5))
+
+        for value in range(5):
+            _, gray = buffers.capture(cam)
+            np.testing.assert_array_equal(gray, cv2.cvtColor(bgr_frame(value), cv2.COLOR_BGR2GRAY))
+            buffers.release(gray)
+
+        self.assertEqual(buffers.allocations, 2)
+
+    def test_next_qr_data_reuses_thread_buffers(self):
+        """Test reading QR codes one after another captures into the same buffers of the thread"""
+        image = cv2.cvtColor(render_qr("hello"), cv2.COLOR_GRAY2BGR)
+        cam = FakeVideoCapture([image] * 3)
+        results = []
+
+        def read_all():
+            results.extend(get_next_qr_data(cam) for _ in range(3))
+            results.append(get_capture_buffers().allocations)
+
+        # A thread of its own starts with empty buffers
+        thread = threading.Thread(target=read_all)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(results, ["hello", "hello", "hello", 2])
+
+class TestRegionCapture(unittest.TestCase):
+    """Test cases for reading a column of a shared camera into a buffer"""
+
+    def test_column_copied_into_image(self):
+        """Test the column is copied into a buffer of its size, and is a copy of its own without one"""
+        frame = bgr_frame(9, (4, 9))
+        frame[:, 3:6, 0] = 200
+        region = RegionCapture(FakeVideoCapture([frame] * 2), 1, 3, threading.Lock())
+        image = np.zeros((4, 3, 3), dtype=np.uint8)
+
+        ret, column = region.read(image=image)
+        _, other = region.read()
+
+        self.assertIs(column, image)
+        np.testing.assert_array_equal(image, frame[:, 3:6])
+        np.testing.assert_array_equal(other, frame[:, 3:6])
+        self.assertTrue(other.flags.owndata)
+
+    def test_camera_without_image_argument(self):
+        """Test a shared camera whose read() takes no image still gives its columns"""
+        frame = bgr_frame(9, (4, 9))
+        region = RegionCapture(PlainCapture([frame]), 2, 3, threading.Lock())
+
+        ret, column = region.read(image=np.zeros((4, 3, 3), dtype=np.uint8))
+
+        self.assertTrue(ret)
+        np.testing.assert_array_equal(column, frame[:, 6:9])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from display_utils import play_carousel, hold_display, DISPLAY_PUMP_INTERVAL
+
+class FakeClock:
+    """Monotonic clock that only advances when sleeping or when work is simulated"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@patch('display_utils.show_frame')
+class TestCarousel(unittest.TestCase):
+    """Test cases for the paced carousel player"""
+
+    def setUp(self):
+        """Set up a fake clock"""
+        self.clock = FakeClock()
+
+    def play(self, frames, fps=10, **kwargs):
+        """Play the frames with the fake clock"""
+        return play_carousel(frames, "window", fps, clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_play_carousel_shows_every_frame_on_schedule(self, mock_show_frame):
+        """Test frames are shown in order, one period apart"""
+        shown_at = []
+        mock_show_frame.side_effect = lambda window_name, frame: shown_at.append((frame, self.clock.now))
+
+        stats = self.play(["a", "b", "c"], fps=10)
+
+        self.assertEqual([frame for frame, _ in shown_at], ["a", "b", "c"])
+        for (_, t), expected in zip(shown_at, [100.0, 100.1, 100.2]):
+            self.assertAlmostEqual(t, expected)
+        self.assertEqual(stats['frames_shown'], 3)
+        self.assertEqual(stats['missed_deadlines'], 0)
+
+    def test_play_carousel_does_not_accumulate_drift(self, mock_show_frame):
+        """Test small delays in showing a frame are absorbed by the next sleep"""
+        shown_at = []
+        def slow_show(window_name, frame):
+            shown_at.append(self.clock.now)
+            self.clock.now += 0.03  # Showing takes a third of the period
+        mock_show_frame.side_effect = slow_show
+
+        stats = self.play(range(20), fps=10)
+
+        self.assertAlmostEqual(shown_at[-1], 100.0 + 19 * 0.1)
+        self.assertEqual(stats['missed_deadlines'], 0)
+
+    def test_play_carousel_reports_missed_deadlines(self, mock_show_frame):
+        """Test a frame that arrives a full period late is reported and the schedule restarts from it"""
+        shown_at = []
+        mock_show_frame.side_effect = lambda window_name, frame: shown_at.append(self.clock.now)
+
+        def frames():
+            yield "a"
+            self.clock.now += 0.25  # Producing the second frame overruns two slots
+            yield "b"
+            yield "c"
+
+        stats = self.play(frames(), fps=10)
+
+        self.assertEqual(stats['missed_deadlines'], 1)
+        self.assertAlmostEqual(stats['max_lateness'], 0.15)
+        # The third frame keeps a full period after the late one instead of bursting
+        self.assertAlmostEqual(shown_at[2] - shown_at[1], 0.1)
+
+    def test_play_carousel_should_stop(self, mock_show_frame):
+        """Test playback stops as soon as should_stop returns True"""
+        stats = self.play(range(100), should_stop=lambda: mock_show_frame.call_count >= 3)
+
+        self.assertEqual(stats['frames_shown'], 3)
+
+    def test_play_carousel_duration(self, mock_show_frame):
+        """Test the reported duration covers the whole playback"""
+        stats = self.play(range(5), fps=5)
+
+        self.assertAlmostEqual(stats['duration'], 0.8)
+
+@patch('display_utils.pump_display_events')
+class TestHoldDisplay(unittest.TestCase):
+    """Test cases for keeping the shown frames on screen"""
+
+    def test_hold_display_pumps_events_until_the_time_is_over(self, mock_pump):
+        """Test window events are pumped every interval instead of one long sleep"""
+        clock = FakeClock()
+
+        hold_display(0.5, clock=clock, sleep=clock.sleep)
+
+        self.assertAlmostEqual(clock.now, 100.5)
+        self.assertEqual(mock_pump.call_count, -(-0.5 // DISPLAY_PUMP_INTERVAL))
+
+if __name__ == '__main__':
+    unittest.main()
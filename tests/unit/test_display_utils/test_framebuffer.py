@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from display_utils import FramebufferBackend
+
+class TestFramebuffer(unittest.TestCase):
+    """Test cases for the off-screen framebuffer display backend"""
+
+    def setUp(self):
+        """Set up a framebuffer backend with a short capture timeout"""
+        self.backend = FramebufferBackend(queue_size=2)
+        self.capture = self.backend.open_capture("window", timeout=0.01)
+
+    def frame(self, value):
+        """Create a small frame filled with the given value"""
+        return np.full((4, 4), value, dtype=np.uint8)
+
+    def test_read_before_any_frame(self):
+        """Test reading an empty screen fails like a camera that grabbed nothing"""
+        ret, frame = self.capture.read()
+
+        self.assertFalse(ret)
+        self.assertIsNone(frame)
+
+    def test_read_latest_frame(self):
+        """Test the capture sees the latest frame shown in the window"""
+        self.backend.show("window", self.frame(1))
+        self.backend.show("window", self.frame(2))
+
+        ret, frame = self.capture.read()
+
+        self.assertTrue(ret)
+        self.assertEqual(frame[0, 0], 2)
+
+    def test_read_into_image(self):
+        """Test a frame is copied into a buffer of its size, so writing the buffer leaves the shown frame intact"""
+        shown = self.frame(3)
+        self.backend.show("window", shown)
+        image = np.zeros((4, 4), dtype=np.uint8)
+
+        ret, frame = self.capture.read(image=image)
+        frame[...] = 0
+
+        self.assertTrue(ret)
+        self.assertIs(frame, image)
+        self.assertEqual(shown[0, 0], 3)
+
+    def test_read_keeps_showing_current_frame(self):
+        """Test the same frame is seen again until the window shows a new one"""
+        self.backend.show("window", self.frame(7))
+
+        self.capture.read()
+        ret, frame = self.capture.read()
+
+        self.assertTrue(ret)
+        self.assertEqual(frame[0, 0], 7)
+
+    def test_full_queue_drops_oldest_frames(self):
+        """Test showing more frames than the queue holds never blocks the display side"""
+        for value in range(10):
+            self.backend.show("window", self.frame(value))
+
+        self.assertEqual(self.backend.get_queue("window").qsize(), 2)
+        self.assertEqual(self.capture.read()[1][0, 0], 9)
+
+    def test_windows_are_independent(self):
+        """Test a capture only sees the frames of its own window"""
+        self.backend.show("other", self.frame(3))
+
+        ret, _ = self.capture.read()
+
+        self.assertFalse(ret)
+
+    def test_close_clears_screen(self):
+        """Test the capture sees an empty screen after the window is closed"""
+        self.backend.show("window", self.frame(1))
+        self.capture.read()
+
+        self.backend.close("window")
+        ret, frame = self.capture.read()
+
+        self.assertFalse(ret)
+        self.assertIsNone(frame)
+
+    def test_close_all(self):
+        """Test closing all windows clears every capture"""
+        self.backend.show("window", self.frame(1))
+
+        self.backend.close_all()
+
+        self.assertFalse(self.capture.read()[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import threading
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+import numpy as np
+from display_utils import PrefetchingRenderer, render_qr
+
+class TestPrefetchingRenderer(unittest.TestCase):
+    """Test cases for the renderer preparing upcoming QR codes in the background"""
+
+    def setUp(self):
+        self.renderer = PrefetchingRenderer()
+        self.addCleanup(self.renderer.close)
+
+    def test_prefetched_image_matches_direct_render(self):
+        """Test a prefetched frame is the same image a direct render gives"""
+        self.renderer.prefetch(["next"])
+
+        self.assertTrue(np.array_equal(self.renderer.render("next"), render_qr("next")))
+
+    def test_prefetched_frame_rendered_off_the_caller_thread(self):
+        """Test the prefetch renders in the background thread and render only picks up the result"""
+        render_threads = []
+
+        def record_render(qr_data_string, *args):
+            render_threads.append(threading.current_thread().name)
+            return qr_data_string
+
+        with patch('display_utils.render_qr', side_effect=record_render):
+            self.renderer.prefetch(["next"])
+            self.assertEqual(self.renderer.render("next"), "next")
+            self.assertEqual(self.renderer.render("not prefetched"), "not prefetched")
+
+        self.assertTrue(render_threads[0].startswith("prefetch"))
+        self.assertEqual(render_threads[1], threading.current_thread().name)
+
+    def test_prefetch_drops_frames_no_longer_upcoming(self):
+        """Test upcoming frames are rendered once however often they are shown, dropped ones are rendered again"""
+        with patch('display_utils.render_qr', side_effect=lambda qr_data_string, *args: qr_data_string) as mock_render:
+            self.renderer.prefetch(["a", "b"])
+            self.renderer.prefetch(["b", "c"])
+            for qr_data_string in ["b", "c", "b"]:
+                self.renderer.render(qr_data_string)
+            self.assertEqual(mock_render.call_count, 3)
+
+            self.renderer.render("a")
+
+        self.assertEqual(mock_render.call_count, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import sys
+import os
+import numpy as np
+import qrcode
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from display_utils import make_qr_matrix, render_qr_matrix, render_qr, tile_images, QR_BOX_SIZE, QR_BORDER
+from camera_handler import get_qr_codes_from_frame
+from qr_encoder import SessionQREncoder
+
+class TestRender(unittest.TestCase):
+    """Test cases for QR rasterization functions"""
+
+    def test_render_qr_matrix_shape_and_dtype(self):
+        """Test rendered image is a scaled, quiet-zone padded single channel uint8 image"""
+        matrix = [[True, False], [False, True]]
+
+        image = render_qr_matrix(matrix, box_size=3, border=1)
+
+        self.assertEqual(image.dtype, np.uint8)
+        self.assertEqual(image.shape, ((2 + 2) * 3, (2 + 2) * 3))
+
+    def test_render_qr_matrix_module_colors(self):
+        """Test dark modules are black and light modules and quiet zone are white"""
+        matrix = [[True, False], [False, True]]
+
+        image = render_qr_matrix(matrix, box_size=2, border=1)
+
+        # Quiet zone
+        self.assertTrue((image[:2, :] == 255).all())
+        self.assertTrue((image[:, :2] == 255).all())
+        # Dark module at (0, 0) and light module at (0, 1)
+        self.assertTrue((image[2:4, 2:4] == 0).all())
+        self.assertTrue((image[2:4, 4:6] == 255).all())
+
+    def test_render_qr_matrix_without_border(self):
+        """Test rendering with no quiet zone"""
+        image = render_qr_matrix([[True]], box_size=4, border=0)
+
+        self.assertEqual(image.shape, (4, 4))
+        self.assertTrue((image == 0).all())
+
+    def test_make_qr_matrix_has_no_border(self):
+        """Test the module matrix has version size without the quiet zone"""
+        matrix = make_qr_matrix("hello")
+
+        self.assertEqual(len(matrix), 21)  # Version 1 symbol
+        self.assertEqual(len(matrix[0]), 21)
+
+    def test_render_qr_matches_qrcode_make(self):
+        """Test the vectorized path produces the same pixels as the PIL based qrcode.make path"""
+        qr_data_string = '{"id": 1, "data": "SGVsbG8gV29ybGQ="}'
+
+        expected = np.array(qrcode.make(qr_data_string).convert('L'))
+        image = render_qr(qr_data_string)
+
+        self.assertEqual(image.shape, expected.shape)
+        np.testing.assert_array_equal(image, expected)
+
+    def test_render_qr_default_geometry(self):
+        """Test rendering uses the default box size and quiet zone"""
+        image = render_qr("hello")
+
+        self.assertEqual(image.shape, ((21 + 2 * QR_BORDER) * QR_BOX_SIZE,) * 2)
+
+    def test_render_qr_with_encoder(self):
+        """Test the session encoder symbol is rendered when an encoder is given"""
+        encoder = SessionQREncoder(3)
+
+        image = render_qr("hello", encoder)
+
+        np.testing.assert_array_equal(image, render_qr_matrix(encoder.encode("hello")))
+
+    def test_render_qr_falls_back_to_decodable_mask(self):
+        """Test the next mask candidate is used when the preferred one does not decode back"""
+        encoder = SessionQREncoder(3)
+        candidates = list(encoder.encode_candidates("hello"))
+        decoded = iter(["", "hello"])  # The first candidate fails to decode
+
+        image = render_qr("hello", encoder, decode=lambda image: next(decoded))
+
+        np.testing.assert_array_equal(image, render_qr_matrix(candidates[1]))
+
+    def test_render_qr_no_decodable_mask(self):
+        """Test the lowest penalty symbol is shown when no mask decodes back"""
+        encoder = SessionQREncoder(3)
+
+        image = render_qr("hello", encoder, decode=lambda image: "")
+
+        np.testing.assert_array_equal(image, render_qr_matrix(encoder.encode("hello")))
+
+    def test_render_qr_group_in_grid(self):
+        """Test a string too long for one session symbol is tiled as a group the camera reads back whole"""
+        encoder = SessionQREncoder(4)
+        qr_data_string = '{"id": 1, "data": "' + "QUJD" * 50 + '"}'
+
+        image = render_qr(qr_data_string, encoder)
+
+        symbol_size = (encoder.size + 2 * QR_BORDER) * QR_BOX_SIZE
+        self.assertEqual(image.shape, (2 * symbol_size, 2 * symbol_size))  # 4 symbols in a 2 x 2 grid
+        self.assertEqual(get_qr_codes_from_frame(image), [qr_data_string])
+
+    def test_render_qr_group_checks_every_part(self):
+        """Test the decode function checks the part of every group symbol"""
+        encoder = SessionQREncoder(4)
+        qr_data_string = "x" * (encoder.capacity + 1)
+        decoded = []
+
+        render_qr(qr_data_string, encoder, decode=lambda image: decoded.append(image.shape) or qr_data_string)
+
+        self.assertEqual(len(decoded), 2 * 8)  # No part decodes back, every mask of both symbols is tried
+
+    def test_tile_images_leaves_empty_cells_white(self):
+        """Test three images fill a 2 x 2 grid row by row"""
+        images = [np.full((2, 3), value, dtype=np.uint8) for value in (0, 1, 2)]
+
+        grid = tile_images(images)
+
+        self.assertEqual(grid.shape, (4, 6))
+        np.testing.assert_array_equal(grid[2:, :3], images[2])
+        self.assertTrue((grid[2:, 3:] == 255).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+import numpy as np
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from display_utils import (
+    show_frame, close_qr_window, close_all_qr_windows, set_display_backend, OpenCVWindowBackend
+)
+
+@patch('display_utils.get_screen_size', return_value=(1920, 1080))
+@patch('display_utils.force_focus')
+@patch('display_utils.cv2')
+class TestWindow(unittest.TestCase):
+    """Test cases for the long-lived display window"""
+
+    def setUp(self):
+        """Start every test with a fresh OpenCV window backend"""
+        set_display_backend(OpenCVWindowBackend())
+
+    def tearDown(self):
+        """Restore the default display backend"""
+        set_display_backend(None)
+
+    def test_show_frame_creates_window_once(self, mock_cv2, mock_force_focus, mock_screen_size):
+        """Test the window is created, positioned and focused only for the first frame"""
+        frame = np.zeros((100, 100), dtype=np.uint8)
+
+        show_frame("window", frame)
+        show_frame("window", frame)
+        show_frame("window", frame)
+
+        mock_cv2.namedWindow.assert_called_once()
+        mock_cv2.moveWindow.assert_called_once()
+        mock_force_focus.assert_called_once_with("window")
+        self.assertEqual(mock_cv2.imshow.call_count, 3)
+        mock_cv2.destroyWindow.assert_not_called()
+
+    def test_show_frame_recenters_on_size_change(self, mock_cv2, mock_force_focus, mock_screen_size):
+        """Test a frame of a different size re-centers the existing window without recreating it"""
+        show_frame("window", np.zeros((100, 100), dtype=np.uint8))
+        show_frame("window", np.zeros((200, 200), dtype=np.uint8))
+
+        mock_cv2.namedWindow.assert_called_once()
+        self.assertEqual(mock_cv2.moveWindow.call_count, 2)
+        mock_cv2.resizeWindow.assert_called_with("window", 200, 200)
+        mock_force_focus.assert_called_once()
+
+    def test_close_qr_window(self, mock_cv2, mock_force_focus, mock_screen_size):
+        """Test closing a window lets the next frame create it again"""
+        frame = np.zeros((100, 100), dtype=np.uint8)
+        show_frame("window", frame)
+
+        close_qr_window("window")
+        show_frame("window", frame)
+
+        mock_cv2.destroyWindow.assert_called_once_with("window")
+        self.assertEqual(mock_cv2.namedWindow.call_count, 2)
+
+    def test_close_qr_window_not_open(self, mock_cv2, mock_force_focus, mock_screen_size):
+        """Test closing a window that was never shown does nothing"""
+        close_qr_window("missing")
+
+        mock_cv2.destroyWindow.assert_not_called()
+
+    def test_close_all_qr_windows(self, mock_cv2, mock_force_focus, mock_screen_size):
+        """Test closing all windows forgets every open window"""
+        show_frame("first", np.zeros((10, 10), dtype=np.uint8))
+        show_frame("second", np.zeros((10, 10), dtype=np.uint8))
+
+        close_all_qr_windows()
+        show_frame("first", np.zeros((10, 10), dtype=np.uint8))
+
+        mock_cv2.destroyAllWindows.assert_called_once()
+        self.assertEqual(mock_cv2.namedWindow.call_count, 3)
+
+    def test_show_frame_centers_window(self, mock_cv2, mock_force_focus, mock_screen_size):
+        """Test the window is centered on the screen"""
+        show_frame("window", np.zeros((80, 120), dtype=np.uint8))
+
+        mock_cv2.moveWindow.assert_called_once_with("window", (1920 - 120) // 2, (1080 - 80) // 2)
+
+if __name__ == '__main__':
+    unittest.main()
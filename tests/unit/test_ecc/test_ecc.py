@@ -0,0 +1,102 @@
+import unittest
+import sys
+import os
+import numpy as np
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from ecc import ErrorCorrectionAdapter, ADAPT_WINDOW
+from qr_encoder import AdaptiveQREncoder, SessionQREncoder
+from display_utils import PrefetchingRenderer, render_qr_matrix
+
+class TestErrorCorrectionAdapter(unittest.TestCase):
+    """Test cases for the error correction level following the receiver feedback"""
+
+    def test_starts_at_medium(self):
+        """Test the level starts at M like the fixed encoder"""
+        adapter = ErrorCorrectionAdapter()
+
+        self.assertEqual(adapter.snapshot(), {'level': "M", 'changes': 0})
+
+    def test_timeouts_raise_level(self):
+        """Test a quarter of the recent outcomes being timeouts moves to a more redundant level"""
+        adapter = ErrorCorrectionAdapter()
+        for _ in range(ADAPT_WINDOW // 4 - 1):
+            adapter.lost()
+        self.assertEqual(adapter.level, ERROR_CORRECT_M)
+
+        adapter.lost()
+
+        self.assertEqual(adapter.level, ERROR_CORRECT_Q)
+
+    def test_level_stops_at_high(self):
+        """Test timeouts on the most redundant level keep it"""
+        adapter = ErrorCorrectionAdapter(ERROR_CORRECT_H)
+        for _ in range(ADAPT_WINDOW):
+            adapter.lost()
+
+        self.assertEqual(adapter.snapshot(), {'level': "H", 'changes': 0})
+
+    def test_clean_fast_window_lowers_level(self):
+        """Test a full window of approvals on a fast link moves to a less redundant level"""
+        adapter = ErrorCorrectionAdapter()
+        for _ in range(ADAPT_WINDOW - 1):
+            adapter.delivered(0.3)
+        self.assertEqual(adapter.level, ERROR_CORRECT_M)
+
+        adapter.delivered(0.3)
+
+        self.assertEqual(adapter.level, ERROR_CORRECT_L)
+
+    def test_slow_or_lossy_window_keeps_level(self):
+        """Test approvals on a slow link, or mixed with a timeout, do not lower the level"""
+        slow, lossy = ErrorCorrectionAdapter(), ErrorCorrectionAdapter()
+        lossy.lost()
+        for _ in range(ADAPT_WINDOW):
+            slow.delivered(1.5)
+        for _ in range(ADAPT_WINDOW - 1):
+            lossy.delivered(0.3)
+
+        self.assertEqual((slow.level, lossy.level), (ERROR_CORRECT_M, ERROR_CORRECT_M))
+
+    def test_change_clears_outcomes(self):
+        """Test the new level is judged on its own outcomes only"""
+        adapter = ErrorCorrectionAdapter()
+        for _ in range(ADAPT_WINDOW // 4):
+            adapter.lost()
+        adapter.lost()
+
+        self.assertEqual(adapter.snapshot(), {'level': "Q", 'changes': 1})
+
+class TestAdaptiveQREncoder(unittest.TestCase):
+    """Test cases for the encoder following the adapter level"""
+
+    def test_encodes_at_current_level(self):
+        """Test symbols use the level of the adapter, each level on the smallest version fitting the session"""
+        adapter = ErrorCorrectionAdapter(ERROR_CORRECT_L)
+        encoder = AdaptiveQREncoder(100, adapter)
+        low = encoder.encode(b"x" * 100)
+
+        adapter.level = ERROR_CORRECT_H
+        high = encoder.encode(b"x" * 100)
+
+        np.testing.assert_array_equal(low, SessionQREncoder.fitting(100, ERROR_CORRECT_L).encode(b"x" * 100))
+        np.testing.assert_array_equal(high, SessionQREncoder.fitting(100, ERROR_CORRECT_H).encode(b"x" * 100))
+        self.assertGreater(len(high), len(low))
+
+    def test_prefetched_frame_rendered_again_after_level_change(self):
+        """Test a frame prefetched at the old level is not shown once the level changed"""
+        adapter = ErrorCorrectionAdapter()
+        encoder = AdaptiveQREncoder(20, adapter)
+        with PrefetchingRenderer(encoder) as renderer:
+            renderer.prefetch(["chunk"])
+            adapter.level = ERROR_CORRECT_Q
+
+            image = renderer.render("chunk")
+
+        np.testing.assert_array_equal(image, render_qr_matrix(SessionQREncoder.fitting(20, ERROR_CORRECT_Q).encode("chunk")))
+
+if __name__ == '__main__':
+    unittest.main()
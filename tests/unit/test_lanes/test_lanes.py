@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+import numpy as np
+from camera_handler import RegionCapture
+from lanes import open_lanes, check_lane_metadata
+
+class FakeCamera:
+    """Frame source returning a fixed image"""
+
+    def __init__(self, image):
+        self.image = image
+
+    def read(self):
+        return True, self.image
+
+class TestOpenLanes(unittest.TestCase):
+    """Test cases for creating the lanes of a multi-lane transfer"""
+
+    @patch('lanes.set_window_region')
+    @patch('lanes.get_web_cam')
+    def test_lanes_share_camera_columns(self, mock_get_cam, mock_set_region):
+        """Test lanes without cameras of their own read equal columns of one camera, in windows side by side"""
+        image = np.arange(2 * 9).reshape(2, 9)
+        mock_get_cam.return_value = FakeCamera(image)
+
+        lanes = open_lanes("Sender QR", 3)
+
+        mock_get_cam.assert_called_once_with()
+        self.assertEqual([lane.window_name for lane in lanes], ["Sender QR lane 1", "Sender QR lane 2", "Sender QR lane 3"])
+        self.assertTrue(all(isinstance(lane.cam, RegionCapture) for lane in lanes))
+        ret, frame = lanes[1].cam.read()
+        self.assertTrue(ret)
+        np.testing.assert_array_equal(frame, image[:, 3:6])
+        mock_set_region.assert_any_call("Sender QR lane 3", 2, 3)
+
+    @patch('lanes.set_window_region')
+    @patch('lanes.get_web_cam')
+    def test_lanes_with_own_cameras(self, mock_get_cam, mock_set_region):
+        """Test every lane opens its camera when camera indices are given, one per lane"""
+        lanes = open_lanes("Receiver QR", 2, [1, 3])
+
+        self.assertEqual([call.args for call in mock_get_cam.call_args_list], [(1,), (3,)])
+        self.assertEqual(len(lanes), 2)
+        with self.assertRaises(ValueError):
+            open_lanes("Receiver QR", 2, [1])
+
+class TestCheckLaneMetadata(unittest.TestCase):
+    """Test cases for merging the metadata the lanes received"""
+
+    def test_lanes_of_one_file(self):
+        """Test the merged metadata counts the data chunks of every lane"""
+        lanes_metadata = [
+            {'file_name': "a.txt", 'total_chunks': 3, 'lane': 0, 'lanes': 2},
+            {'file_name': "a.txt", 'total_chunks': 2, 'lane': 1, 'lanes': 2},
+        ]
+
+        self.assertEqual(check_lane_metadata(lanes_metadata), {'file_name': "a.txt", 'total_chunks': 5})
+
+    def test_lanes_of_different_files(self):
+        """Test lanes carrying different files or missing a lane are rejected"""
+        with self.assertRaises(ValueError):
+            check_lane_metadata([{'file_name': "a.txt", 'total_chunks': 1, 'lane': 0},
+                                 {'file_name': "b.txt", 'total_chunks': 1, 'lane': 1}])
+        with self.assertRaises(ValueError):
+            check_lane_metadata([{'file_name': "a.txt", 'total_chunks': 1, 'lane': 0},
+                                 {'file_name': "a.txt", 'total_chunks': 1, 'lane': 0}])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
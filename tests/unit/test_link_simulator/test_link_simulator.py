@@ -0,0 +1,166 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from camera_handler import get_qr_from_frame
+from display_utils import render_qr
+from link_simulator import LinkConditions, LinkSimulator, SimulatedCamera, LINK_PRESETS, CAMERA_WIDTH, CAMERA_HEIGHT
+
+class TestLinkSimulator(unittest.TestCase):
+    """Test cases for the seeded screen to camera link simulator"""
+
+    def setUp(self):
+        """Render two different symbols to push through the link"""
+        self.first_data = "first symbol " * 4
+        self.second_data = "second symbol " * 4
+        self.first = render_qr(self.first_data)
+        self.second = render_qr(self.second_data)
+
+    def test_clean_link_frame_decodes(self):
+        """Test a clean link delivers a BGR camera frame the decoder reads"""
+        frame = LinkSimulator().transmit(self.first)
+
+        self.assertEqual(frame.shape, (CAMERA_HEIGHT, CAMERA_WIDTH, 3))
+        self.assertEqual(frame.dtype, np.uint8)
+        self.assertEqual(get_qr_from_frame(frame), self.first_data)
+
+    def test_same_seed_same_frames(self):
+        """Test the same conditions and seed reproduce the same frames"""
+        first_run = LinkSimulator(LINK_PRESETS['noisy'], seed=7)
+        second_run = LinkSimulator(LINK_PRESETS['noisy'], seed=7)
+
+        for image in (self.first, self.second, self.first):
+            first_frame, second_frame = first_run.transmit(image), second_run.transmit(image)
+            if first_frame is None:
+                self.assertIsNone(second_frame)
+            else:
+                np.testing.assert_array_equal(first_frame, second_frame)
+
+    def test_different_seed_different_frames(self):
+        """Test another seed draws other impairments"""
+        conditions = LinkConditions(noise=5.0)
+
+        first_frame = LinkSimulator(conditions, seed=1).transmit(self.first)
+        second_frame = LinkSimulator(conditions, seed=2).transmit(self.first)
+
+        self.assertFalse(np.array_equal(first_frame, second_frame))
+
+    def test_reset_replays_frames(self):
+        """Test reset starts the same frame sequence again"""
+        simulator = LinkSimulator(LinkConditions(noise=5.0, perspective=0.05), seed=3)
+        before = simulator.transmit(self.first)
+
+        simulator.reset()
+
+        np.testing.assert_array_equal(simulator.transmit(self.first), before)
+
+    def test_drops_independent_of_other_impairments(self):
+        """Test enabling another impairment keeps the same frames dropped"""
+        def dropped_frames(conditions):
+            simulator = LinkSimulator(conditions, seed=5)
+            return [simulator.transmit(self.first) is None for _ in range(20)]
+
+        drops_only = dropped_frames(LinkConditions(drop_rate=0.3))
+        drops_and_noise = dropped_frames(LinkConditions(drop_rate=0.3, noise=5.0, motion_blur=3))
+
+        self.assertEqual(drops_only, drops_and_noise)
+        self.assertIn(True, drops_only)
+        self.assertIn(False, drops_only)
+
+    def test_drop_every_frame(self):
+        """Test a drop rate of 1 never delivers a frame"""
+        simulator = LinkSimulator(LinkConditions(drop_rate=1.0))
+
+        frames = [simulator.transmit(self.first) for _ in range(5)]
+
+        self.assertEqual(frames, [None] * 5)
+        self.assertEqual(simulator.frames_dropped, 5)
+
+    def test_latency_delays_symbols(self):
+        """Test the camera sees each symbol the configured number of frames after it is shown"""
+        simulator = LinkSimulator(LinkConditions(latency_frames=2))
+
+        self.assertIsNone(simulator.transmit(self.first))
+        self.assertIsNone(simulator.transmit(self.second))
+        self.assertEqual(get_qr_from_frame(simulator.transmit(self.second)), self.first_data)
+        self.assertEqual(get_qr_from_frame(simulator.transmit(self.second)), self.second_data)
+
+    def test_torn_frame_mixes_symbols(self):
+        """Test a torn frame shows the new symbol on top and the previous one below"""
+        first_screen = np.zeros((100, 100), dtype=np.uint8)
+        second_screen = np.full((100, 100), 255, dtype=np.uint8)
+        simulator = LinkSimulator(LinkConditions(tear_rate=1.0, frame_size=(100, 100), coverage=1.0))
+
+        simulator.transmit(first_screen)
+        frame = simulator.transmit(second_screen)
+
+        self.assertEqual(simulator.frames_torn, 1)
+        self.assertEqual(frame[0, 50, 0], 255)
+        self.assertEqual(frame[-1, 50, 0], 0)
+
+    def test_exposure_darkens_frame(self):
+        """Test an underexposed link scales the brightness down"""
+        clean = LinkSimulator().transmit(self.first)
+        dim = LinkSimulator(LinkConditions(exposure=0.5)).transmit(self.first)
+
+        self.assertAlmostEqual(dim.mean(), clean.mean() * 0.5, delta=1.0)
+
+    def test_optical_impairments_change_frame(self):
+        """Test every optical impairment alters the captured frame"""
+        clean = LinkSimulator().transmit(self.first)
+        impairments = {'perspective': 0.05, 'defocus': 2.0, 'motion_blur': 7, 'noise': 5.0, 'moire': 0.1}
+
+        for name, value in impairments.items():
+            with self.subTest(impairment=name):
+                frame = LinkSimulator(LinkConditions(**{name: value})).transmit(self.first)
+                self.assertFalse(np.array_equal(frame, clean))
+
+    def test_invalid_conditions(self):
+        """Test out of range rates and negative latency are rejected"""
+        with self.assertRaises(ValueError):
+            LinkConditions(drop_rate=1.5)
+        with self.assertRaises(ValueError):
+            LinkConditions(latency_frames=-1)
+
+class FakeSource:
+    """Frame source returning the given read results in order"""
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+        self.released = False
+
+    def read(self):
+        return self.reads.pop(0)
+
+    def release(self):
+        self.released = True
+
+class TestSimulatedCamera(unittest.TestCase):
+    """Test cases for the simulated camera frame source"""
+
+    def test_read_through_link(self):
+        """Test frames of the source reach the reader through the simulator"""
+        image = render_qr("camera")
+        camera = SimulatedCamera(FakeSource([(True, image), (False, None)]), LinkSimulator())
+
+        ret, frame = camera.read()
+        self.assertTrue(ret)
+        self.assertEqual(get_qr_from_frame(frame), "camera")
+
+        ret, frame = camera.read()
+        self.assertFalse(ret)
+        self.assertIsNone(frame)
+
+    def test_release_releases_source(self):
+        """Test releasing the camera releases the wrapped source"""
+        source = FakeSource([])
+        SimulatedCamera(source, LinkSimulator()).release()
+
+        self.assertTrue(source.released)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,6 +1,8 @@
 import unittest
 import sys
 import os
+import json
+import tempfile
 from unittest.mock import patch
 
 # Add the parent directory to the path so we can import our modules  
@@ -11,22 +13,22 @@ from main import main
 class TestMain(unittest.TestCase):
     """Test cases for main.py entry point"""
 
-    @patch('main.sender_main')
+    @patch('sender.sender_main')
     @patch('sys.argv', ['main.py', 'sender'])
     def test_main_sender_mode(self, mock_sender_main):
         """Test main function calls sender_main for sender mode"""
         main()
         mock_sender_main.assert_called_once()
 
-    @patch('main.receiver_main')
+    @patch('receiver.receiver_main')
     @patch('sys.argv', ['main.py', 'receiver'])
     def test_main_receiver_mode(self, mock_receiver_main):
         """Test main function calls receiver_main for receiver mode"""
         main()
         mock_receiver_main.assert_called_once()
 
-    @patch('main.sender_main')
-    @patch('main.receiver_main')
+    @patch('sender.sender_main')
+    @patch('receiver.receiver_main')
     @patch('sys.argv', ['main.py', 'invalid'])
     def test_main_invalid_mode(self, mock_receiver_main, mock_sender_main):
         """Test main function with invalid mode"""
@@ -36,8 +38,8 @@ class TestMain(unittest.TestCase):
         mock_sender_main.assert_not_called()
         mock_receiver_main.assert_not_called()
 
-    @patch('main.sender_main')
-    @patch('main.receiver_main')
+    @patch('sender.sender_main')
+    @patch('receiver.receiver_main')
     @patch('sys.argv', ['main.py'])  # Missing mode argument
     def test_main_missing_argument(self, mock_receiver_main, mock_sender_main):
         """Test main function with missing mode argument"""
@@ -48,7 +50,7 @@ class TestMain(unittest.TestCase):
         mock_sender_main.assert_not_called()
         mock_receiver_main.assert_not_called()
 
-    @patch('main.sender_main')
+    @patch('sender.sender_main')
     @patch('sys.argv', ['main.py', 'sender', 'extra', 'args'])
     def test_main_extra_arguments(self, mock_sender_main):
         """Test main function ignores extra arguments"""
@@ -56,5 +58,154 @@ class TestMain(unittest.TestCase):
         
         mock_sender_main.assert_called_once()
 
+    @patch('sys.argv', ['main.py', 'invalid'])
+    def test_main_invalid_mode_skips_heavy_imports(self):
+        """Test an invalid mode does not import the sender or receiver modules"""
+        with patch.dict(sys.modules):
+            for module_name in ['sender', 'receiver']:
+                sys.modules.pop(module_name, None)
+
+            main()
+
+            self.assertNotIn('sender', sys.modules)
+            self.assertNotIn('receiver', sys.modules)
+
+    @patch('sender.sender_main')
+    def test_main_metrics_option_writes_metrics(self, mock_sender_main):
+        """Test --metrics enables the stage timers and writes them when the mode ends"""
+        import metrics
+        self.addCleanup(metrics.reset_metrics)
+        self.addCleanup(metrics.disable_metrics)
+        mock_sender_main.side_effect = lambda **kwargs: metrics.observe('capture', 0.01)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            metrics_path = os.path.join(temp_dir, "metrics.json")
+            with patch('sys.argv', ['main.py', 'sender', '--metrics', metrics_path]):
+                main()
+
+            with open(metrics_path) as f:
+                self.assertEqual(json.load(f)['stages']['capture']['count'], 1)
+
+    @patch('sender.sender_main')
+    def test_main_profile_option_writes_profile(self, mock_sender_main):
+        """Test --profile runs the mode under the profiler and labels the output with the transfer summary"""
+        mock_sender_main.return_value = {'file_name': 'a.txt', 'file_size': 10, 'total_chunks': 1}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            prefix = os.path.join(temp_dir, "run")
+            with patch('sys.argv', ['main.py', 'sender', '--profile', 'sample', '--profile-output', prefix]):
+                main()
+
+            mock_sender_main.assert_called_once()
+            self.assertFalse(os.path.exists(f"{prefix}.pstats"))
+            with open(f"{prefix}.meta.json") as f:
+                metadata = json.load(f)
+            self.assertEqual(metadata['mode'], 'sender')
+            self.assertEqual(metadata['file_size'], 10)
+            self.assertEqual(metadata['profiler'], 'sample')
+
+    @patch('sender.sender_main')
+    def test_main_calibrate_option(self, mock_sender_main):
+        """Test --calibrate asks the sender for the calibration handshake"""
+        with patch('sys.argv', ['main.py', 'sender']):
+            main()
+        with patch('sys.argv', ['main.py', 'sender', '--calibrate']):
+            main()
+
+        self.assertFalse(mock_sender_main.call_args_list[0].kwargs['calibrate'])
+        self.assertTrue(mock_sender_main.call_args_list[1].kwargs['calibrate'])
+
+    @patch('sender.sender_main')
+    @patch('sys.argv', ['main.py', 'sender', 'a.txt', 'b.txt', '--calibrate'])
+    def test_main_sender_files(self, mock_sender_main):
+        """Test the files given to the sender are queued for one session"""
+        main()
+
+        mock_sender_main.assert_called_once_with(file_paths=['a.txt', 'b.txt'], calibrate=True, lanes=1, cameras=None, broadcast=0, symbols=1, adaptive_ecc=False)
+
+    @patch('receiver.receiver_main')
+    @patch('sys.argv', ['main.py', 'receiver', '--output-dir', 'inbox', '--count', '3', '--no-open'])
+    def test_main_receiver_options(self, mock_receiver_main):
+        """Test the receiver options select the output directory, the queue length and skip opening the files"""
+        main()
+
+        mock_receiver_main.assert_called_once_with(output_dir='inbox', count=3, open_files=False, lanes=1, cameras=None, broadcast=False, groups=False)
+
+    @patch('receiver.receiver_main')
+    @patch('sys.argv', ['main.py', 'receiver'])
+    def test_main_receiver_defaults_to_dialogs(self, mock_receiver_main):
+        """Test the receiver keeps the directory dialog and opens the file when no option is given"""
+        main()
+
+        mock_receiver_main.assert_called_once_with(output_dir=None, count=1, open_files=True, lanes=1, cameras=None, broadcast=False, groups=False)
+
+    @patch('sender.sender_main')
+    @patch('sys.argv', ['main.py', 'sender', 'a.txt', '--lanes', '2', '--cameras', '0', '1'])
+    def test_main_sender_lanes(self, mock_sender_main):
+        """Test the lanes option stripes the files over that many lanes with their cameras"""
+        main()
+
+        mock_sender_main.assert_called_once_with(file_paths=['a.txt'], calibrate=False, lanes=2, cameras=[0, 1], broadcast=0, symbols=1, adaptive_ecc=False)
+
+    @patch('receiver.receiver_main')
+    def test_main_lane_cameras_must_match(self, mock_receiver_main):
+        """Test a camera count that does not match the lanes is rejected before receiving"""
+        with patch('sys.argv', ['main.py', 'receiver', '--lanes', '3', '--cameras', '0', '1']):
+            with self.assertRaises(SystemExit):
+                main()
+
+        mock_receiver_main.assert_not_called()
+
+    @patch('sender.sender_main')
+    @patch('sys.argv', ['main.py', 'sender', 'a.txt', '--broadcast', '3'])
+    def test_main_sender_broadcast(self, mock_sender_main):
+        """Test the broadcast option shows the files until that many receivers have them"""
+        main()
+
+        mock_sender_main.assert_called_once_with(file_paths=['a.txt'], calibrate=False, lanes=1, cameras=None, broadcast=3, symbols=1, adaptive_ecc=False)
+
+    @patch('receiver.receiver_main')
+    def test_main_broadcast_needs_single_lane(self, mock_receiver_main):
+        """Test broadcast with several lanes is rejected before receiving"""
+        with patch('sys.argv', ['main.py', 'receiver', '--broadcast', '--lanes', '2']):
+            with self.assertRaises(SystemExit):
+                main()
+
+        mock_receiver_main.assert_not_called()
+
+    @patch('receiver.receiver_main')
+    @patch('sys.argv', ['main.py', 'receiver', '--groups'])
+    def test_main_receiver_groups(self, mock_receiver_main):
+        """Test the groups option reads chunks shown as symbol groups"""
+        main()
+
+        self.assertTrue(mock_receiver_main.call_args.kwargs['groups'])
+
+    @patch('sender.sender_main')
+    def test_main_symbols_limited_to_a_group(self, mock_sender_main):
+        """Test a group larger than the 16 symbols the QR standard links is rejected before sending"""
+        with patch('sys.argv', ['main.py', 'sender', 'a.txt', '--symbols', '17']):
+            with self.assertRaises(SystemExit):
+                main()
+
+        mock_sender_main.assert_not_called()
+
+    @patch('sender.sender_main')
+    def test_main_adaptive_ecc_not_with_calibration(self, mock_sender_main):
+        """Test the adaptive error correction is rejected with a calibrated link, which locks the level"""
+        with patch('sys.argv', ['main.py', 'sender', 'a.txt', '--adaptive-ecc', '--calibrate']):
+            with self.assertRaises(SystemExit):
+                main()
+
+        mock_sender_main.assert_not_called()
+
+    @patch('duplex.duplex_main')
+    @patch('sys.argv', ['main.py', 'duplex', 'a.txt', '-o', 'inbox', '--no-open'])
+    def test_main_duplex_mode(self, mock_duplex_main):
+        """Test the duplex mode sends the given file and saves the peer's file in the output directory"""
+        main()
+
+        mock_duplex_main.assert_called_once_with(file_path='a.txt', output_dir='inbox', open_files=False)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+import metrics
+from metrics import (
+    Histogram, MetricsExporter, timer, observe, enable_metrics, disable_metrics, reset_metrics,
+    metrics_snapshot, metrics_to_prometheus, write_metrics, PROMETHEUS_METRIC
+)
+
+class TestHistogram(unittest.TestCase):
+    """Test cases for the fixed-bucket histogram"""
+
+    def test_empty_histogram(self):
+        """Test an empty histogram has no percentiles"""
+        histogram = Histogram()
+
+        self.assertIsNone(histogram.percentile(0.5))
+        self.assertEqual(histogram.snapshot()['count'], 0)
+
+    def test_percentiles_within_bucket_bounds(self):
+        """Test percentile estimates fall in the bucket holding the true value"""
+        histogram = Histogram(bounds=(1.0, 2.0, 3.0))
+        for value in [0.5] * 50 + [1.5] * 45 + [2.5] * 5:
+            histogram.observe(value)
+
+        self.assertLessEqual(histogram.percentile(0.5), 1.0)
+        self.assertTrue(1.0 <= histogram.percentile(0.95) <= 2.0)
+        self.assertTrue(2.0 <= histogram.percentile(0.99) <= 2.5)
+
+    def test_percentiles_clamped_to_observed_range(self):
+        """Test estimates never fall outside the smallest and largest observed values"""
+        histogram = Histogram(bounds=(1.0, 10.0))
+        histogram.observe(4.0)
+        histogram.observe(5.0)
+
+        self.assertEqual(histogram.percentile(0.0), 4.0)
+        self.assertEqual(histogram.percentile(1.0), 5.0)
+
+    def test_values_above_highest_bound(self):
+        """Test values above the last bound land in the overflow bucket"""
+        histogram = Histogram(bounds=(1.0,))
+        histogram.observe(7.0)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['buckets'], {'1.0': 0, '+Inf': 1})
+        self.assertEqual(snapshot['p99'], 7.0)
+
+class TestStageTimers(unittest.TestCase):
+    """Test cases for the module level stage timers and exports"""
+
+    def setUp(self):
+        reset_metrics()
+        enable_metrics()
+
+    def tearDown(self):
+        disable_metrics()
+        reset_metrics()
+
+    def test_timer_records_stage(self):
+        """Test a timed block adds one observation to its stage"""
+        with timer('capture'):
+            pass
+        with timer('capture'):
+            pass
+
+        snapshot = metrics_snapshot()
+        self.assertEqual(snapshot['capture']['count'], 2)
+        self.assertGreaterEqual(snapshot['capture']['sum'], 0.0)
+
+    def test_timer_records_on_exception(self):
+        """Test a block that raises is still timed and the exception propagates"""
+        with self.assertRaises(ValueError):
+            with timer('parse'):
+                raise ValueError("bad payload")
+
+        self.assertEqual(metrics_snapshot()['parse']['count'], 1)
+
+    def test_disabled_timer_records_nothing(self):
+        """Test timers are a shared no-op while metrics are off"""
+        disable_metrics()
+
+        with timer('capture'):
+            pass
+        observe('detect', 0.1)
+
+        self.assertIs(timer('capture'), timer('detect'))
+        self.assertEqual(metrics_snapshot(), {})
+
+    def test_prometheus_export(self):
+        """Test the Prometheus text has buckets, sum, count and quantiles per stage"""
+        observe('detect', 0.003)
+        observe('detect', 0.02)
+
+        text = metrics_to_prometheus()
+
+        self.assertIn(f"# TYPE {PROMETHEUS_METRIC} histogram", text)
+        self.assertIn(f'{PROMETHEUS_METRIC}_bucket{{stage="detect",le="+Inf"}} 2', text)
+        self.assertIn(f'{PROMETHEUS_METRIC}_count{{stage="detect"}} 2', text)
+        self.assertIn(f'{PROMETHEUS_METRIC}_quantile{{stage="detect",quantile="0.95"}}', text)
+
+    def test_write_metrics_format_from_extension(self):
+        """Test .prom files get Prometheus text and other files get JSON"""
+        observe('render', 0.01)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_path = os.path.join(temp_dir, "metrics.json")
+            prometheus_path = os.path.join(temp_dir, "metrics.prom")
+
+            write_metrics(json_path)
+            write_metrics(prometheus_path)
+
+            with open(json_path) as f:
+                self.assertEqual(json.load(f)['stages']['render']['count'], 1)
+            with open(prometheus_path) as f:
+                self.assertTrue(f.read().startswith("# HELP"))
+            self.assertEqual(sorted(os.listdir(temp_dir)), ["metrics.json", "metrics.prom"])
+
+    def test_exporter_writes_final_metrics_on_stop(self):
+        """Test the exporter writes the metrics recorded until it stops"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "metrics.json")
+            with MetricsExporter(path, interval=60):
+                observe('ack_wait', 0.5)
+
+            with open(path) as f:
+                self.assertEqual(json.load(f)['stages']['ack_wait']['count'], 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
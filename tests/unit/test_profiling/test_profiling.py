@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import json
+import pstats
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from profiling import SessionProfiler, SamplingProfiler, session_label
+
+def busy_work(seconds):
+    """Keep the CPU busy for the given time so the sampler has stacks to catch"""
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+class TestSessionProfiler(unittest.TestCase):
+    """Test cases for the session profiler"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.prefix = os.path.join(self.temp_dir.name, "sender_profile")
+        self.metadata = {'mode': 'sender', 'file_name': 'a.txt', 'file_size': 1234, 'total_chunks': 13}
+
+    def test_cprofile_writes_pstats_collapsed_and_metadata(self):
+        """Test the cprofile profiler writes all three files labelled with the session"""
+        profiler = SessionProfiler('cprofile', interval=0.001)
+
+        result = profiler.run(busy_work, 0.05)
+        paths = profiler.write(self.prefix, self.metadata)
+
+        self.assertGreater(result, 0)
+        self.assertEqual(paths, [f"{self.prefix}.pstats", f"{self.prefix}.collapsed", f"{self.prefix}.meta.json"])
+        stats = pstats.Stats(paths[0])
+        self.assertTrue(any(function[2] == 'busy_work' for function in stats.stats))
+
+        with open(paths[1]) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.startswith("sender a.txt 1234B 13chunks") for line in lines))
+        self.assertTrue(any("busy_work" in line for line in lines))
+
+        with open(paths[2]) as f:
+            metadata = json.load(f)
+        self.assertEqual(metadata['file_size'], 1234)
+        self.assertEqual(metadata['profiler'], 'cprofile')
+        self.assertGreater(metadata['duration'], 0)
+
+    def test_sample_profiler_skips_pstats(self):
+        """Test the sampling profiler only writes collapsed stacks and metadata"""
+        profiler = SessionProfiler('sample', interval=0.001)
+
+        profiler.run(busy_work, 0.05)
+        paths = profiler.write(self.prefix, self.metadata)
+
+        self.assertEqual(paths, [f"{self.prefix}.collapsed", f"{self.prefix}.meta.json"])
+        self.assertFalse(os.path.exists(f"{self.prefix}.pstats"))
+
+    def test_profiler_stops_when_function_raises(self):
+        """Test the profiler is stopped and the duration recorded when the run fails"""
+        profiler = SessionProfiler('sample')
+
+        with self.assertRaises(RuntimeError):
+            profiler.run(lambda: (_ for _ in ()).throw(RuntimeError("camera lost")))
+
+        self.assertFalse(profiler.sampler._thread.is_alive())
+        self.assertIsNotNone(profiler.duration)
+
+    def test_unknown_profiler(self):
+        """Test an unknown profiler name is rejected"""
+        with self.assertRaises(ValueError):
+            SessionProfiler('perf')
+
+class TestSamplingProfiler(unittest.TestCase):
+    """Test cases for the sampling profiler"""
+
+    def test_collapsed_lines_format(self):
+        """Test samples are written as root;thread;frames count lines"""
+        sampler = SamplingProfiler()
+        sampler.samples[("MainThread", ("main (main.py:3)", "send_file (sender.py:20)"))] = 4
+
+        self.assertEqual(sampler.collapsed_lines("sender; run"),
+                         ["sender, run;thread MainThread;main (main.py:3);send_file (sender.py:20) 4"])
+
+    def test_session_label(self):
+        """Test the label lists the known metadata only"""
+        self.assertEqual(session_label({'mode': 'receiver', 'duration': 2.04}), "receiver 2.0s")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,110 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from progress import ProgressReporter, format_progress, format_size
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestProgressReporter(unittest.TestCase):
+    """Test cases for the rate-limited progress reporter"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.lines = []
+        self.snapshots = []
+        self.reporter = ProgressReporter(10, callback=self.snapshots.append, interval=1.0, smoothing=0.5,
+                                         clock=self.clock, output=self.lines.append)
+
+    def test_reports_rate_limited(self):
+        """Test chunks within one interval produce a single report"""
+        for _ in range(5):
+            self.reporter.chunk_done(100)
+            self.clock.now += 0.1
+
+        self.assertEqual(len(self.lines), 1)
+        self.assertEqual(len(self.snapshots), 1)
+
+        self.clock.now = 1.0
+        self.reporter.chunk_done(100)
+        self.assertEqual(len(self.lines), 2)
+
+    def test_smoothed_rate_and_eta(self):
+        """Test the rate is smoothed between samples and the ETA follows it"""
+        self.reporter.chunk_done(100) # First report at t=0 has no elapsed time to measure a rate
+        self.clock.now = 1.0
+        self.reporter.chunk_done(100) # 2 chunks in the first second
+        self.assertEqual(self.snapshots[-1]['bytes_per_sec'], 200)
+
+        self.clock.now = 2.0
+        self.reporter.chunk_done(400) # 1 chunk of 400 bytes in the next second
+
+        snapshot = self.snapshots[-1]
+        self.assertEqual(snapshot['bytes_per_sec'], 300)
+        self.assertEqual(snapshot['chunks_per_sec'], 1.5)
+        self.assertAlmostEqual(snapshot['eta'], 7 / 1.5)
+        self.assertEqual(snapshot['bytes'], 600)
+        self.assertEqual(snapshot['percent'], 30.0)
+
+    def test_duplicate_and_retransmit_counts(self):
+        """Test duplicates and retransmits are counted without counting as progress"""
+        self.reporter.duplicate()
+        self.reporter.duplicate()
+        self.reporter.retransmit()
+
+        self.reporter.finish()
+        snapshot = self.snapshots[-1]
+        self.assertEqual(snapshot['duplicates'], 2)
+        self.assertEqual(snapshot['retransmits'], 1)
+        self.assertEqual(snapshot['chunks'], 0)
+        self.assertIn("2 duplicates, 1 retransmits", self.lines[-1])
+
+    def test_finish_always_reports(self):
+        """Test finishing reports even right after another report"""
+        for _ in range(10):
+            self.reporter.chunk_done(10)
+        self.clock.now = 0.5
+
+        self.reporter.finish()
+
+        self.assertEqual(len(self.lines), 2)
+        self.assertEqual(self.snapshots[-1]['eta'], 0.0)
+        self.assertIn("done in 0.5s", self.lines[-1])
+
+    def test_no_output(self):
+        """Test the console output can be turned off for embedding"""
+        reporter = ProgressReporter(1, callback=self.snapshots.append, clock=self.clock, output=None)
+
+        reporter.chunk_done(1)
+
+        self.assertEqual(len(self.snapshots), 1)
+
+class TestProgressFormatting(unittest.TestCase):
+    """Test cases for progress line formatting"""
+
+    def test_format_size(self):
+        """Test byte counts use the largest fitting unit"""
+        self.assertEqual(format_size(512), "512 B")
+        self.assertEqual(format_size(1536), "1.5 KB")
+        self.assertEqual(format_size(3 * 1024 ** 3), "3.0 GB")
+
+    def test_format_progress_without_rate(self):
+        """Test a line before any rate is known"""
+        snapshot = {'percent': 0.0, 'chunks': 0, 'total_chunks': 4, 'bytes': 0, 'bytes_per_sec': None,
+                    'eta': None, 'elapsed': 0.0, 'duplicates': 0, 'retransmits': 0}
+
+        self.assertEqual(format_progress(snapshot),
+                         "Progress: 0.0% (0/4 chunks, 0 B) - -- B/s, ETA --, 0 duplicates, 0 retransmits")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
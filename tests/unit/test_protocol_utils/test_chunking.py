@@ -5,7 +5,10 @@ import os
 # Add the parent directory to the path so we can import our modules  
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
-from protocol_utils import divide_into_chunks, create_chunks_to_send, FIRST_CHUNK_ID, STARTING_CHUNK_DATA
+from protocol_utils import (
+    divide_into_chunks, create_chunks_to_send, create_lane_chunks, split_into_symbol_group, FIRST_CHUNK_ID,
+    STARTING_CHUNK_DATA, MAX_GROUP_SYMBOLS
+)
 
 class TestChunking(unittest.TestCase):
     """Test cases for chunking functions"""
@@ -102,5 +105,41 @@ class TestChunking(unittest.TestCase):
         self.assertEqual(starting_chunk["file_name"], "empty.txt")
         self.assertEqual(starting_chunk["total_chunks"], 0)  # No data chunks
 
+    def test_create_lane_chunks_striped(self):
+        """Test file chunks are striped over the lanes and renumbered per lane"""
+        lane_chunks = create_lane_chunks("test.txt", b"aabbccdde", 2, chunk_size=2)
+        
+        self.assertEqual(len(lane_chunks), 2)
+        self.assertEqual([chunk["data"] for chunk in lane_chunks[0][1:]], [b"aa", b"cc", b"e"])
+        self.assertEqual([chunk["data"] for chunk in lane_chunks[1][1:]], [b"bb", b"dd"])
+        self.assertEqual([chunk["id"] for chunk in lane_chunks[1]], [FIRST_CHUNK_ID, 1, 2])
+        self.assertEqual([chunk["lane"] for chunk in lane_chunks[1]], [1, 1, 1])
+        
+        starting_chunk = lane_chunks[1][0]
+        self.assertEqual(starting_chunk["data"], STARTING_CHUNK_DATA)
+        self.assertEqual((starting_chunk["lane"], starting_chunk["lanes"], starting_chunk["total_chunks"]), (1, 2, 2))
+
+    def test_create_lane_chunks_more_lanes_than_chunks(self):
+        """Test lanes without a file chunk still send a starting chunk"""
+        lane_chunks = create_lane_chunks("tiny.txt", b"x", 3)
+        
+        self.assertEqual([len(chunks) for chunks in lane_chunks], [2, 1, 1])
+        self.assertEqual(lane_chunks[2][0]["total_chunks"], 0)
+
+    def test_split_into_symbol_group(self):
+        """Test a string is split into even parts with their position, group size and parity"""
+        group = split_into_symbol_group("abcdefg", 3)
+
+        self.assertEqual([part for part, _ in group], [b"abc", b"def", b"g"])
+        parity = 0
+        for byte in b"abcdefg":
+            parity ^= byte
+        self.assertEqual([header for _, header in group], [(0, 3, parity), (1, 3, parity), (2, 3, parity)])
+
+    def test_split_into_symbol_group_too_long(self):
+        """Test a string needing more symbols than a group links is rejected"""
+        with self.assertRaises(ValueError):
+            split_into_symbol_group("x" * (MAX_GROUP_SYMBOLS * 10 + 1), 10)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -6,8 +6,8 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
 from protocol_utils import (
-    create_qr_payload, create_first_qr_payload, create_approval_payload,
-    FIRST_CHUNK_ID, STARTING_CHUNK_DATA, APPROVED_CHUNK_DATA
+    create_qr_payload, create_first_qr_payload, create_approval_payload, attach_ack, piggybacked_approval,
+    create_nack_payload, is_nack_payload, id_ranges, FIRST_CHUNK_ID, NACK_CHUNK_ID, MAX_NACK_RANGES, STARTING_CHUNK_DATA, APPROVED_CHUNK_DATA
 )
 
 class TestPayloadCreation(unittest.TestCase):
@@ -24,6 +24,30 @@ class TestPayloadCreation(unittest.TestCase):
         self.assertEqual(payload["data"], b"Hello World")
         self.assertEqual(len(payload), 2)  # Only id and data
 
+    def test_create_approval_payload_sack_blocks(self):
+        """Test creating approval payload with selective ack blocks"""
+        payload = create_approval_payload(5, [(8, 9), (12, 12)])
+        
+        self.assertEqual(payload["id"], 5)
+        self.assertEqual(payload["sack"], [[8, 9], [12, 12]])
+
+    def test_attach_ack_round_trip(self):
+        """Test an approval attached to a data chunk comes back as the same approval"""
+        chunk = create_qr_payload(b"data", 3)
+        approval = create_approval_payload(5, [(8, 9)])
+        
+        payload = attach_ack(chunk, approval)
+        
+        self.assertEqual(payload["ack"], {"id": 5, "sack": [[8, 9]]})
+        self.assertNotIn("ack", chunk)
+        self.assertEqual(piggybacked_approval(payload), approval)
+
+    def test_piggybacked_approval_missing(self):
+        """Test payloads without a valid ack field carry no approval"""
+        self.assertIsNone(piggybacked_approval(create_qr_payload(b"data", 3)))
+        self.assertIsNone(piggybacked_approval({"id": 3, "data": b"", "ack": "5"}))
+        self.assertIsNone(piggybacked_approval(None))
+
     def test_create_qr_payload_empty_data(self):
         """Test creating QR payload with empty data"""
         chunk_data = b""
@@ -97,5 +121,28 @@ class TestPayloadCreation(unittest.TestCase):
         self.assertEqual(payload["data"], APPROVED_CHUNK_DATA)
         self.assertEqual(len(payload), 2)  # Only id and data
 
+    def test_create_nack_payload(self):
+        """Test the missing chunk report of a broadcast receiver lists its ranges"""
+        payload = create_nack_payload("r1", id_ranges([7, 3, 4, 5]))
+
+        self.assertEqual(payload["id"], NACK_CHUNK_ID)
+        self.assertEqual(payload["receiver"], "r1")
+        self.assertEqual(payload["nack"], [[3, 5], [7, 7]])
+        self.assertTrue(is_nack_payload(payload))
+        self.assertTrue(is_nack_payload(create_nack_payload("r1", [])))
+        self.assertFalse(is_nack_payload(create_approval_payload(3)))
+
+    def test_create_nack_payload_with_session(self):
+        """Test the report echoes the session ID of the broadcast"""
+        self.assertEqual(create_nack_payload("r1", [], "s1")["session"], "s1")
+        self.assertNotIn("session", create_nack_payload("r1", []))
+
+    def test_create_nack_payload_truncates_ranges(self):
+        """Test a long report keeps the first ranges, the rest are reported once those arrive"""
+        payload = create_nack_payload("r1", id_ranges(range(1, 40, 2)))
+
+        self.assertEqual(len(payload["nack"]), MAX_NACK_RANGES)
+        self.assertEqual(payload["nack"][0], [1, 1])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
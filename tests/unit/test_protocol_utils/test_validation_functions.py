@@ -6,7 +6,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
 from protocol_utils import (
-    is_starting_chunk, is_data_chunk, check_qr_chunk_approval,
+    is_starting_chunk, is_data_chunk, check_qr_chunk_approval, approval_covers,
     create_qr_payload, create_first_qr_payload, create_approval_payload,
     encode_qr_data, FIRST_CHUNK_ID, STARTING_CHUNK_DATA, APPROVED_CHUNK_DATA
 )
@@ -188,5 +188,27 @@ class TestValidationFunctions(unittest.TestCase):
         
         self.assertTrue(result)
 
+    def test_check_qr_chunk_approval_cumulative(self):
+        """Test check_qr_chunk_approval with an approval of a later chunk"""
+        current_chunk = create_qr_payload(b"some data", 3)
+        
+        approval_qr_string = encode_qr_data(create_approval_payload(5))
+        
+        self.assertTrue(check_qr_chunk_approval(approval_qr_string, current_chunk))
+
+    def test_approval_covers_sack_blocks(self):
+        """Test approval_covers with chunks in and between selective ack blocks"""
+        approval_payload = create_approval_payload(2, [(4, 5), (8, 8)])
+        
+        covered = [chunk_id for chunk_id in range(1, 10) if approval_covers(approval_payload, chunk_id)]
+        
+        self.assertEqual(covered, [1, 2, 4, 5, 8])
+
+    def test_approval_covers_first_chunk_exact(self):
+        """Test approval_covers only approves the first chunk with its own ID"""
+        self.assertTrue(approval_covers(create_approval_payload(FIRST_CHUNK_ID), FIRST_CHUNK_ID))
+        self.assertFalse(approval_covers(create_approval_payload(7), FIRST_CHUNK_ID))
+        self.assertFalse(approval_covers(None, 1))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+import unittest
+import random
+import sys
+import os
+import cv2
+import numpy as np
+import qrcode
+from qrcode import util
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+from qrcode.exceptions import DataOverflowError
+
+# Add the parent directory to the path so we can import our modules  
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from qr_encoder import SessionQREncoder, mask_penalty
+
+def reference_matrix(data, version, error_correction, mask_pattern):
+    """Encode data with the qrcode library as a single byte mode segment at a fixed version"""
+    qr = qrcode.QRCode(version=version, error_correction=error_correction, mask_pattern=mask_pattern, border=0)
+    qr.add_data(util.QRData(data, mode=util.MODE_8BIT_BYTE))
+    qr.make(fit=False)
+    return np.array(qr.get_matrix(), dtype=bool)
+
+class TestSessionQREncoder(unittest.TestCase):
+    """Test cases for the template cached session QR encoder"""
+
+    def setUp(self):
+        """Set up a seeded random source for the payloads"""
+        self.rng = random.Random(1234)
+
+    def random_payload(self, encoder):
+        """Create random bytes with a random length that fits the encoder"""
+        length = self.rng.randint(0, encoder.capacity)
+        return bytes(self.rng.randrange(256) for _ in range(length))
+
+    def test_encode_fixed_mask_matches_reference(self):
+        """Test fixed mask output is bit identical to qrcode for every ECC level and mask"""
+        for version in [1, 2, 6, 7, 10]:
+            for error_correction in [ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H]:
+                for mask_pattern in range(8):
+                    with self.subTest(version=version, error_correction=error_correction, mask_pattern=mask_pattern):
+                        encoder = SessionQREncoder(version, error_correction, mask_pattern)
+                        data = self.random_payload(encoder)
+                        expected = reference_matrix(data, version, error_correction, mask_pattern)
+                        np.testing.assert_array_equal(encoder.encode(data), expected)
+
+    def test_encode_automatic_mask_matches_reference(self):
+        """Test automatic mask selection picks the same mask as qrcode"""
+        for version in [1, 4, 9, 15]:
+            with self.subTest(version=version):
+                encoder = SessionQREncoder(version, ERROR_CORRECT_M)
+                data = self.random_payload(encoder)
+                expected = reference_matrix(data, version, ERROR_CORRECT_M, None)
+                np.testing.assert_array_equal(encoder.encode(data), expected)
+
+    def test_encode_large_versions_match_reference(self):
+        """Test versions with many blocks and a larger length field"""
+        for version in [27, 40]:
+            with self.subTest(version=version):
+                encoder = SessionQREncoder(version, ERROR_CORRECT_H, mask_pattern=3)
+                data = self.random_payload(encoder)
+                expected = reference_matrix(data, version, ERROR_CORRECT_H, 3)
+                np.testing.assert_array_equal(encoder.encode(data), expected)
+
+    def test_encode_reuses_encoder_across_payloads(self):
+        """Test consecutive payloads of one session are each encoded correctly"""
+        encoder = SessionQREncoder(5, ERROR_CORRECT_Q, mask_pattern=6)
+
+        for payload in [b"first", b"", b"x" * encoder.capacity, b"last"]:
+            expected = reference_matrix(payload, 5, ERROR_CORRECT_Q, 6)
+            np.testing.assert_array_equal(encoder.encode(payload), expected)
+
+    def test_encode_string_payload(self):
+        """Test string payloads are encoded as their UTF-8 bytes"""
+        encoder = SessionQREncoder(3, mask_pattern=1)
+
+        np.testing.assert_array_equal(encoder.encode('{"id": 1}'), encoder.encode(b'{"id": 1}'))
+
+    def test_encode_symbol_size_is_fixed(self):
+        """Test every symbol of a session has the same size"""
+        encoder = SessionQREncoder(8, mask_pattern=0)
+
+        self.assertEqual(encoder.encode(b"a").shape, (49, 49))
+        self.assertEqual(encoder.encode(b"a" * encoder.capacity).shape, (49, 49))
+
+    def test_encode_overflow(self):
+        """Test payloads larger than the session capacity are rejected"""
+        encoder = SessionQREncoder(1, ERROR_CORRECT_H, mask_pattern=0)
+
+        with self.assertRaises(DataOverflowError):
+            encoder.encode(b"x" * (encoder.capacity + 1))
+
+    def test_capacity_matches_byte_mode_table(self):
+        """Test capacity matches the byte mode capacity of the QR specification"""
+        self.assertEqual(SessionQREncoder(1, ERROR_CORRECT_L).capacity, 17)
+        self.assertEqual(SessionQREncoder(1, ERROR_CORRECT_H).capacity, 7)
+        self.assertEqual(SessionQREncoder(10, ERROR_CORRECT_M).capacity, 213)
+        self.assertEqual(SessionQREncoder(40, ERROR_CORRECT_L).capacity, 2953)
+
+    def test_fitting_picks_smallest_version(self):
+        """Test fitting chooses the smallest version with enough capacity"""
+        self.assertEqual(SessionQREncoder.fitting(17, ERROR_CORRECT_L).version, 1)
+        self.assertEqual(SessionQREncoder.fitting(18, ERROR_CORRECT_L).version, 2)
+
+    def test_fitting_overflow(self):
+        """Test fitting raises when no version is large enough"""
+        with self.assertRaises(DataOverflowError):
+            SessionQREncoder.fitting(3000, ERROR_CORRECT_L)
+
+    def test_encode_candidates_cover_every_mask(self):
+        """Test candidates start with the encode() symbol and then use every other mask once"""
+        encoder = SessionQREncoder(4, ERROR_CORRECT_M)
+        data = self.random_payload(encoder)
+
+        candidates = list(encoder.encode_candidates(data))
+
+        self.assertEqual(len(candidates), 8)
+        np.testing.assert_array_equal(candidates[0], encoder.encode(data))
+        for mask_pattern in range(8):
+            expected = reference_matrix(data, 4, ERROR_CORRECT_M, mask_pattern)
+            self.assertTrue(any((candidate == expected).all() for candidate in candidates))
+
+    def test_encode_candidates_fixed_mask_first(self):
+        """Test a fixed mask is the first candidate, followed by the other masks"""
+        encoder = SessionQREncoder(2, ERROR_CORRECT_L, mask_pattern=5)
+
+        candidates = list(encoder.encode_candidates(b"payload"))
+
+        self.assertEqual(len(candidates), 8)
+        np.testing.assert_array_equal(candidates[0], reference_matrix(b"payload", 2, ERROR_CORRECT_L, 5))
+
+    def test_mask_penalty_matches_reference(self):
+        """Test the vectorized mask penalty scores matrices exactly like qrcode"""
+        rng = np.random.default_rng(1234)
+        for size in [21, 45, 177]:
+            for dark_ratio in [0.2, 0.5, 0.8]:
+                with self.subTest(size=size, dark_ratio=dark_ratio):
+                    modules = rng.random((size, size)) < dark_ratio
+                    self.assertEqual(mask_penalty(modules), util.lost_point(modules.tolist()))
+
+    def test_structured_append_group_decodes_as_one_message(self):
+        """Test symbols with Structured Append headers are joined back into the message by OpenCV"""
+        encoder = SessionQREncoder(5)
+        message = b'{"id": 1, "data": "' + b"A" * 120 + b'"}'
+        parts = [message[:71], message[71:]]
+        parity = 0
+        for byte in message:
+            parity ^= byte
+        symbols = [np.pad(np.where(encoder.encode(part, (index, 2, parity)), 0, 255).astype(np.uint8), 4, constant_values=255)
+                   for index, part in enumerate(parts)]
+        image = np.kron(np.hstack(symbols), np.ones((6, 6), dtype=np.uint8))
+
+        _, decoded, _, _ = cv2.QRCodeDetector().detectAndDecodeMulti(image)
+
+        self.assertIn(message.decode(), decoded)
+
+    def test_structured_append_part_capacity(self):
+        """Test the group header takes room from a symbol and oversized parts are rejected"""
+        encoder = SessionQREncoder(5)
+
+        self.assertEqual(encoder.part_capacity, encoder.capacity - 2)  # 20 header bits
+        with self.assertRaises(DataOverflowError):
+            encoder.encode(b"x" * encoder.capacity, (0, 2, 0))
+        self.assertEqual(SessionQREncoder.fitting(encoder.capacity, structured_append=True).version, 6)
+
+    def test_invalid_mask_pattern(self):
+        """Test invalid mask patterns are rejected"""
+        with self.assertRaises(ValueError):
+            SessionQREncoder(1, mask_pattern=8)
+
+if __name__ == '__main__':
+    unittest.main()
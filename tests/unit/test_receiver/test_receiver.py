@@ -1,47 +1,35 @@
 import unittest
 import sys
 import os
+import tempfile
 from unittest.mock import patch, MagicMock
 
 # Add the parent directory to the path so we can import our modules  
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
-from receiver import wait_for_starting_chunk, receive_file_chunks, send_approval, receiver_main
-from protocol_utils import STARTING_CHUNK_DATA, APPROVED_CHUNK_DATA
+from receiver import wait_for_starting_chunk, receive_file_chunks, show_receiver_qr, receiver_main, RECEIVER_WINDOW_NAME
+from protocol_utils import encode_qr_data, decode_qr_data, create_first_qr_payload, create_qr_payload
 
 class TestReceiver(unittest.TestCase):
     """Test cases for receiver.py functions"""
 
-    @patch('receiver.send_approval')
-    @patch('receiver.is_starting_chunk')
-    @patch('receiver.decode_qr_data')
+    def shown_approval_ids(self, mock_show):
+        """Chunk IDs of the approvals shown in the receiver window"""
+        return [decode_qr_data(show_call.args[0])['id'] for show_call in mock_show.call_args_list]
+
+    @patch('receiver.show_receiver_qr')
     @patch('receiver.get_next_qr_data')
-    def test_wait_for_starting_chunk_success(self, mock_get_qr, mock_decode, mock_is_starting, mock_send_approval):
+    def test_wait_for_starting_chunk_success(self, mock_get_qr, mock_show):
         """Test successful starting chunk reception"""
         cam = MagicMock()
-        
-        # Mock QR data reception
-        mock_get_qr.return_value = "starting_qr_string"
-        
-        # Mock payload decoding
-        starting_payload = {
-            'id': 0,
-            'data': STARTING_CHUNK_DATA,
-            'file_name': 'test.txt',
-            'total_chunks': 3
-        }
-        mock_decode.return_value = starting_payload
-        
-        # Mock starting chunk validation
-        mock_is_starting.return_value = True
+        starting_payload = create_first_qr_payload('test.txt', [b"a", b"b", b"c"])
+        mock_get_qr.return_value = encode_qr_data(starting_payload)
         
         result = wait_for_starting_chunk(cam)
         
         # Verify calls
         mock_get_qr.assert_called_once_with(cam)
-        mock_decode.assert_called_once_with("starting_qr_string")
-        mock_is_starting.assert_called_once_with(starting_payload)
-        mock_send_approval.assert_called_once_with(0)
+        self.assertEqual(self.shown_approval_ids(mock_show), [0])
         
         # Verify returned metadata
         expected_metadata = {
@@ -50,53 +38,35 @@ class TestReceiver(unittest.TestCase):
         }
         self.assertEqual(result, expected_metadata)
 
-    @patch('receiver.send_approval')
-    @patch('receiver.is_starting_chunk')
-    @patch('receiver.decode_qr_data')
+    @patch('receiver.show_receiver_qr')
     @patch('receiver.get_next_qr_data')
-    def test_wait_for_starting_chunk_retry(self, mock_get_qr, mock_decode, mock_is_starting, mock_send_approval):
+    def test_wait_for_starting_chunk_retry(self, mock_get_qr, mock_show):
         """Test starting chunk reception with retry"""
         cam = MagicMock()
         
-        # Mock QR data reception - first wrong, then correct
-        mock_get_qr.side_effect = ["wrong_qr", "starting_qr"]
-        
-        # Mock payload decoding - first None, then valid
-        starting_payload = {
-            'id': 0,
-            'data': STARTING_CHUNK_DATA,
-            'file_name': 'test.txt',
-            'total_chunks': 2
-        }
-        mock_decode.side_effect = [None, starting_payload]
-        
-        # Mock starting chunk validation - called twice, first False (None payload), then True
-        mock_is_starting.side_effect = [False, True]
+        # Mock QR data reception - first unreadable, then a data chunk, then the starting chunk
+        mock_get_qr.side_effect = [
+            "wrong_qr", encode_qr_data(create_qr_payload(b"data", 1)),
+            encode_qr_data(create_first_qr_payload('test.txt', [b"a", b"b"]))
+        ]
         
         result = wait_for_starting_chunk(cam)
         
         # Should retry until valid starting chunk
-        self.assertEqual(mock_get_qr.call_count, 2)
-        self.assertEqual(mock_decode.call_count, 2)
-        mock_send_approval.assert_called_once_with(0) # Didn't go inside the if
+        self.assertEqual(mock_get_qr.call_count, 3)
+        self.assertEqual(self.shown_approval_ids(mock_show), [0])
+        self.assertEqual(result['total_chunks'], 2)
 
-    @patch('receiver.send_approval')
-    @patch('receiver.is_data_chunk')
-    @patch('receiver.decode_qr_data')
+    @patch('receiver.time.sleep')
+    @patch('receiver.show_receiver_qr')
     @patch('receiver.get_next_qr_data')
-    def test_receive_file_chunks_success(self, mock_get_qr, mock_decode, mock_is_data, mock_send_approval):
+    def test_receive_file_chunks_success(self, mock_get_qr, mock_show, mock_sleep):
         """Test successful file chunk reception"""
         cam = MagicMock()
         total_chunks = 2
-        
-        # Mock chunk payloads
-        chunk1_payload = {'id': 1, 'data': b'chunk1_data'}
-        chunk2_payload = {'id': 2, 'data': b'chunk2_data'}
-        
-        # Mock QR reception and decoding
-        mock_get_qr.side_effect = ["chunk1_qr", "chunk2_qr"]
-        mock_decode.side_effect = [chunk1_payload, chunk2_payload]
-        mock_is_data.return_value = True
+        mock_get_qr.side_effect = [
+            encode_qr_data(create_qr_payload(b'chunk1_data', 1)), encode_qr_data(create_qr_payload(b'chunk2_data', 2))
+        ]
         
         result = receive_file_chunks(cam, total_chunks)
         
@@ -104,29 +74,18 @@ class TestReceiver(unittest.TestCase):
         expected_data = b'chunk1_datachunk2_data'
         self.assertEqual(result, expected_data)
         
-        # Verify approval sent for each chunk
-        self.assertEqual(mock_send_approval.call_count, 2)
-        mock_send_approval.assert_any_call(1)
-        mock_send_approval.assert_any_call(2)
+        # Verify approval shown for each chunk
+        self.assertEqual(self.shown_approval_ids(mock_show), [1, 2])
 
-    @patch('receiver.send_approval')
-    @patch('receiver.is_data_chunk')
-    @patch('receiver.decode_qr_data')
+    @patch('receiver.time.sleep')
+    @patch('receiver.show_receiver_qr')
     @patch('receiver.get_next_qr_data')
-    def test_receive_file_chunks_with_duplicates(self, mock_get_qr, mock_decode, mock_is_data, mock_send_approval):
+    def test_receive_file_chunks_with_duplicates(self, mock_get_qr, mock_show, mock_sleep):
         """Test file chunk reception with duplicate chunks"""
         cam = MagicMock()
         total_chunks = 2
-        
-        # Mock chunk payloads (including duplicate)
-        chunk1_payload = {'id': 1, 'data': b'chunk1_data'}
-        chunk1_duplicate = {'id': 1, 'data': b'chunk1_data'}
-        chunk2_payload = {'id': 2, 'data': b'chunk2_data'}
-        
-        # Mock QR reception and decoding
-        mock_get_qr.side_effect = ["chunk1_qr", "chunk1_duplicate_qr", "chunk2_qr"]
-        mock_decode.side_effect = [chunk1_payload, chunk1_duplicate, chunk2_payload]
-        mock_is_data.return_value = True
+        chunk1_qr = encode_qr_data(create_qr_payload(b'chunk1_data', 1))
+        mock_get_qr.side_effect = [chunk1_qr, chunk1_qr, encode_qr_data(create_qr_payload(b'chunk2_data', 2))]
         
         result = receive_file_chunks(cam, total_chunks)
         
@@ -134,29 +93,39 @@ class TestReceiver(unittest.TestCase):
         expected_data = b'chunk1_datachunk2_data'
         self.assertEqual(result, expected_data)
         
-        # Should only send approval for unique chunks
-        self.assertEqual(mock_send_approval.call_count, 2)
-        mock_send_approval.assert_any_call(1)
-        mock_send_approval.assert_any_call(2)
+        # Should only show approval for unique chunks
+        self.assertEqual(self.shown_approval_ids(mock_show), [1, 2])
 
-    @patch('receiver.send_approval')
-    @patch('receiver.is_data_chunk')
-    @patch('receiver.decode_qr_data')
+    @patch('receiver.time.sleep')
+    @patch('receiver.show_receiver_qr')
     @patch('receiver.get_next_qr_data')
-    def test_receive_file_chunks_out_of_order(self, mock_get_qr, mock_decode, mock_is_data, mock_send_approval):
+    def test_receive_file_chunks_reports_progress(self, mock_get_qr, mock_show, mock_sleep):
+        """Test the progress callback sees received bytes and duplicate counts"""
+        cam = MagicMock()
+        snapshots = []
+        chunk1_qr = encode_qr_data(create_qr_payload(b'abc', 1))
+        mock_get_qr.side_effect = [chunk1_qr, chunk1_qr, encode_qr_data(create_qr_payload(b'de', 2))]
+
+        receive_file_chunks(cam, 2, on_progress=snapshots.append)
+
+        # Reports are rate limited, the final one is always delivered
+        final = snapshots[-1]
+        self.assertEqual(final['chunks'], 2)
+        self.assertEqual(final['bytes'], 5)
+        self.assertEqual(final['duplicates'], 1)
+        self.assertEqual(final['percent'], 100.0)
+
+    @patch('receiver.time.sleep')
+    @patch('receiver.show_receiver_qr')
+    @patch('receiver.get_next_qr_data')
+    def test_receive_file_chunks_out_of_order(self, mock_get_qr, mock_show, mock_sleep):
         """Test file chunk reception with out-of-order chunks"""
         cam = MagicMock()
         total_chunks = 3
-        
-        # Mock chunk payloads (out of order)
-        chunk3_payload = {'id': 3, 'data': b'chunk3'}
-        chunk1_payload = {'id': 1, 'data': b'chunk1'}
-        chunk2_payload = {'id': 2, 'data': b'chunk2'}
-        
-        # Mock QR reception and decoding
-        mock_get_qr.side_effect = ["chunk3_qr", "chunk1_qr", "chunk2_qr"]
-        mock_decode.side_effect = [chunk3_payload, chunk1_payload, chunk2_payload]
-        mock_is_data.return_value = True
+        mock_get_qr.side_effect = [
+            encode_qr_data(create_qr_payload(data, chunk_id))
+            for chunk_id, data in [(3, b'chunk3'), (1, b'chunk1'), (2, b'chunk2')]
+        ]
         
         result = receive_file_chunks(cam, total_chunks)
         
@@ -165,30 +134,13 @@ class TestReceiver(unittest.TestCase):
         self.assertEqual(result, expected_data)
 
     @patch('receiver.display_qr_centered')
-    @patch('receiver.close_all_qr_windows')
-    @patch('receiver.encode_qr_data')
-    @patch('receiver.create_approval_payload')
-    def test_send_approval(self, mock_create_approval, mock_encode_qr, mock_close_windows, mock_display_qr):
-        """Test sending approval QR code"""
-        chunk_id = 5
-        
-        # Mock approval payload creation
-        approval_payload = {'id': 5, 'data': APPROVED_CHUNK_DATA}
-        mock_create_approval.return_value = approval_payload
-        
-        # Mock QR encoding
-        mock_encode_qr.return_value = "approval_qr_string"
-        
-        send_approval(chunk_id)
-        
-        # Verify workflow
-        mock_create_approval.assert_called_once_with(chunk_id)
-        mock_encode_qr.assert_called_once_with(approval_payload)
-        mock_close_windows.assert_called_once()
-        
-        expected_window_name = "Approval for chunk 5"
-        mock_display_qr.assert_called_once_with("approval_qr_string", expected_window_name)
+    def test_show_receiver_qr(self, mock_display_qr):
+        """Test approvals are shown in place in the long-lived receiver window"""
+        show_receiver_qr("approval_qr_string")
+
+        mock_display_qr.assert_called_once_with("approval_qr_string", RECEIVER_WINDOW_NAME)
 
+    @patch('receiver.close_qr_window')
     @patch('receiver.open_file')
     @patch('receiver.save_file_data')
     @patch('receiver.receive_file_chunks')
@@ -196,7 +148,7 @@ class TestReceiver(unittest.TestCase):
     @patch('receiver.select_save_directory')
     @patch('receiver.get_web_cam')
     def test_receiver_main_success(self, mock_get_cam, mock_select_dir, mock_wait_start, 
-                                  mock_receive_chunks, mock_save_file, mock_open_file):
+                                  mock_receive_chunks, mock_save_file, mock_open_file, mock_close_window):
         """Test successful receiver main workflow"""
         # Mock camera and directory
         mock_cam = MagicMock()
@@ -213,16 +165,61 @@ class TestReceiver(unittest.TestCase):
         # Mock successful file save
         mock_save_file.return_value = ("/save/directory/test.txt", True)
         
-        receiver_main()
+        summary = receiver_main()
         
         # Verify workflow
         mock_get_cam.assert_called_once()
         mock_select_dir.assert_called_once()
         mock_wait_start.assert_called_once_with(mock_cam)
-        mock_receive_chunks.assert_called_once_with(mock_cam, 2)
+        mock_receive_chunks.assert_called_once_with(mock_cam, 2, None)
         mock_save_file.assert_called_once_with("/save/directory", "test.txt", b"complete file data")
         mock_open_file.assert_called_once_with("/save/directory/test.txt")
+        mock_close_window.assert_called_once_with(RECEIVER_WINDOW_NAME)
+        self.assertEqual(summary, {'file_name': 'test.txt', 'file_size': 18, 'total_chunks': 2, 'files': 1})
+
+    @patch('receiver.close_qr_window')
+    @patch('receiver.open_file')
+    @patch('receiver.save_file_data')
+    @patch('receiver.receive_file_chunks')
+    @patch('receiver.wait_for_starting_chunk')
+    @patch('receiver.select_save_directory')
+    @patch('receiver.get_web_cam')
+    def test_receiver_main_receives_queue(self, mock_get_cam, mock_select_dir, mock_wait_start,
+                                          mock_receive_chunks, mock_save_file, mock_open_file, mock_close_window):
+        """Test queued files are saved in the output directory without any dialog or opening them"""
+        mock_wait_start.side_effect = [{'file_name': 'a.txt', 'total_chunks': 1}, {'file_name': 'b.txt', 'total_chunks': 2}]
+        mock_receive_chunks.side_effect = [b"a", b"bb"]
+        mock_save_file.return_value = ("/saved", True)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_dir = os.path.join(temp_dir, "received")
+            summary = receiver_main(output_dir, count=2, open_files=False)
+
+            self.assertTrue(os.path.isdir(output_dir))
+        mock_select_dir.assert_not_called()
+        mock_open_file.assert_not_called()
+        self.assertEqual([save_call.args[:2] for save_call in mock_save_file.call_args_list],
+                         [(output_dir, 'a.txt'), (output_dir, 'b.txt')])
+        mock_close_window.assert_called_once_with(RECEIVER_WINDOW_NAME)
+        self.assertEqual(summary, {'file_name': 'a.txt, b.txt', 'file_size': 3, 'total_chunks': 3, 'files': 2})
+
+    @patch('receiver.close_qr_window')
+    @patch('receiver.open_file')
+    @patch('receiver.save_file_data')
+    @patch('receiver.receive_file')
+    @patch('receiver.get_web_cam')
+    def test_receiver_main_until_interrupted(self, mock_get_cam, mock_receive_file, mock_save_file,
+                                             mock_open_file, mock_close_window):
+        """Test a count of 0 keeps receiving until interrupted and still closes the window"""
+        mock_receive_file.side_effect = [({'file_name': 'a.txt', 'total_chunks': 1}, b"a"), KeyboardInterrupt]
+        mock_save_file.return_value = ("/saved", True)
+
+        summary = receiver_main("/save/directory", count=0)
+
+        mock_close_window.assert_called_once_with(RECEIVER_WINDOW_NAME)
+        self.assertEqual(summary['files'], 1)
 
+    @patch('receiver.close_qr_window')
     @patch('receiver.open_file')
     @patch('receiver.save_file_data')
     @patch('receiver.receive_file_chunks')
@@ -230,7 +227,7 @@ class TestReceiver(unittest.TestCase):
     @patch('receiver.select_save_directory')
     @patch('receiver.get_web_cam')
     def test_receiver_main_save_failure(self, mock_get_cam, mock_select_dir, mock_wait_start,
-                                       mock_receive_chunks, mock_save_file, mock_open_file):
+                                       mock_receive_chunks, mock_save_file, mock_open_file, mock_close_window):
         """Test receiver main when file save fails"""
         # Mock camera and directory
         mock_cam = MagicMock()
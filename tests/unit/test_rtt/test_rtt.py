@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+from rtt import RttEstimator, combine_rtt_snapshots, format_rtt, INITIAL_RTO, MIN_RTO, MAX_RTO
+
+class TestRttEstimator(unittest.TestCase):
+    """Test cases for the round-trip time estimator and retransmission timeout"""
+
+    def test_initial_timeout(self):
+        """Test the timeout before any sample is the initial one"""
+        estimator = RttEstimator()
+
+        self.assertEqual(estimator.rto, INITIAL_RTO)
+        self.assertIsNone(estimator.srtt)
+
+    def test_first_sample(self):
+        """Test the first sample sets the smoothed RTT and half of it as variance"""
+        estimator = RttEstimator()
+
+        estimator.sample(2.0)
+
+        self.assertEqual((estimator.srtt, estimator.rttvar), (2.0, 1.0))
+        self.assertEqual(estimator.rto, 6.0)
+
+    def test_later_samples_smoothed(self):
+        """Test later samples move the estimate by the RFC 6298 gains"""
+        estimator = RttEstimator()
+        estimator.sample(2.0)
+
+        estimator.sample(4.0)
+
+        self.assertAlmostEqual(estimator.rttvar, 0.75 * 1.0 + 0.25 * 2.0)
+        self.assertAlmostEqual(estimator.srtt, 0.875 * 2.0 + 0.125 * 4.0)
+        self.assertAlmostEqual(estimator.rto, estimator.srtt + 4 * estimator.rttvar)
+
+    def test_timeout_bounds_and_granularity(self):
+        """Test the timeout stays within its bounds and covers at least the clock granularity"""
+        estimator = RttEstimator(granularity=0.2)
+        estimator.sample(0.01)
+        self.assertEqual(estimator.rto, MIN_RTO)
+
+        estimator.sample(100.0)
+        self.assertEqual(estimator.rto, MAX_RTO)
+
+        granular = RttEstimator(min_rto=0.0, granularity=0.2)
+        granular.sample(0.04)
+        self.assertAlmostEqual(granular.rto, 0.24)
+
+    def test_timeout_backs_off(self):
+        """Test each timeout doubles the timeout until the next sample"""
+        estimator = RttEstimator()
+
+        estimator.timeout()
+        estimator.timeout()
+
+        self.assertEqual(estimator.rto, 4 * INITIAL_RTO)
+        self.assertEqual(estimator.snapshot()['timeouts'], 2)
+        estimator.sample(1.0)
+        self.assertEqual(estimator.rto, 3.0)
+
+    def test_combine_snapshots(self):
+        """Test combined statistics keep the latest estimate and sum the counts"""
+        first, second = RttEstimator(), RttEstimator()
+        first.sample(1.0)
+        first.timeout()
+        second.sample(0.5)
+
+        combined = combine_rtt_snapshots([first.snapshot(), second.snapshot()])
+
+        self.assertEqual(combined['srtt'], 0.5)
+        self.assertEqual((combined['samples'], combined['timeouts']), (2, 1))
+        self.assertIsNone(combine_rtt_snapshots([]))
+
+    def test_format_rtt(self):
+        """Test the timer statistics line, before and after a sample"""
+        estimator = RttEstimator()
+        self.assertEqual(format_rtt(estimator.snapshot()), "Round trip: smoothed --, timeout 1.00s, 0 samples, 0 timeouts")
+
+        estimator.sample(0.25)
+        self.assertEqual(format_rtt(estimator.snapshot()), "Round trip: smoothed 0.25s, timeout 0.75s, 1 samples, 0 timeouts")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -6,8 +6,10 @@ from unittest.mock import patch, MagicMock
 # Add the parent directory to the path so we can import our modules  
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 
-from sender import pick_file, sender_main
-from protocol_utils import STARTING_CHUNK_DATA
+from sender import pick_file, sender_main, create_session_encoder, SENDER_WINDOW_NAME
+from protocol_utils import STARTING_CHUNK_DATA, create_chunks_to_send, create_approval_payload, encode_qr_data, decode_qr_data
+from camera_handler import get_qr_from_frame
+from display_utils import render_qr
 
 class TestSender(unittest.TestCase):
     """Test cases for sender.py functions"""
@@ -59,21 +61,48 @@ class TestSender(unittest.TestCase):
         mock_read_file.assert_called_once_with("/path/to/missing.txt")
         self.assertEqual(result, (None, b""))
 
-    # No need for unit tests for display_qr_for_chunk and wait_for_chunk_approval
-    # as they involve GUI and camera interaction which are better suited for integration tests and there isn't any logical branching to test.
+    def test_create_session_encoder_fits_all_chunks(self):
+        """Test the session encoder is pinned to a version that fits the largest chunk"""
+        chunks = create_chunks_to_send("a_rather_long_file_name.txt", b"x" * 250)
+
+        encoder = create_session_encoder(chunks)
+
+        self.assertGreaterEqual(encoder.capacity, max(len(encode_qr_data(chunk)) for chunk in chunks))
+
+    def test_session_symbols_decode_back(self):
+        """Test every chunk of a real file is shown as a symbol OpenCV decodes back to the chunk"""
+        test_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "integration", "test_file.txt")
+        with open(test_file_path, 'rb') as f:
+            chunks = create_chunks_to_send("test_file.txt", f.read())
+        encoder = create_session_encoder(chunks)
+
+        for chunk in chunks:
+            qr_data_string = encode_qr_data(chunk)
+            image = render_qr(qr_data_string, encoder, decode=get_qr_from_frame)
+            self.assertEqual(get_qr_from_frame(image), qr_data_string)
+
+    # No need for unit tests for show_sender_qr as it involves GUI interaction and there isn't any logical branching to test.
+
+    def approve_shown_chunk(self, mock_show):
+        """Stand-in for get_next_qr_data seeing the approval of the chunk last shown"""
+        def get_next_qr_data(cam, timeout=None):
+            shown_chunk = decode_qr_data(mock_show.call_args.args[0])
+            return encode_qr_data(create_approval_payload(shown_chunk['id']))
+        return get_next_qr_data
 
     @patch('sender.close_qr_window')
-    @patch('sender.wait_for_chunk_approval')
-    @patch('sender.display_qr_for_chunk')
+    @patch('sender.get_next_qr_data')
+    @patch('sender.show_sender_qr')
     @patch('sender.create_chunks_to_send')
     @patch('sender.pick_file')
     @patch('sender.get_web_cam')
     def test_sender_main_success(self, mock_get_cam, mock_pick_file, mock_create_chunks, 
-                                mock_display_qr, mock_wait_approval, mock_close_window):
+                                mock_display_qr, mock_get_qr, mock_close_window):
         """Test successful sender main workflow"""
         # Mock camera
         mock_cam = MagicMock()
         mock_get_cam.return_value = mock_cam
+        mock_get_qr.side_effect = self.approve_shown_chunk(mock_display_qr)
         
         # Mock file selection
         mock_pick_file.return_value = ("test.txt", b"file content")
@@ -86,17 +115,47 @@ class TestSender(unittest.TestCase):
         ]
         mock_create_chunks.return_value = mock_chunks
         
-        sender_main()
+        summary = sender_main()
         
         # Verify workflow calls
         mock_get_cam.assert_called_once()
         mock_pick_file.assert_called_once()
-        mock_create_chunks.assert_called_once_with("test.txt", b"file content")
-        
-        # Verify each chunk processed
-        self.assertEqual(mock_display_qr.call_count, 3)
-        self.assertEqual(mock_wait_approval.call_count, 3)
-        self.assertEqual(mock_close_window.call_count, 3)
+        mock_create_chunks.assert_called_once_with("test.txt", b"file content", 100)
+        
+        # Verify each chunk shown in turn, moving on after its approval
+        self.assertEqual([decode_qr_data(display_call.args[0])['id'] for display_call in mock_display_qr.call_args_list],
+                         [0, 1, 2])
+        self.assertEqual(mock_get_qr.call_count, 3)
+        # The same window is reused for every chunk and closed once at the end
+        mock_close_window.assert_called_once_with(SENDER_WINDOW_NAME)
+        # The summary counts data chunks only, like the starting chunk metadata
+        rtt = summary.pop('rtt')
+        self.assertEqual(summary, {'file_name': "test.txt", 'file_size': 12, 'total_chunks': 2, 'files': 1})
+        # Every chunk was approved after being shown once, so each approval is a round-trip sample
+        self.assertEqual((rtt['samples'], rtt['timeouts']), (3, 0))
+
+    @patch('sender.close_qr_window')
+    @patch('sender.get_next_qr_data')
+    @patch('sender.show_sender_qr')
+    @patch('sender.read_file_data')
+    @patch('sender.pick_file')
+    @patch('sender.get_web_cam')
+    def test_sender_main_sends_queue(self, mock_get_cam, mock_pick_file, mock_read_file,
+                                     mock_display_qr, mock_get_qr, mock_close_window):
+        """Test the given files are sent back to back in one session without any dialog, skipping unreadable ones"""
+        mock_get_qr.side_effect = self.approve_shown_chunk(mock_display_qr)
+        mock_read_file.side_effect = [("a.txt", b"a" * 150), (None, b""), ("b.txt", b"bb")]
+
+        summary = sender_main(["a.txt", "missing.txt", "b.txt"])
+
+        mock_pick_file.assert_not_called()
+        mock_get_cam.assert_called_once()
+        # a.txt has a starting chunk and 2 data chunks, b.txt a starting chunk and 1 data chunk
+        self.assertEqual(mock_display_qr.call_count, 5)
+        mock_close_window.assert_called_once_with(SENDER_WINDOW_NAME)
+        rtt = summary.pop('rtt')
+        self.assertEqual(summary, {'file_name': "a.txt, b.txt", 'file_size': 152, 'total_chunks': 3, 'files': 2})
+        self.assertEqual(rtt['samples'], 5)
 
     @patch('sender.pick_file')
     @patch('sender.get_web_cam')
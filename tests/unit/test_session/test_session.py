@@ -0,0 +1,591 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
+
+import metrics
+from session import (
+    SenderSession, ReceiverSession, DuplexSession, BroadcastSenderSession, BroadcastReceiverSession,
+    reassemble_file_data, reassemble_striped_file_data, run_session
+)
+from protocol_utils import (
+    encode_qr_data, decode_qr_data, create_chunks_to_send, create_approval_payload, create_calibration_payload,
+    create_lane_chunks, create_nack_payload, CALIBRATION_PROBE
+)
+
+def approval(chunk_id, sack_blocks=()):
+    return encode_qr_data(create_approval_payload(chunk_id, sack_blocks))
+
+def shown_ids(frames):
+    return [decode_qr_data(frame)['id'] for frame in frames]
+
+class TestSenderSession(unittest.TestCase):
+    """Test cases for the sender state machine"""
+
+    def setUp(self):
+        self.chunks = create_chunks_to_send("a.txt", b"x" * 250)
+        self.session = SenderSession(self.chunks)
+
+    def test_chunks_advance_on_approval(self):
+        """Test each chunk is shown until its approval, then the next one"""
+        self.assertEqual(self.session.start(0.0), encode_qr_data(self.chunks[0]))
+
+        self.assertIsNone(self.session.on_frame(approval(2), 0.1))
+        self.assertIsNone(self.session.on_frame("not json", 0.2))
+        self.assertEqual(self.session.on_frame(approval(0), 0.3), encode_qr_data(self.chunks[1]))
+        self.assertEqual(self.session.current_chunk, self.chunks[1])
+
+    def test_done_after_last_approval(self):
+        """Test the session is done once every chunk is approved and ignores frames afterwards"""
+        self.session.start(0.0)
+        for chunk in self.chunks:
+            self.assertFalse(self.session.done)
+            self.session.on_frame(approval(chunk['id']), 1.0)
+
+        self.assertTrue(self.session.done)
+        self.assertIsNone(self.session.current_chunk)
+        self.assertIsNone(self.session.on_frame(approval(0), 2.0))
+
+    def test_upcoming_frames(self):
+        """Test the upcoming frames are the other in-flight chunks in showing order, then the chunks entering the window"""
+        frames = [encode_qr_data(chunk) for chunk in self.chunks]
+        self.session.start(0.0)
+
+        upcoming = self.session.upcoming(2)
+
+        # The starting chunk is in flight alone and not shown again
+        self.assertEqual(upcoming, frames[1:3])
+        self.assertEqual(self.session.on_frame(approval(0), 0.1), upcoming[0])
+        # Every data chunk is in flight, the one on screen comes back after the others
+        self.assertEqual(self.session.upcoming(10), [frames[2], frames[3], frames[1]])
+
+    def test_window_rotates_in_flight_chunks(self):
+        """Test the in-flight chunks are shown in turn, one frame interval each"""
+        session = SenderSession(create_chunks_to_send("a.txt", b"x" * 1000), window=3, frame_interval=0.2)
+        session.start(0.0)
+        # Alone in flight, the starting chunk only waits for its retransmission timeout
+        self.assertEqual(session.next_deadline(), session.rtt.rto)
+        session.on_frame(approval(0), 0.3)
+
+        self.assertEqual(session.next_deadline(), 0.5)
+        self.assertIsNone(session.on_tick(0.4))
+        shown = [session.on_tick(now) for now in [0.55, 0.8, 1.05]]
+
+        self.assertEqual(shown_ids(shown), [2, 3, 1])
+
+    def test_one_approval_acknowledges_many_chunks(self):
+        """Test a cumulative approval with selective ack blocks acknowledges every chunk it covers and slides the window"""
+        session = SenderSession(create_chunks_to_send("a.txt", b"x" * 1000), window=4, frame_interval=0.2)
+        session.start(0.0)
+        session.on_frame(approval(0), 0.0)
+
+        # Chunk 1 is on screen and acknowledged, the next unacknowledged chunk replaces it
+        self.assertEqual(shown_ids([session.on_frame(approval(2, [(4, 4)]), 0.1)]), [3])
+        self.assertEqual(session.base, 3)
+        self.assertEqual(session._in_flight(), [3, 5, 6])
+        # Approvals not covering the chunk on screen keep it there
+        self.assertIsNone(session.on_frame(approval(2, [(5, 6)]), 0.2))
+        self.assertEqual(session._in_flight(), [3])
+
+    def test_round_trip_time_sampled_from_display_to_approval(self):
+        """Test the approval of a chunk shown once is a round-trip sample setting the retransmission timeout"""
+        self.session.start(0.0)
+        self.session.on_frame(approval(0), 0.3)
+
+        self.assertAlmostEqual(self.session.rtt.srtt, 0.3)
+        self.assertAlmostEqual(self.session.rtt.rto, 0.9)
+
+    def test_timeout_shows_chunk_again(self):
+        """Test a chunk alone in flight is shown again once its timeout expires, and its approval is no sample"""
+        frame = self.session.start(0.0)
+
+        self.assertIsNone(self.session.on_tick(0.5))
+        self.assertEqual(self.session.on_tick(1.0), frame)
+        self.assertEqual(self.session.rtt.timeouts, 1)
+        self.assertEqual(self.session.rtt.rto, 2.0)
+        self.assertEqual(self.session.progress.retransmits, 1)
+        self.assertEqual(self.session.next_deadline(), 3.0)
+
+        self.session.on_frame(approval(0), 1.2)
+        self.assertEqual(self.session.rtt.samples, 0)
+
+    def test_error_correction_told_of_approvals_and_timeouts(self):
+        """Test an error correction adapter counts a timeout and an approval with the smoothed RTT"""
+        class Recorder:
+            def __init__(self):
+                self.outcomes = []
+
+            def delivered(self, srtt):
+                self.outcomes.append(('delivered', srtt))
+
+            def lost(self):
+                self.outcomes.append(('lost',))
+
+        recorder = Recorder()
+        session = SenderSession(self.chunks, ecc=recorder)
+        session.start(0.0)
+        session.on_tick(1.0)
+        session.on_frame(approval(0), 1.2)
+        session.on_frame(approval(1), 1.5)
+
+        self.assertEqual(recorder.outcomes[:2], [('lost',), ('delivered', None)])
+        self.assertAlmostEqual(recorder.outcomes[2][1], 0.3)
+
+    def test_timed_out_chunk_shown_before_rotation(self):
+        """Test an in-flight chunk whose timeout expired jumps ahead of the rotation"""
+        session = SenderSession(create_chunks_to_send("a.txt", b"x" * 1000), window=4, frame_interval=0.2)
+        session.start(0.0)
+        session.on_frame(approval(0), 0.1)
+        self.assertEqual(session.rtt.rto, 0.5)
+
+        shown = [session.on_tick(now) for now in [0.35, 0.58, 0.8]]
+
+        # Chunk 4 was next in the rotation, chunk 1 was last shown at 0.1
+        self.assertEqual(shown_ids(shown), [2, 3, 1])
+        self.assertEqual(session.rtt.timeouts, 1)
+
+    def test_stale_cumulative_approval_ignored_for_starting_chunk(self):
+        """Test the last approval of a previous file does not approve the starting chunk of the next one"""
+        self.session.start(0.0)
+
+        self.assertIsNone(self.session.on_frame(approval(9), 0.1))
+        self.assertEqual(self.session.base, 0)
+
+    def test_ack_wait_measured_with_session_clock(self):
+        """Test the ack wait stage is timed with the clock the session is fed"""
+        metrics.enable_metrics()
+        self.addCleanup(metrics.reset_metrics)
+        self.addCleanup(metrics.disable_metrics)
+
+        self.session.start(10.0)
+        self.session.on_frame(approval(0), 10.25)
+
+        ack_wait = metrics.metrics_snapshot()['ack_wait']
+        self.assertEqual(ack_wait['count'], 1)
+        self.assertAlmostEqual(ack_wait['sum'], 0.25)
+
+class TestReceiverSession(unittest.TestCase):
+    """Test cases for the receiver state machine"""
+
+    def setUp(self):
+        self.chunks = create_chunks_to_send("a.txt", b"0123456789" * 25)
+        self.frames = [encode_qr_data(chunk) for chunk in self.chunks]
+
+    def test_full_transfer(self):
+        """Test the starting chunk and every data chunk are approved and the file reassembled"""
+        session = ReceiverSession()
+        self.assertIsNone(session.start(0.0))
+
+        shown = [session.on_frame(frame, 0.0) for frame in self.frames]
+
+        # Data chunks within one ack interval are acknowledged together, the last one right away
+        self.assertIsNone(shown[1])
+        self.assertIsNone(shown[2])
+        self.assertEqual(shown_ids([shown[0], shown[3]]), [0, 3])
+        self.assertEqual(session.file_metadata, {'file_name': "a.txt", 'total_chunks': 3})
+        self.assertTrue(session.done)
+        self.assertEqual(session.file_data(), b"0123456789" * 25)
+
+    def test_ignores_data_before_start_and_duplicates(self):
+        """Test data chunks before the starting chunk are ignored and duplicates are not approved again"""
+        session = ReceiverSession()
+
+        self.assertIsNone(session.on_frame(self.frames[1], 0.0))
+        session.on_frame(self.frames[0], 0.0)
+        self.assertIsNotNone(session.on_frame(self.frames[1], 1.0))
+        self.assertIsNone(session.on_frame(self.frames[1], 1.0))
+
+        self.assertEqual(session.progress.duplicates, 1)
+        self.assertFalse(session.done)
+
+    def test_approvals_rate_limited(self):
+        """Test the approval is updated at most once per interval, and right away for a chunk the sender repeats"""
+        chunks = create_chunks_to_send("a.txt", b"x" * 1000)
+        frames = [encode_qr_data(chunk) for chunk in chunks]
+        session = ReceiverSession(ack_interval=0.2)
+        session.on_frame(frames[0], 0.0)
+
+        self.assertEqual(session.on_frame(frames[1], 0.25), approval(1))
+        self.assertIsNone(session.on_frame(frames[3], 0.3))
+        # Chunk 3 is not covered by the approval on screen, so the sender showing it again is waiting for it
+        self.assertEqual(session.on_frame(frames[3], 0.35), approval(1, [(3, 3)]))
+        # Chunk 1 is covered, its repeat is just the sender rotating through its window
+        self.assertIsNone(session.on_frame(frames[1], 0.4))
+
+    def test_sack_blocks_most_recent_first(self):
+        """Test the selective ack blocks list the ranges beyond the cumulative ID, the most recently received first"""
+        session = ReceiverSession(total_chunks=20, ack_interval=0.0)
+        shown = None
+        for chunk_id in [1, 2, 7, 8, 4, 10, 12]:
+            shown = session.on_frame(encode_qr_data({'id': chunk_id, 'data': b"x"}), 0.0)
+
+        self.assertEqual(decode_qr_data(shown)['sack'], [[12, 12], [10, 10], [4, 4]])
+        self.assertEqual(decode_qr_data(shown)['id'], 2)
+
+    def test_known_total_skips_starting_chunk(self):
+        """Test a session created with the chunk count collects data chunks right away"""
+        session = ReceiverSession(total_chunks=1)
+
+        self.assertEqual(session.on_frame(encode_qr_data({'id': 1, 'data': b"abc"}), 0.0), approval(1))
+        self.assertTrue(session.done)
+        self.assertTrue(ReceiverSession(total_chunks=0).done)
+
+    def test_calibration_answered_through_session(self):
+        """Test calibration payloads go to the responder, whose acks become the frames to show"""
+        handled = []
+
+        class Responder:
+            def __init__(self, show):
+                self.show = show
+
+            def handle(self, payload):
+                handled.append(payload)
+                self.show("ack")
+
+        session = ReceiverSession(calibration_factory=Responder)
+        probe = encode_qr_data(create_calibration_payload(CALIBRATION_PROBE, 0, "sender"))
+
+        self.assertEqual(session.on_frame(probe, 0.0), "ack")
+        self.assertEqual(len(handled), 1)
+        # Without a factory calibration payloads are ignored
+        self.assertIsNone(ReceiverSession().on_frame(probe, 0.0))
+
+    def test_reassemble_file_data_orders_by_chunk_id(self):
+        """Test chunks are joined in chunk ID order, not insertion order"""
+        chunks_data = {3: b'ccc', 1: b'a', 2: b'bb'}
+
+        self.assertEqual(reassemble_file_data(chunks_data), b'abbccc')
+        self.assertEqual(reassemble_file_data({}), b'')
+
+    def test_reassemble_striped_file_data(self):
+        """Test chunks striped over lanes are joined taking one chunk of every lane in turn"""
+        lanes_chunks_data = [{2: b'cc', 1: b'aa', 3: b'e'}, {1: b'bb', 2: b'dd'}]
+
+        self.assertEqual(reassemble_striped_file_data(lanes_chunks_data), b'aabbccdde')
+
+    def test_lane_approvals_stay_in_their_lane(self):
+        """Test a lane receiver names its lane in approvals and a sender lane ignores the approvals of other lanes"""
+        lane_chunks = create_lane_chunks("a.txt", b"x" * 500, 2)
+        receiver = ReceiverSession()
+        lane_approval = receiver.on_frame(encode_qr_data(lane_chunks[1][0]), 0.0)
+
+        self.assertEqual(decode_qr_data(lane_approval)['lane'], 1)
+        self.assertEqual(receiver.file_metadata, {'file_name': "a.txt", 'total_chunks': 2, 'lane': 1, 'lanes': 2})
+        other_lane = SenderSession(lane_chunks[0])
+        other_lane.start(0.0)
+        self.assertIsNone(other_lane.on_frame(lane_approval, 0.1))
+        same_lane = SenderSession(lane_chunks[1])
+        same_lane.start(0.0)
+        self.assertEqual(shown_ids([same_lane.on_frame(lane_approval, 0.1)]), [1])
+
+    def test_lane_receiver_drops_chunks_of_other_lanes(self):
+        """Test a lane receiver seeing a neighbouring lane keeps only the data chunks of its own lane"""
+        lane_chunks = create_lane_chunks("a.txt", b"a" * 100 + b"b" * 100 + b"c" * 100, 2)
+        receiver = ReceiverSession()
+        receiver.on_frame(encode_qr_data(lane_chunks[0][0]), 0.0)
+
+        # Chunk 1 of lane 1 has the same ID as chunk 1 of lane 0
+        self.assertIsNone(receiver.on_frame(encode_qr_data(lane_chunks[1][1]), 0.1))
+        self.assertEqual(receiver.chunks_data, {})
+        for chunk in lane_chunks[0][1:]:
+            receiver.on_frame(encode_qr_data(chunk), 0.2)
+
+        self.assertTrue(receiver.done)
+        self.assertEqual(receiver.file_data(), b"a" * 100 + b"c" * 100)
+
+class TestDuplexSession(unittest.TestCase):
+    """Test cases for the state machine of a peer sending and receiving at the same time"""
+
+    def test_frames_carry_chunk_and_ack(self):
+        """Test the outgoing chunk carries the approval of the incoming file, which also acknowledges outgoing chunks"""
+        chunks = create_chunks_to_send("a.txt", b"x" * 250)
+        session = DuplexSession(chunks)
+        self.assertEqual(decode_qr_data(session.start(0.0)), chunks[0])
+
+        peer_start = dict(create_chunks_to_send("b.txt", b"y" * 50)[0], ack={'id': 0})
+        frame = decode_qr_data(session.on_frame(encode_qr_data(peer_start), 0.1))
+
+        self.assertEqual(frame['id'], 1)
+        self.assertEqual(frame['ack'], {'id': 0})
+        self.assertEqual(session.sender.base, 1)
+        self.assertEqual(session.receiver.file_metadata, {'file_name': "b.txt", 'total_chunks': 1})
+
+    def test_plain_approvals_once_outgoing_file_sent(self):
+        """Test a peer whose file is through shows plain approvals, and takes plain approvals from the other peer"""
+        session = DuplexSession(create_chunks_to_send("a.txt", b""))
+        session.start(0.0)
+        session.on_frame(approval(0), 0.1)
+        self.assertTrue(session.sender.done)
+
+        frame = session.on_frame(encode_qr_data(create_chunks_to_send("b.txt", b"y")[0]), 0.2)
+
+        self.assertEqual(frame, approval(0))
+        self.assertFalse(session.done)
+
+    def test_duplex_peers_exchange_files(self):
+        """Test two peers complete both transfers through in-memory screens"""
+        peers = {
+            'a': DuplexSession(create_chunks_to_send("a.txt", b"from a " * 60)),
+            'b': DuplexSession(create_chunks_to_send("b.txt", b"from b " * 90)),
+        }
+        now = [0.0]
+        screens = {'b': peers['b'].start(0.0)}
+
+        def read_b_screen(timeout=None):
+            # Peer b answers the frame of peer a right away, as a camera pointed at a's screen would
+            now[0] += 0.05
+            for frame in [peers['b'].on_frame(screens['a'], now[0]), peers['b'].on_tick(now[0])]:
+                if frame is not None:
+                    screens['b'] = frame
+            return screens['b']
+
+        run_session(peers['a'], read_b_screen, lambda frame: screens.update(a=frame), clock=lambda: now[0],
+                    until=lambda a: a.done and peers['b'].done)
+
+        self.assertEqual(peers['a'].receiver.file_data(), b"from b " * 90)
+        self.assertEqual(peers['b'].receiver.file_data(), b"from a " * 60)
+
+def nack(receiver_id, missing_ranges):
+    return encode_qr_data(create_nack_payload(receiver_id, missing_ranges))
+
+class TestBroadcastSessions(unittest.TestCase):
+    """Test cases for the one-to-many carousel and the receivers reporting their missing chunks"""
+
+    def setUp(self):
+        self.chunks = create_chunks_to_send("a.txt", b"x" * 400)
+        self.session = BroadcastSenderSession(self.chunks, receivers=2)
+
+    def show_all(self, start=0.0):
+        """Run the first pass of the carousel, returns the shown IDs and the time after it"""
+        frames = [self.session.start(start)]
+        now = start
+        for _ in range(len(self.chunks) - 1):
+            now += self.session.frame_interval
+            frames.append(self.session.on_tick(now))
+        return shown_ids(frames), now
+
+    def test_first_pass_shows_every_chunk_in_order(self):
+        ids, _ = self.show_all()
+
+        self.assertEqual(ids, [0, 1, 2, 3, 4])
+        self.assertEqual(self.session.retransmits, 0)
+
+    def test_chunk_missing_at_most_receivers_repeats_first(self):
+        _, now = self.show_all()
+        self.session.on_frame(nack('r1', [(2, 3)]), now + 0.1)
+        self.session.on_frame(nack('r2', [(3, 3)]), now + 0.1)
+
+        self.assertEqual(shown_ids([self.session.on_tick(now + 0.2)]), [3])
+        self.assertEqual(shown_ids([self.session.on_tick(now + 0.4)]), [2])
+        self.assertEqual(self.session.retransmits, 2)
+
+    def test_report_older_than_the_last_show_does_not_repeat(self):
+        _, now = self.show_all()
+        # Reported before chunk 4 was on screen for a frame, it may just not have been decoded yet
+        self.session.on_frame(nack('r1', [(4, 4)]), now + 0.1)
+
+        self.assertEqual(self.session.upcoming(1), [encode_qr_data(self.chunks[0])])
+
+    def test_done_once_every_receiver_complete(self):
+        self.show_all()
+        self.session.on_frame(nack('r1', []), 1.0)
+        self.assertFalse(self.session.done)
+
+        self.session.on_frame(nack('r2', []), 1.1)
+
+        self.assertTrue(self.session.done)
+        self.assertIsNone(self.session.next_deadline())
+
+    def test_receiver_reports_missing_chunks(self):
+        receiver = BroadcastReceiverSession('r1')
+        report = decode_qr_data(receiver.on_frame(encode_qr_data(self.chunks[2]), 0.0))
+        self.assertEqual(report['nack'], [[0, 0]])
+
+        self.assertIsNone(receiver.on_frame(encode_qr_data(self.chunks[0]), 0.1))
+        report = decode_qr_data(receiver.on_tick(0.5))
+
+        self.assertEqual(report['receiver'], 'r1')
+        self.assertEqual(report['nack'], [[1, 1], [3, 4]])
+        self.assertEqual(receiver.file_metadata, {'file_name': "a.txt", 'total_chunks': 4})
+
+    def test_receiver_reports_complete_right_away(self):
+        receiver = BroadcastReceiverSession('r1')
+        receiver.on_frame(encode_qr_data(self.chunks[0]), 0.0)
+        for chunk in self.chunks[1:-1]:
+            receiver.on_frame(encode_qr_data(chunk), 0.1)
+
+        report = decode_qr_data(receiver.on_frame(encode_qr_data(self.chunks[-1]), 0.2))
+
+        self.assertEqual(report['nack'], [])
+        self.assertTrue(receiver.done)
+        self.assertEqual(receiver.file_data(), b"x" * 400)
+
+    def test_broadcast_reaches_receivers_losing_frames(self):
+        """Test two receivers missing different frames both complete through in-memory screens"""
+        chunks = create_chunks_to_send("a.txt", b"broadcast " * 150)
+        sender = BroadcastSenderSession(chunks, receivers=2)
+        receivers = [BroadcastReceiverSession('r1'), BroadcastReceiverSession('r2')]
+        # Frame number -> receivers that do not decode it
+        lost = {1: {0}, 2: {1}, 3: {0, 1}, 5: {1}}
+        now = [0.0]
+        screens = {}
+        shown = [0]
+
+        def show(frame):
+            screens['sender'] = frame
+            shown[0] += 1
+
+        def read_reports(timeout=None):
+            now[0] += 0.1
+            for index, receiver in enumerate(receivers):
+                frames = [receiver.on_tick(now[0])]
+                if index not in lost.get(shown[0], ()):
+                    frames.insert(0, receiver.on_frame(screens['sender'], now[0]))
+                for frame in frames:
+                    if frame is not None:
+                        sender.on_frame(frame, now[0])
+            return None
+
+        run_session(sender, read_reports, show, clock=lambda: now[0])
+
+        for receiver in receivers:
+            self.assertEqual(receiver.file_data(), b"broadcast " * 150)
+        self.assertGreater(sender.retransmits, 0)
+
+    def test_report_about_previous_file_is_ignored(self):
+        previous = create_chunks_to_send("a.txt", b"x" * 400)
+        previous[0]['session'] = "s1"
+        receiver = BroadcastReceiverSession('r1')
+        for chunk in previous:
+            report = receiver.on_frame(encode_qr_data(chunk), 0.0)
+        chunks = create_chunks_to_send("b.txt", b"y" * 5000)
+        chunks[0]['session'] = "s2"
+        session = BroadcastSenderSession(chunks, receivers=1)
+        session.start(1.0)
+
+        # The complete report of the previous file is still on the receiver screen
+        session.on_frame(report, 1.1)
+
+        self.assertEqual(decode_qr_data(report)['session'], "s1")
+        self.assertFalse(session.done)
+        self.assertEqual(session.reports, {})
+
+    def test_receiver_reports_echo_the_session(self):
+        self.chunks[0]['session'] = "s1"
+        receiver = BroadcastReceiverSession('r1')
+        self.assertNotIn('session', decode_qr_data(receiver.on_frame(encode_qr_data(self.chunks[1]), 0.0)))
+
+        report = decode_qr_data(receiver.on_frame(encode_qr_data(self.chunks[0]), 1.0))
+
+        self.assertEqual(report['session'], "s1")
+
+    def test_broadcast_of_several_files(self):
+        """Test back to back files, the screens showing the complete reports of the previous file meanwhile"""
+        files = [("a.txt", b"first " * 100, "s1"), ("b.txt", b"second " * 200, "s2")]
+        now = [0.0]
+        receiver_screens = {}
+
+        for file_name, file_data, session_id in files:
+            chunks = create_chunks_to_send(file_name, file_data)
+            chunks[0]['session'] = session_id
+            sender = BroadcastSenderSession(chunks, receivers=2)
+            receivers = {'r1': BroadcastReceiverSession('r1'), 'r2': BroadcastReceiverSession('r2')}
+            sender_screen = {}
+            # The receivers linger on their complete reports before listening for the next file
+            listening_from = now[0] + 1.0
+
+            def read_reports(timeout=None):
+                now[0] += 0.1
+                for receiver_id, receiver in receivers.items():
+                    if now[0] < listening_from:
+                        break
+                    for frame in (receiver.on_frame(sender_screen['frame'], now[0]), receiver.on_tick(now[0])):
+                        if frame is not None:
+                            receiver_screens[receiver_id] = frame
+                # The camera sees every receiver screen, whatever session put the frame there
+                for frame in receiver_screens.values():
+                    sender.on_frame(frame, now[0])
+                return None
+
+            run_session(sender, read_reports, lambda frame: sender_screen.update(frame=frame), clock=lambda: now[0])
+
+            for receiver in receivers.values():
+                self.assertEqual(receiver.file_data(), file_data)
+            self.assertGreaterEqual(sender.frames_shown, len(chunks))
+
+class TestRunSession(unittest.TestCase):
+    """Test cases for the event loop driving a session"""
+
+    def test_sender_and_receiver_sessions_talk(self):
+        """Test a sender and a receiver session complete a transfer through in-memory screens"""
+        chunks = create_chunks_to_send("a.txt", b"payload " * 100)
+        receiver = ReceiverSession()
+        screens = {'receiver': None}
+
+        def read_sender_screen(timeout=None):
+            # The receiver answers the frame right away, as a camera pointed at the sender screen would
+            frame = receiver.on_frame(screens['sender'], 0.0)
+            if frame is not None:
+                screens['receiver'] = frame
+            return screens['receiver']
+
+        sender = run_session(SenderSession(chunks), read_sender_screen, lambda frame: screens.update(sender=frame),
+                             clock=lambda: 0.0)
+
+        self.assertTrue(sender.done)
+        self.assertTrue(receiver.done)
+        self.assertEqual(receiver.file_data(), b"payload " * 100)
+
+    def test_prefetch_told_upcoming_frames_after_each_switch(self):
+        """Test the prefetch hook gets the frames after the one just shown"""
+        chunks = create_chunks_to_send("a.txt", b"x" * 250)
+        session = SenderSession(chunks)
+        shown, prefetched = [], []
+
+        def read_frame(timeout=None):
+            return approval(decode_qr_data(shown[-1])['id'])
+
+        run_session(session, read_frame, shown.append, clock=lambda: 0.0, prefetch=prefetched.append)
+
+        frames = [encode_qr_data(chunk) for chunk in chunks]
+        self.assertEqual(prefetched, [frames[1:3], [frames[2], frames[3], frames[1]], [frames[3], frames[2]], []])
+
+    def test_deadline_reads_with_timeout_and_ticks(self):
+        """Test the loop reads with a timeout while the session has a deadline, and ticks it when nothing arrives"""
+        class TimedSession:
+            def __init__(self):
+                self.ticks = []
+                self.done = False
+
+            def start(self, now):
+                return "first"
+
+            def on_frame(self, qr_data_string, now):
+                return None
+
+            def on_tick(self, now):
+                self.ticks.append(now)
+                self.done = now >= 2.0
+                return "tick"
+
+            def next_deadline(self):
+                return 2.0
+
+        now = [0.0]
+        timeouts, shown = [], []
+
+        def read_frame(timeout=None):
+            timeouts.append(timeout)
+            now[0] += 1.0
+            return None
+
+        session = run_session(TimedSession(), read_frame, shown.append, clock=lambda: now[0])
+
+        self.assertEqual(timeouts, [2.0, 1.0])
+        self.assertEqual(session.ticks, [1.0, 2.0])
+        self.assertEqual(shown, ["first", "tick", "tick"])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)